@@ -0,0 +1,156 @@
+"""
+Semantic answer cache for /chat
+Generated answers are cached per (question, book filter). A lookup first tries the
+normalized question text, then falls back to the cached question whose embedding is
+most similar to the query, if its cosine similarity clears a threshold. Entries expire
+after a TTL, the cache is LRU-bounded, and everything is dropped when the knowledge
+base changes (new books ingested).
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Sequence, Tuple, Union
+import numpy as np
+from embedding_cache import normalize_text
+from knowledge_index import normalize_vector
+
+BookFilter = Optional[Union[str, Sequence[str]]]
+
+def normalize_question(question: str) -> str:
+    """Normalize a question for exact lookups: collapsed whitespace, case-folded, no trailing punctuation."""
+    return normalize_text(question).casefold().rstrip("?!. ")
+
+def filter_key(book_title: BookFilter) -> Hashable:
+    """Hashable key for a book filter; lists of titles match regardless of order."""
+    if book_title is None or isinstance(book_title, str):
+        return book_title
+    return tuple(sorted(book_title))
+
+class AnswerCache:
+    """
+    Thread-safe TTL + LRU cache of chat answers with near-duplicate matching.
+
+    Args:
+        max_entries: Maximum number of answers held (0 disables the cache)
+        ttl_seconds: Age after which an entry is no longer served
+        similarity_threshold: Minimum cosine similarity between query embeddings
+            for a near-duplicate hit
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 3600, similarity_threshold: float = 0.92):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.version: Optional[Hashable] = None
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        # key -> (created_at, unit query embedding, answer payload)
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[float, np.ndarray, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get_exact(self, question: str, book_title: BookFilter = None) -> Optional[Any]:
+        """Return the cached answer for the same normalized question and book filter, if fresh."""
+        if not self.enabled:
+            return None
+        key = (normalize_question(question), filter_key(book_title))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._fresh(key, entry):
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry[2]
+            return None
+
+    def get_similar(self, query_embedding: np.ndarray, book_title: BookFilter = None) -> Optional[Any]:
+        """
+        Return the answer whose cached question is most similar to query_embedding,
+        among fresh entries with the same book filter, if it clears the threshold.
+        Counts a miss otherwise (call after get_exact).
+        """
+        if not self.enabled:
+            return None
+        query = normalize_vector(np.ravel(query_embedding))
+        book_key = filter_key(book_title)
+        with self._lock:
+            keys, vectors = [], []
+            for key, entry in list(self._entries.items()):
+                if key[1] == book_key and self._fresh(key, entry):
+                    keys.append(key)
+                    vectors.append(entry[1])
+            if keys:
+                similarities = np.vstack(vectors) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    self._entries.move_to_end(keys[best])
+                    self.semantic_hits += 1
+                    return self._entries[keys[best]][2]
+            self.misses += 1
+            return None
+
+    def put(self, question: str, query_embedding: np.ndarray, book_title: BookFilter, answer: Any):
+        """Cache answer for question (and its embedding) under book_title."""
+        if not self.enabled:
+            return
+        key = (normalize_question(question), filter_key(book_title))
+        with self._lock:
+            self._entries[key] = (time.monotonic(), normalize_vector(np.ravel(query_embedding)), answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every cached answer."""
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+
+    def sync_version(self, version: Hashable) -> bool:
+        """
+        Record the knowledge-base version answers are built from; clears the cache
+        when it differs from the previous one. Returns True if the cache was cleared.
+        """
+        with self._lock:
+            changed = self.version is not None and version != self.version
+            self.version = version
+        if changed:
+            self.clear()
+        return changed
+
+    def _fresh(self, key, entry) -> bool:
+        """Whether entry is within its TTL; expired entries are removed (lock held)."""
+        if time.monotonic() - entry[0] <= self.ttl_seconds:
+            return True
+        del self._entries[key]
+        self.expirations += 1
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for monitoring."""
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "similarity_threshold": self.similarity_threshold,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0
+        }
@@ -304,16 +304,17 @@ document.addEventListener('DOMContentLoaded', () => {
         }
 
         openModal();
+        lastReportJson = null;
         reportContentContainer.innerHTML = `<div class="flex flex-col items-center justify-center h-full"><div class="loader ease-linear rounded-full border-8 border-t-8 border-gray-200 h-24 w-24 mb-4"></div><p class="text-lg font-semibold text-gray-600">Generating report...</p></div>`;
 
         try {
-            // Call FastAPI backend
-            const response = await fetch('/generate_sbar', {
+            // Call FastAPI backend (streamed: sections render as they are generated)
+            const response = await fetch('/generate_sbar/stream', {
                 method: 'POST',
                 mode: 'cors',
                 headers: {
                     'Content-Type': 'application/json',
-                    'Accept': 'application/json'
+                    'Accept': 'text/event-stream'
                 },
                 body: JSON.stringify({ patientData: formData })
             });
@@ -321,15 +322,64 @@ document.addEventListener('DOMContentLoaded', () => {
                 await displayError(reportContentContainer, response);
                 return;
             }
-            const result = await response.json();
-            lastReportJson = result.report;
-            renderReport(lastReportJson);
+            const partialReport = {};
+            let renderPending = false;
+            await readEventStream(response, (event, data) => {
+                if (event === 'section') {
+                    partialReport[data.key] = (partialReport[data.key] || '') + data.text;
+                    // Coalesce re-renders to one per frame
+                    if (!renderPending) {
+                        renderPending = true;
+                        requestAnimationFrame(() => {
+                            renderPending = false;
+                            if (!lastReportJson) renderReport(orderedReport(partialReport));
+                        });
+                    }
+                } else if (event === 'done') {
+                    lastReportJson = data.report;
+                    renderReport(lastReportJson);
+                } else if (event === 'error') {
+                    reportContentContainer.innerHTML = `<div class="p-6"><p class="text-red-500 font-semibold">An error occurred: ${data.detail}</p></div>`;
+                }
+            });
         } catch (error) {
             // This will now only catch network errors or other unexpected issues
             reportContentContainer.innerHTML = `<div class="p-6"><p class="text-red-500 font-semibold">A network error occurred: ${error.message}.</p></div>`;
         }
     }
 
+    const SBAR_KEYS = ['situation', 'background', 'assessment', 'recommendation', 'ai_suggestion'];
+
+    function orderedReport(report) {
+        const ordered = {};
+        SBAR_KEYS.forEach(key => { if (report[key]) ordered[key] = report[key]; });
+        return ordered;
+    }
+
+    // Read a server-sent event stream from a fetch response, calling onEvent(event, data)
+    async function readEventStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const block = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let event = 'message';
+                const dataLines = [];
+                block.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) event = line.slice(6).trim();
+                    else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+                });
+                if (dataLines.length) onEvent(event, JSON.parse(dataLines.join('\n')));
+            }
+        }
+    }
+
     function renderReport(report) {
         const sectionColors = {
             situation: 'bg-blue-50 border-blue-200 text-blue-800',
@@ -471,6 +521,27 @@ document.addEventListener('DOMContentLoaded', () => {
         return html;
     }
 
+    function renderAssistantText(messageDiv, text) {
+        // Try marked.js first, then fallback to simple parser
+        try {
+            if (typeof marked !== 'undefined') {
+                messageDiv.innerHTML = marked.parse(text);
+                // Add styling to marked output
+                messageDiv.querySelectorAll('ul').forEach(el => el.classList.add('list-disc', 'ml-4', 'mb-2'));
+                messageDiv.querySelectorAll('ol').forEach(el => el.classList.add('list-decimal', 'ml-4', 'mb-2'));
+                messageDiv.querySelectorAll('p').forEach(el => el.classList.add('mb-2', 'last:mb-0'));
+                messageDiv.querySelectorAll('strong').forEach(el => el.classList.add('font-bold', 'text-gray-900'));
+                messageDiv.querySelectorAll('h3').forEach(el => el.classList.add('font-bold', 'text-lg', 'mt-3', 'mb-1'));
+                messageDiv.querySelectorAll('a').forEach(el => el.classList.add('text-blue-600', 'underline'));
+            } else {
+                throw new Error("marked is undefined");
+            }
+        } catch (e) {
+            console.warn("Markdown rendering failed, using fallback:", e);
+            messageDiv.innerHTML = simpleMarkdown(text);
+        }
+    }
+
     function addChatMessage(text, isUser = false) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `p-3 rounded-lg mb-3 ${isUser ? 'bg-blue-600 text-white ml-12' : 'bg-white text-gray-800 mr-12 shadow-sm border border-gray-100'}`;
@@ -478,28 +549,12 @@ document.addEventListener('DOMContentLoaded', () => {
         if (isUser) {
             messageDiv.textContent = text;
         } else {
-            // Try marked.js first, then fallback to simple parser
-            try {
-                if (typeof marked !== 'undefined') {
-                    messageDiv.innerHTML = marked.parse(text);
-                    // Add styling to marked output
-                    messageDiv.querySelectorAll('ul').forEach(el => el.classList.add('list-disc', 'ml-4', 'mb-2'));
-                    messageDiv.querySelectorAll('ol').forEach(el => el.classList.add('list-decimal', 'ml-4', 'mb-2'));
-                    messageDiv.querySelectorAll('p').forEach(el => el.classList.add('mb-2', 'last:mb-0'));
-                    messageDiv.querySelectorAll('strong').forEach(el => el.classList.add('font-bold', 'text-gray-900'));
-                    messageDiv.querySelectorAll('h3').forEach(el => el.classList.add('font-bold', 'text-lg', 'mt-3', 'mb-1'));
-                    messageDiv.querySelectorAll('a').forEach(el => el.classList.add('text-blue-600', 'underline'));
-                } else {
-                    throw new Error("marked is undefined");
-                }
-            } catch (e) {
-                console.warn("Markdown rendering failed, using fallback:", e);
-                messageDiv.innerHTML = simpleMarkdown(text);
-            }
+            renderAssistantText(messageDiv, text);
         }
 
         chatMessages.appendChild(messageDiv);
         chatMessages.scrollTop = chatMessages.scrollHeight;
+        return messageDiv;
     }
 
     async function sendChatMessage() {
@@ -513,12 +568,12 @@ document.addEventListener('DOMContentLoaded', () => {
         chatLoading.classList.remove('hidden');
 
         try {
-            const response = await fetch('/chat', {
+            const response = await fetch('/chat/stream', {
                 method: 'POST',
                 mode: 'cors',
                 headers: {
                     'Content-Type': 'application/json',
-                    'Accept': 'application/json'
+                    'Accept': 'text/event-stream'
                 },
                 body: JSON.stringify({ question })
             });
@@ -529,14 +584,32 @@ document.addEventListener('DOMContentLoaded', () => {
                 return;
             }
 
-            const result = await response.json();
-            addChatMessage(result.answer);
+            // Render the answer as tokens arrive
+            let answer = '';
+            let messageDiv = null;
+            let sources = [];
+            await readEventStream(response, (event, data) => {
+                if (event === 'sources') {
+                    sources = data.sources || [];
+                } else if (event === 'token') {
+                    answer += data.text;
+                    if (!messageDiv) {
+                        chatLoading.classList.add('hidden');
+                        messageDiv = addChatMessage(answer);
+                    } else {
+                        renderAssistantText(messageDiv, answer);
+                        chatMessages.scrollTop = chatMessages.scrollHeight;
+                    }
+                } else if (event === 'error') {
+                    addChatMessage(`Error: ${data.detail}`);
+                }
+            });
 
             // Show sources if available
-            if (result.sources && result.sources.length > 0) {
+            if (messageDiv && sources.length > 0) {
                 const sourcesDiv = document.createElement('div');
                 sourcesDiv.className = 'mt-2 text-xs text-gray-500 italic';
-                sourcesDiv.textContent = `Sources: ${result.sources.length} relevant section(s) found`;
+                sourcesDiv.textContent = `Sources: ${sources.length} relevant section(s) found`;
                 chatMessages.appendChild(sourcesDiv);
             }
         } catch (error) {
@@ -0,0 +1,195 @@
+"""
+Benchmark chunk inserts into a local libSQL file: rows/s per write strategy
+Each strategy writes the same synthetic chunks (random 768-d embeddings, ~300-word
+texts) into a fresh medical_knowledge table with the production indexes: the FTS5
+triggers, the (content_hash, chunk_index) key and, unless --no-vector-index, the
+DiskANN vector index.
+  row          one execute() per row, commit every 50 rows (the previous ingest path)
+  executemany  BulkWriter, one executemany() per transaction
+  values       BulkWriter, multi-row INSERT ... VALUES statements per transaction
+On a local file a statement costs no round trip, so the strategies differ little and the
+vector index dominates. --latency-ms adds a simulated network round trip to every
+statement and commit (executemany counts one per row, as a remote client sends each
+statement on its own), which is what separates them against remote Turso.
+Usage:
+  python bench_inserts.py                               # 1000 rows, all strategies
+  python bench_inserts.py --rows 5000 --batch-size 500
+  python bench_inserts.py --strategies row values --no-vector-index
+  python bench_inserts.py --no-vector-index --latency-ms 20   # as if Turso were 20 ms away
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from typing import Tuple
+import numpy as np
+from libsql_experimental import connect
+from bulk_writer import chunk_writer, encode_chunk_rows
+from quantization import quantize_vector
+from lexical_index import ensure_fts_index
+from vector_backend import ensure_vector_column
+from book_stats import ensure_chunk_key
+from near_duplicates import minhash_signature, signature_bytes
+
+TABLE_NAME = "medical_knowledge"
+STRATEGIES = ["row", "executemany", "values"]
+WORDS = ("patient lactate norepinephrine sepsis ventilation potassium infusion assessment "
+         "perfusion oxygenation titrate monitor dose arterial pressure renal cardiac").split()
+
+class RoundTripClient:
+    """
+    Connection wrapper that sleeps latency seconds per statement and commit, to
+    simulate the network round trip each one costs against remote Turso.
+    """
+
+    def __init__(self, client, latency: float):
+        self.client = client
+        self.latency = latency
+        self.round_trips = 0
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def _round_trip(self, count: int = 1):
+        self.round_trips += count
+        time.sleep(self.latency * count)
+
+    def cursor(self):
+        return RoundTripCursor(self, self.client.cursor())
+
+    def execute(self, *args):
+        self._round_trip()
+        return self.client.execute(*args)
+
+    def commit(self):
+        self._round_trip()
+        return self.client.commit()
+
+class RoundTripCursor:
+    """Cursor of a RoundTripClient; executemany pays one round trip per parameter set."""
+
+    def __init__(self, owner: RoundTripClient, cursor):
+        self.owner = owner
+        self.cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def execute(self, *args):
+        self.owner._round_trip()
+        return self.cursor.execute(*args)
+
+    def executemany(self, sql, parameters):
+        parameters = list(parameters)
+        self.owner._round_trip(len(parameters))
+        return self.cursor.executemany(sql, parameters)
+
+def create_table(client, dimension: int, vector_index: bool):
+    """medical_knowledge with the same columns and indexes as ingest_book.create_table_if_not_exists."""
+    client.execute(f"""
+    CREATE TABLE {TABLE_NAME} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chunk_text TEXT NOT NULL,
+        embedding BLOB NOT NULL,
+        page_number INTEGER,
+        page_end INTEGER,
+        chunk_index INTEGER,
+        book_title TEXT,
+        source_file TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        embedding_q8 BLOB,
+        embedding_scale REAL,
+        embedding_vec F32_BLOB({dimension}),
+        content_hash TEXT,
+        minhash BLOB
+    )
+    """)
+    client.commit()
+    if vector_index:
+        ensure_vector_column(client, dimension)
+    ensure_fts_index(client)
+    ensure_chunk_key(client)
+
+def synthetic_chunks(rows: int, dimension: int, seed: int = 0):
+    """(chunk metadata tuples, embeddings) shaped like ingest_book's."""
+    rng = np.random.default_rng(seed)
+    embeddings = rng.normal(size=(rows, dimension)).astype(np.float32)
+    words = rng.choice(WORDS, size=(rows, 300))
+    texts = [" ".join(words[i]) for i in range(rows)]
+    chunks = [(texts[i], i // 3 + 1, i // 3 + 2, i, "Benchmark Book", "bench.pdf", "bench-hash",
+               signature_bytes(minhash_signature(texts[i]))) for i in range(rows)]
+    return chunks, list(embeddings)
+
+def insert_row_by_row(client, chunks, embeddings, commit_every: int = 50):
+    """Baseline: the previous insert_chunk_batch (per-row conversion, execute and batch commit)."""
+    cursor = client.cursor()
+    sql = f"""
+    INSERT INTO {TABLE_NAME} (chunk_text, page_number, page_end, chunk_index, book_title, source_file, content_hash,
+                              minhash, embedding, embedding_q8, embedding_scale, embedding_vec)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, vector32(?))
+    """
+    for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+        embedding_array = embedding.astype(np.float32)
+        embedding_bytes = embedding_array.tobytes()
+        q8_bytes, q8_scale = quantize_vector(embedding_array)
+        cursor.execute(sql, (*chunk, embedding_bytes, q8_bytes, q8_scale, embedding_bytes))
+        if (i + 1) % commit_every == 0:
+            client.commit()
+    client.commit()
+
+def run_strategy(strategy: str, chunks, embeddings, args) -> Tuple[float, int]:
+    """
+    Insert every chunk into a fresh database file; returns (rows/s including encoding,
+    simulated round trips).
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        client = connect(os.path.join(directory, "bench.db"))
+        create_table(client, args.dimension, not args.no_vector_index)
+        client = RoundTripClient(client, args.latency_ms / 1000)
+        start = time.perf_counter()
+        if strategy == "row":
+            insert_row_by_row(client, chunks, embeddings)
+        else:
+            writer = chunk_writer(client, batch_size=args.batch_size, mode=strategy)
+            # Rows arrive in embedding rounds during ingestion; encode per round as ingest does
+            for i in range(0, len(chunks), args.batch_size):
+                writer.write(encode_chunk_rows(chunks[i:i + args.batch_size], embeddings[i:i + args.batch_size]))
+        elapsed = time.perf_counter() - start
+        round_trips = client.round_trips
+        count = client.client.execute(f"SELECT COUNT(*) FROM {TABLE_NAME}").fetchone()[0]
+        client.close()
+    if count != len(chunks):
+        raise RuntimeError(f"{strategy}: expected {len(chunks)} rows, found {count}")
+    return len(chunks) / elapsed, round_trips
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare chunk insert strategies on a local libSQL file")
+    parser.add_argument("--rows", type=int, default=1000, help="Chunks to insert per strategy")
+    parser.add_argument("--dimension", type=int, default=768, help="Embedding dimension")
+    parser.add_argument("--batch-size", type=int, default=200, help="Rows per transaction (BulkWriter strategies)")
+    parser.add_argument("--strategies", nargs="+", choices=STRATEGIES, default=STRATEGIES)
+    parser.add_argument("--no-vector-index", action="store_true", help="Skip the DiskANN index (it dominates insert cost)")
+    parser.add_argument("--latency-ms", type=float, default=0.0,
+                        help="Simulated round trip per statement and commit, as against remote Turso")
+    args = parser.parse_args()
+
+    chunks, embeddings = synthetic_chunks(args.rows, args.dimension)
+    print(f"\nInserting {args.rows} chunks ({args.dimension}-d, vector index: {'off' if args.no_vector_index else 'on'}, "
+          f"batch size {args.batch_size}, simulated latency {args.latency_ms:g} ms)")
+    print("-" * 57)
+    print(f"{'Strategy':<14} | {'rows/s':>10} | {'vs row':>10} | {'round trips':>11}")
+    print("-" * 57)
+    baseline = None
+    for strategy in args.strategies:
+        rate, round_trips = run_strategy(strategy, chunks, embeddings, args)
+        baseline = baseline or (rate if strategy == "row" else None)
+        relative = f"{rate / baseline:.2f}x" if baseline else "-"
+        print(f"{strategy:<14} | {rate:>10.1f} | {relative:>10} | {round_trips:>11}")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ Error: {e}", file=sys.stderr)
+        sys.exit(1)
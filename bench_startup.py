@@ -0,0 +1,148 @@
+"""
+Benchmark cold-start cost of the API: import time of main and time to first request
+Every run uses a fresh interpreter, like a serverless cold start. The app is driven
+directly over ASGI (lifespan startup, then one request), so no server or HTTP client
+is needed.
+Usage:
+  python bench_startup.py                          # GET /health, 5 runs, STARTUP_MODE=lazy
+  python bench_startup.py --mode eager             # Warm up during startup instead
+  python bench_startup.py --path /chat --question "normal potassium range"
+  python bench_startup.py --imports 15             # Also list the 15 slowest imports
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+import subprocess
+
+def drive_app(app, method: str, path: str, body: bytes) -> dict:
+    """Run ASGI lifespan startup, one request and shutdown; return timings in seconds."""
+
+    async def run():
+        timings = {}
+        # Lifespan startup
+        lifespan_in: asyncio.Queue = asyncio.Queue()
+        lifespan_out: asyncio.Queue = asyncio.Queue()
+        start = time.perf_counter()
+        lifespan = asyncio.create_task(app({"type": "lifespan", "asgi": {"version": "3.0"}}, lifespan_in.get, lifespan_out.put))
+        await lifespan_in.put({"type": "lifespan.startup"})
+        message = await lifespan_out.get()
+        if message["type"] != "lifespan.startup.complete":
+            raise RuntimeError(f"Startup failed: {message}")
+        timings["startup"] = time.perf_counter() - start
+
+        # First request
+        request_messages = [{"type": "http.request", "body": body, "more_body": False}]
+        disconnected = asyncio.Event()
+
+        async def receive():
+            if request_messages:
+                return request_messages.pop(0)
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        response = {"status": None, "first_byte": None, "bytes": 0}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                if response["first_byte"] is None and message.get("body"):
+                    response["first_byte"] = time.perf_counter()
+                response["bytes"] += len(message.get("body", b""))
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+            "query_string": b"", "root_path": "", "client": ("127.0.0.1", 0), "server": ("bench", 80),
+            "headers": [(b"host", b"bench"), (b"content-type", b"application/json")]
+        }
+        start = time.perf_counter()
+        await app(scope, receive, send)
+        timings["first_request"] = time.perf_counter() - start
+        timings["first_byte"] = (response["first_byte"] or time.perf_counter()) - start
+        timings["status"] = response["status"]
+        disconnected.set()
+
+        await lifespan_in.put({"type": "lifespan.shutdown"})
+        await lifespan_out.get()
+        await lifespan
+        return timings
+
+    return asyncio.run(run())
+
+def child(args):
+    """One cold start in this (fresh) interpreter; prints timings as JSON on the last line."""
+    start = time.perf_counter()
+    import main
+    import_seconds = time.perf_counter() - start
+
+    body = json.dumps({"question": args.question}).encode() if args.question else b""
+    timings = drive_app(main.app, "POST" if args.question else "GET", args.path, body)
+    timings["import"] = import_seconds
+    timings["total"] = time.perf_counter() - start
+    print(json.dumps(timings))
+
+def slowest_imports(count: int):
+    """Print the slowest cumulative imports of main (python -X importtime)."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        rows.append((int(cumulative), name))
+    print("\nSlowest imports (cumulative):")
+    for micros, name in sorted(rows, reverse=True)[:count]:
+        print(f"  {micros / 1000:>8.1f} ms  {name}")
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Measure import time and time-to-first-request")
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts to measure")
+    parser.add_argument("--mode", choices=["lazy", "eager"], default="lazy", help="STARTUP_MODE for the runs")
+    parser.add_argument("--path", default="/health", help="Endpoint for the first request")
+    parser.add_argument("--question", help="POST {\"question\": ...} to --path instead of a GET")
+    parser.add_argument("--imports", type=int, default=0, help="Also list this many slowest imports")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    command = [sys.executable, os.path.abspath(__file__), "--child", "--path", args.path]
+    if args.question:
+        command += ["--question", args.question]
+    env = dict(os.environ, STARTUP_MODE=args.mode)
+
+    runs = []
+    for i in range(args.runs):
+        result = subprocess.run(command, capture_output=True, text=True, env=env,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        if result.returncode != 0:
+            print(result.stdout + result.stderr, file=sys.stderr)
+            raise RuntimeError(f"Run {i + 1} failed")
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    method = "POST" if args.question else "GET"
+    print(f"\nCold start: STARTUP_MODE={args.mode}, {method} {args.path} (status {runs[-1]['status']}), {len(runs)} runs")
+    print("-" * 52)
+    print(f"{'Phase':<24} | {'median ms':>10} | {'max ms':>10}")
+    print("-" * 52)
+    for phase in ["import", "startup", "first_byte", "first_request", "total"]:
+        values = [run[phase] * 1000 for run in runs]
+        print(f"{phase:<24} | {statistics.median(values):>10.1f} | {max(values):>10.1f}")
+
+    if args.imports:
+        slowest_imports(args.imports)
+
+if __name__ == "__main__":
+    try:
+        main_cli()
+    except Exception as e:
+        print(f"❌ Error: {e}", file=sys.stderr)
+        sys.exit(1)
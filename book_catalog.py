@@ -0,0 +1,290 @@
+"""
+Book catalog and query router
+The book_catalog table (next to medical_knowledge) maps each book's canonical title
+to a short id plus the aliases and keywords that should route a question to it.
+BookRouter compiles every alias and keyword into one regex, so a question is scanned
+once and can name several books.
+"""
+import json
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+from book_stats import book_titles
+
+CATALOG_TABLE_NAME = "book_catalog"
+
+# Catalog entries for the books the app was built around. Written to book_catalog by
+# ensure_book_catalog(); also the fallback when the table does not exist yet.
+DEFAULT_CATALOG = [
+    {
+        "book_id": "urden",
+        "title": "Critical Care Nursing, Diagnosis and Management - Urden, Linda D",
+        "aliases": ["critical care nursing", "urden", "icu nursing book"],
+        "keywords": []
+    },
+    {
+        "book_id": "acls",
+        "title": "Advanced Cardiac Life Support Provider Handbook 2015-2020 ( PDFDrive )",
+        "aliases": ["acls", "advanced cardiac life support"],
+        "keywords": []
+    },
+    {
+        "book_id": "lehne",
+        "title": "Lehne’s Pharmacology for Nursing Care ( PDFDrive.com )",
+        "aliases": ["lehne"],
+        "keywords": ["pharmacology"]
+    },
+    {
+        "book_id": "tncc",
+        "title": "TNCC 8th Edition",
+        "aliases": ["tncc"],
+        "keywords": ["trauma"]
+    },
+    {
+        "book_id": "marino",
+        "title": "MarinoICUphysician",
+        "aliases": ["marino", "icu physician"],
+        "keywords": []
+    },
+    {
+        "book_id": "canadian-labs",
+        "title": "Canadian Lab Test Manual",
+        "aliases": ["canadian lab test manual", "canadian"],
+        "keywords": ["lab", "lab test", "lab value", "laboratory"]
+    }
+]
+
+_DEFAULT_TITLES = {entry["book_id"]: entry["title"] for entry in DEFAULT_CATALOG}
+_NOISE = re.compile(r"\(\s*pdfdrive[^)]*\)", re.IGNORECASE)
+_EDITION = re.compile(
+    r"\b(?:\d+(?:st|nd|rd|th)|first|second|third|fourth|fifth|sixth|seventh|eighth|ninth|tenth)\s+(?:edition|ed\b\.?)"
+    r"|\bedition\s+\d+\b|\b(?:19|20)\d{2}(?:\s*-\s*(?:19|20)\d{2})?\b",
+    re.IGNORECASE
+)
+_FUNCTION_WORDS = {"a", "an", "and", "for", "in", "of", "on", "the", "to", "with"}
+# Words that say nothing about which book is meant; an alias made only of these is dropped
+_GENERIC_WORDS = _FUNCTION_WORDS | {
+    "book", "care", "clinical", "critical", "diagnosis", "drug", "drugs", "guide", "handbook", "intensive",
+    "management", "manual", "medical", "medicine", "nurse", "nurses", "nursing", "pharmacology", "practice",
+    "principles", "textbook"
+}
+
+def book_slug(title: str) -> str:
+    """Short id derived from a title: lowercase words joined by '-', at most 4 words."""
+    words = re.findall(r"[a-z0-9]+", re.sub(r"['’]", "", _NOISE.sub("", title).lower()))
+    return "-".join(words[:4]) or "book"
+
+def default_aliases(title: str) -> List[str]:
+    """
+    Aliases for a book with no catalog entry, derived from its title: the title without
+    download-site noise, the short title (no subtitle, edition or year), and the author's
+    surname from "Title - Surname, First" or a possessive ("Lehne's Pharmacology" -> "lehne").
+    Aliases made only of generic words ("critical care nursing") are left out.
+    """
+    cleaned = " ".join(_NOISE.sub("", title).split()).lower()
+    if not cleaned:
+        return []
+    candidates = [cleaned]
+    name, _, author = cleaned.partition(" - ")
+    short = _EDITION.sub("", re.split(r"[:(]", name)[0])
+    candidates.append(short)
+    candidates.append(short.split(",")[0])
+    # "Title - A Practical Approach" is a subtitle, not an author
+    if author and len(author.split()) <= 4 and not set(author.split()) & _FUNCTION_WORDS:
+        candidates.append(author.split(",")[0] if "," in author else author.split()[-1])
+    possessive = re.match(r"([a-z]+)['’]s?\s", short.strip() + " ")
+    if possessive:
+        candidates.append(possessive.group(1))
+
+    aliases: List[str] = []
+    for alias in candidates:
+        alias = " ".join(alias.strip(" ,.;-").split())
+        words = set(re.findall(r"[a-z0-9]+", alias))
+        if len(alias) >= 3 and words - _GENERIC_WORDS and alias not in aliases:
+            aliases.append(alias)
+    return aliases
+
+def unique_book_id(base_id: str, taken) -> str:
+    """base_id, or base_id-2, base_id-3, ... if it is already taken."""
+    book_id, suffix = base_id, 2
+    while book_id in taken:
+        book_id, suffix = f"{base_id}-{suffix}", suffix + 1
+    return book_id
+
+def ensure_book_catalog(client):
+    """Create book_catalog if missing and add the default entries (idempotent)."""
+    cursor = client.cursor()
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {CATALOG_TABLE_NAME} (
+        book_id TEXT PRIMARY KEY,
+        title TEXT NOT NULL UNIQUE,
+        aliases TEXT NOT NULL DEFAULT '[]',
+        keywords TEXT NOT NULL DEFAULT '[]',
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    for entry in DEFAULT_CATALOG:
+        cursor.execute(
+            f"INSERT OR IGNORE INTO {CATALOG_TABLE_NAME} (book_id, title, aliases, keywords) VALUES (?, ?, ?, ?)",
+            (entry["book_id"], entry["title"], json.dumps(entry["aliases"]), json.dumps(entry["keywords"]))
+        )
+    client.commit()
+
+def register_book(client, title: str, book_id: Optional[str] = None,
+                  aliases: Optional[Sequence[str]] = None, keywords: Optional[Sequence[str]] = None) -> str:
+    """
+    Add a book to the catalog so /chat can route to it; existing entries are kept, except
+    that an entry still holding only the full title as its alias (registered before
+    aliases were derived) gets default_aliases(). Aliases default to default_aliases(title).
+    Returns the book's short id.
+    """
+    cursor = client.cursor()
+    cursor.execute(f"SELECT book_id, aliases FROM {CATALOG_TABLE_NAME} WHERE title = ?", (title,))
+    row = cursor.fetchone()
+    if row:
+        cleaned = " ".join(_NOISE.sub("", title).split()).lower()
+        if aliases is None and json.loads(row[1] or "[]") == [cleaned]:
+            cursor.execute(f"UPDATE {CATALOG_TABLE_NAME} SET aliases = ?, updated_at = CURRENT_TIMESTAMP WHERE book_id = ?",
+                           (json.dumps(default_aliases(title)), row[0]))
+            client.commit()
+        return row[0]
+
+    cursor.execute(f"SELECT book_id FROM {CATALOG_TABLE_NAME}")
+    book_id = unique_book_id(book_id or book_slug(title), {row[0] for row in cursor.fetchall()})
+
+    cursor.execute(
+        f"INSERT INTO {CATALOG_TABLE_NAME} (book_id, title, aliases, keywords) VALUES (?, ?, ?, ?)",
+        (book_id, title, json.dumps(list(aliases) if aliases is not None else default_aliases(title)),
+         json.dumps(list(keywords or [])))
+    )
+    client.commit()
+    return book_id
+
+def _normalize(phrase: str) -> str:
+    """Lowercase, single-spaced, straight apostrophes."""
+    return " ".join(phrase.replace("’", "'").lower().split())
+
+class BookRouter:
+    """
+    Route free text to catalog books with one compiled regex.
+
+    Every alias and keyword becomes an alternative matched on word boundaries
+    (plurals and possessives included), longest phrase first.
+
+    Args:
+        entries: Catalog entries ({"book_id", "title", "aliases", "keywords"})
+    """
+
+    def __init__(self, entries: Sequence[Dict]):
+        self.entries = list(entries)
+        self.titles: Dict[str, str] = {entry["book_id"]: entry["title"] for entry in self.entries}
+        self._phrase_titles: Dict[str, List[str]] = {}
+        for entry in self.entries:
+            for phrase in list(entry.get("aliases") or []) + list(entry.get("keywords") or []):
+                phrase = _normalize(phrase)
+                if phrase:
+                    titles = self._phrase_titles.setdefault(phrase, [])
+                    if entry["title"] not in titles:
+                        titles.append(entry["title"])
+
+        phrases = sorted(self._phrase_titles, key=len, reverse=True)
+        alternatives = "|".join(re.escape(phrase).replace(r"\ ", r"\s+") for phrase in phrases)
+        self._pattern = re.compile(rf"\b({alternatives})(?:s|'s)?\b", re.IGNORECASE) if phrases else None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def route(self, text: str) -> List[str]:
+        """Titles of every book the text refers to, in order of first mention."""
+        if self._pattern is None:
+            return []
+        matched: List[str] = []
+        for match in self._pattern.finditer(text.replace("’", "'")):
+            phrase = _normalize(match.group(1))
+            for title in self._phrase_titles.get(phrase, []):
+                if title not in matched:
+                    matched.append(title)
+        return matched
+
+    def title(self, book_id: str) -> str:
+        """Canonical title for a short id; built-in ids fall back to DEFAULT_CATALOG (KeyError otherwise)."""
+        if book_id in self.titles:
+            return self.titles[book_id]
+        return _DEFAULT_TITLES[book_id]
+
+def load_catalog_entries(client) -> List[Dict]:
+    """
+    Catalog rows, plus default-alias entries for any ingested book (from the books
+    table) that has not been catalogued yet. Falls back to DEFAULT_CATALOG if the table is missing.
+    """
+    cursor = client.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (CATALOG_TABLE_NAME,))
+    if cursor.fetchone():
+        cursor.execute(f"SELECT book_id, title, aliases, keywords FROM {CATALOG_TABLE_NAME}")
+        entries = [
+            {"book_id": book_id, "title": title, "aliases": json.loads(aliases or "[]"), "keywords": json.loads(keywords or "[]")}
+            for book_id, title, aliases, keywords in cursor.fetchall()
+        ]
+    else:
+        entries = [dict(entry) for entry in DEFAULT_CATALOG]
+
+    known_titles = {entry["title"] for entry in entries}
+    known_ids = {entry["book_id"] for entry in entries}
+    for title in book_titles(client):
+        if title in known_titles:
+            continue
+        book_id = unique_book_id(book_slug(title), known_ids)
+        entries.append({"book_id": book_id, "title": title, "aliases": default_aliases(title), "keywords": []})
+        known_ids.add(book_id)
+    return entries
+
+CATALOG_RETRY_SECONDS = 60  # wait between catalog load attempts after a failure
+
+# Global router, loaded on first use and shared across requests; the default-catalog
+# router is built once and served while no database catalog is available
+_router: Optional[BookRouter] = None
+_default_router: Optional[BookRouter] = None
+_router_retry_at = 0.0
+_router_lock = threading.Lock()
+
+def default_book_router() -> BookRouter:
+    """Shared router over DEFAULT_CATALOG (its patterns are compiled once)."""
+    global _default_router
+    if _default_router is None:
+        with _router_lock:
+            if _default_router is None:
+                _default_router = BookRouter(DEFAULT_CATALOG)
+    return _default_router
+
+def get_book_router(pool=None) -> BookRouter:
+    """
+    Return the shared router, loading the catalog through pool on first use.
+    Without a pool, or while the database is unreachable, the default catalog is used;
+    a failed load is retried after CATALOG_RETRY_SECONDS, not on every call.
+    """
+    global _router, _router_retry_at
+    if _router is not None:
+        return _router
+    if pool is None or time.monotonic() < _router_retry_at:
+        return default_book_router()
+    with _router_lock:
+        if _router is None and time.monotonic() >= _router_retry_at:
+            try:
+                with pool.connection() as client:
+                    entries = load_catalog_entries(client)
+            except Exception as e:
+                _router_retry_at = time.monotonic() + CATALOG_RETRY_SECONDS
+                print(f"⚠️  Could not load book catalog ({e}) - using built-in defaults, retrying in {CATALOG_RETRY_SECONDS}s")
+            else:
+                _router = BookRouter(entries)
+                print(f"✅ Loaded book catalog ({len(_router)} books)")
+        router = _router
+    return router if router is not None else default_book_router()
+
+def invalidate_book_router():
+    """Drop the shared router so the next call reloads the catalog."""
+    global _router, _router_retry_at
+    with _router_lock:
+        _router = None
+        _router_retry_at = 0.0
@@ -0,0 +1,230 @@
+"""
+Per-book metadata and statistics
+The books table holds one row per ingested (title, source file): content hash, chunk
+and page counts, embedding model/dimension, chunk id range, ingest timestamps and the
+ingest generation (bumped corpus-wide on every completed ingest).
+process_pdf writes it, so listing tools and the server read O(books) rows instead of
+aggregating medical_knowledge.
+Chunks carry the content hash of their PDF; (content_hash, chunk_index) is unique, so
+re-ingesting a PDF upserts its chunks instead of duplicating them.
+"""
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+TABLE_NAME = "medical_knowledge"
+BOOKS_TABLE_NAME = "books"
+CHUNK_KEY_INDEX = "medical_knowledge_source_chunk_idx"
+
+BOOK_COLUMNS = [
+    "title", "source_file", "content_hash", "chunk_count", "page_count", "embedding_model",
+    "embedding_dimension", "min_chunk_id", "max_chunk_id", "status", "ingest_started_at", "ingest_finished_at",
+    "ingest_generation"
+]
+
+def file_sha256(path: str) -> str:
+    """Hex SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def books_table_exists(client) -> bool:
+    cursor = client.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (BOOKS_TABLE_NAME,))
+    return cursor.fetchone() is not None
+
+def ensure_books_table(client) -> bool:
+    """
+    Create the books table if missing (idempotent). An empty table is backfilled from
+    medical_knowledge; returns True if that added any rows.
+    """
+    cursor = client.cursor()
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {BOOKS_TABLE_NAME} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        source_file TEXT NOT NULL DEFAULT '',
+        content_hash TEXT,
+        chunk_count INTEGER NOT NULL DEFAULT 0,
+        page_count INTEGER,
+        embedding_model TEXT,
+        embedding_dimension INTEGER,
+        min_chunk_id INTEGER,
+        max_chunk_id INTEGER,
+        status TEXT NOT NULL DEFAULT 'complete',
+        ingest_started_at DATETIME,
+        ingest_finished_at DATETIME,
+        ingest_generation INTEGER NOT NULL DEFAULT 0,
+        UNIQUE (title, source_file)
+    )
+    """)
+    if not has_generation_column(client):
+        cursor.execute(f"ALTER TABLE {BOOKS_TABLE_NAME} ADD COLUMN ingest_generation INTEGER NOT NULL DEFAULT 0")
+    cursor.execute(f"SELECT 1 FROM {BOOKS_TABLE_NAME} LIMIT 1")
+    backfilled = False
+    if cursor.fetchone() is None:
+        backfill_books_table(client)
+        cursor.execute(f"SELECT 1 FROM {BOOKS_TABLE_NAME} LIMIT 1")
+        backfilled = cursor.fetchone() is not None
+    client.commit()
+    return backfilled
+
+def has_generation_column(client) -> bool:
+    """Whether the books table has ingest_generation (tables created before it existed do not until migrated)."""
+    cursor = client.cursor()
+    cursor.execute(f"PRAGMA table_info({BOOKS_TABLE_NAME})")
+    return "ingest_generation" in {row[1] for row in cursor.fetchall()}
+
+def backfill_books_table(client):
+    """Aggregate existing chunks into books rows (one-off migration; hashes and page counts stay NULL)."""
+    client.cursor().execute(f"""
+    INSERT OR IGNORE INTO {BOOKS_TABLE_NAME}
+        (title, source_file, chunk_count, embedding_dimension, min_chunk_id, max_chunk_id,
+         status, ingest_started_at, ingest_finished_at)
+    SELECT book_title, COALESCE(source_file, ''), COUNT(*), MAX(LENGTH(embedding)) / 4, MIN(id), MAX(id),
+           'complete', MIN(created_at), MAX(created_at)
+    FROM {TABLE_NAME}
+    WHERE book_title IS NOT NULL
+    GROUP BY book_title, COALESCE(source_file, '')
+    """)
+    client.commit()
+
+def start_book_ingest(client, title: str, source_file: str, content_hash: Optional[str], page_count: Optional[int],
+                      embedding_model: str, embedding_dimension: int):
+    """Mark (title, source_file) as being ingested; chunk counts are only added by finish_book_ingest."""
+    client.cursor().execute(f"""
+    INSERT INTO {BOOKS_TABLE_NAME}
+        (title, source_file, content_hash, page_count, embedding_model, embedding_dimension, status, ingest_started_at)
+    VALUES (?, ?, ?, ?, ?, ?, 'ingesting', CURRENT_TIMESTAMP)
+    ON CONFLICT (title, source_file) DO UPDATE SET
+        content_hash = excluded.content_hash,
+        page_count = excluded.page_count,
+        embedding_model = excluded.embedding_model,
+        embedding_dimension = excluded.embedding_dimension,
+        status = 'ingesting',
+        ingest_started_at = excluded.ingest_started_at
+    """, (title, source_file or "", content_hash, page_count, embedding_model, embedding_dimension))
+    client.commit()
+
+def finish_book_ingest(client, title: str, source_file: str, content_hash: str):
+    """
+    Recount the book's chunks (through the chunk key index), mark its row complete and
+    give it the next ingest generation. Upserts keep chunk ids and a re-ingest can keep
+    the chunk count, so the generation is what tells readers the text changed.
+    """
+    client.cursor().execute(f"""
+    UPDATE {BOOKS_TABLE_NAME} SET
+        (chunk_count, min_chunk_id, max_chunk_id) = (
+            SELECT COUNT(*), MIN(id), MAX(id) FROM {TABLE_NAME} WHERE content_hash = ?
+        ),
+        status = 'complete',
+        ingest_finished_at = CURRENT_TIMESTAMP,
+        ingest_generation = (SELECT COALESCE(MAX(ingest_generation), 0) + 1 FROM {BOOKS_TABLE_NAME})
+    WHERE title = ? AND source_file = ?
+    """, (content_hash, title, source_file or ""))
+    client.commit()
+
+def book_is_ingested(client, title: str, source_file: str, content_hash: str) -> bool:
+    """Whether this exact PDF (same content hash) already finished ingesting under title."""
+    if not books_table_exists(client):
+        return False
+    cursor = client.cursor()
+    cursor.execute(
+        f"SELECT 1 FROM {BOOKS_TABLE_NAME} WHERE title = ? AND source_file = ? AND content_hash = ? "
+        f"AND status = 'complete' AND chunk_count > 0",
+        (title, source_file or "", content_hash)
+    )
+    return cursor.fetchone() is not None
+
+def ensure_chunk_key(client):
+    """Add medical_knowledge.content_hash and the unique (content_hash, chunk_index) index (idempotent)."""
+    cursor = client.cursor()
+    cursor.execute(f"PRAGMA table_info({TABLE_NAME})")
+    if "content_hash" not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN content_hash TEXT")
+    # Rows ingested before content hashes existed keep NULL, which never conflicts
+    cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {CHUNK_KEY_INDEX} ON {TABLE_NAME} (content_hash, chunk_index)")
+    client.commit()
+
+def adopt_legacy_chunks(client, content_hash: str, title: str, source_file: str) -> int:
+    """
+    Give chunks of this book that were ingested without a content hash the PDF's hash,
+    so re-ingesting upserts them. Duplicate chunk indexes left by earlier reruns are
+    deleted first (the oldest row is kept). Returns the number of rows adopted.
+    """
+    cursor = client.cursor()
+    legacy = "content_hash IS NULL AND book_title = ? AND source_file = ?"
+    cursor.execute(f"SELECT COUNT(*) FROM {TABLE_NAME} WHERE {legacy}", (title, source_file))
+    if not cursor.fetchone()[0]:
+        return 0
+    cursor.execute(f"""
+    DELETE FROM {TABLE_NAME} WHERE {legacy} AND id NOT IN (
+        SELECT MIN(id) FROM {TABLE_NAME} WHERE {legacy} GROUP BY chunk_index
+    )
+    """, (title, source_file, title, source_file))
+    # Skip indexes this hash already stores (a partial earlier rerun)
+    cursor.execute(f"""
+    DELETE FROM {TABLE_NAME} WHERE {legacy}
+      AND chunk_index IN (SELECT chunk_index FROM {TABLE_NAME} WHERE content_hash = ?)
+    """, (title, source_file, content_hash))
+    cursor.execute(f"UPDATE {TABLE_NAME} SET content_hash = ? WHERE {legacy}", (content_hash, title, source_file))
+    adopted = cursor.rowcount
+    client.commit()
+    return adopted
+
+def chunk_digest(text: str) -> bytes:
+    """Short digest of a chunk's text, used to tell whether a stored chunk is still current."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+
+def stored_chunk_digests(client, content_hash: str, batch_size: int = 500) -> Dict[int, bytes]:
+    """chunk_digest of every stored chunk of a PDF, keyed by chunk_index (texts are not kept)."""
+    cursor = client.cursor()
+    cursor.execute(f"SELECT chunk_index, chunk_text FROM {TABLE_NAME} WHERE content_hash = ?", (content_hash,))
+    digests = {}
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return digests
+        for chunk_index, text in rows:
+            digests[chunk_index] = chunk_digest(text)
+
+def delete_chunks_from(client, content_hash: str, chunk_index: int) -> int:
+    """Delete a PDF's chunks at or beyond chunk_index (left over when its text got shorter)."""
+    cursor = client.cursor()
+    cursor.execute(f"DELETE FROM {TABLE_NAME} WHERE content_hash = ? AND chunk_index >= ?", (content_hash, chunk_index))
+    deleted = cursor.rowcount
+    client.commit()
+    return deleted
+
+def list_books(client) -> List[Dict[str, Any]]:
+    """All books rows, ordered by title."""
+    cursor = client.cursor()
+    cursor.execute(f"SELECT {', '.join(BOOK_COLUMNS)} FROM {BOOKS_TABLE_NAME} ORDER BY title, source_file")
+    return [dict(zip(BOOK_COLUMNS, row)) for row in cursor.fetchall()]
+
+def book_titles(client) -> List[str]:
+    """Distinct book titles: from the books table if present, else from medical_knowledge."""
+    cursor = client.cursor()
+    if books_table_exists(client):
+        cursor.execute(f"SELECT DISTINCT title FROM {BOOKS_TABLE_NAME}")
+    else:
+        cursor.execute(f"SELECT DISTINCT book_title FROM {TABLE_NAME} WHERE book_title IS NOT NULL")
+    return [row[0] for row in cursor.fetchall()]
+
+def corpus_version(client) -> Tuple[int, int, int]:
+    """
+    (chunk_count, max_chunk_id, ingest_generation) of completed ingests, read from the
+    books table when it exists. Changes whenever a book finishes ingesting, including a
+    re-ingest that upserts chunks in place.
+    """
+    cursor = client.cursor()
+    if not books_table_exists(client):
+        cursor.execute(f"SELECT COUNT(*), COALESCE(MAX(id), 0) FROM {TABLE_NAME}")
+        row_count, max_id = cursor.fetchone()
+        return int(row_count), int(max_id), 0
+    generation = "COALESCE(MAX(ingest_generation), 0)" if has_generation_column(client) else "0"
+    cursor.execute(f"SELECT COALESCE(SUM(chunk_count), 0), COALESCE(MAX(max_chunk_id), 0), {generation} "
+                   f"FROM {BOOKS_TABLE_NAME}")
+    chunk_count, max_id, generation = cursor.fetchone()
+    return int(chunk_count), int(max_id), int(generation)
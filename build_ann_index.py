@@ -0,0 +1,93 @@
+"""
+Build the IVF approximate-search index for medical_knowledge and report recall@k vs latency
+Usage:
+  python build_ann_index.py                  # Build with default number of lists and print report
+  python build_ann_index.py --lists 256      # Build with a specific number of lists
+  python build_ann_index.py --report-only    # Evaluate the persisted index without rebuilding
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from libsql_experimental import connect
+from dotenv import load_dotenv
+from knowledge_index import KnowledgeIndex
+from ivf_index import IVFIndex
+
+load_dotenv()
+
+NPROBE_VALUES = [1, 2, 4, 8, 16, 32, 64]
+
+def recall_report(index: KnowledgeIndex, top_k: int = 15, n_queries: int = 200, seed: int = 0):
+    """
+    Compare IVF results to exact search over sample queries.
+    Queries are corpus embeddings with small Gaussian noise, so they behave like
+    real questions that land near (but not exactly on) stored chunks.
+    """
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(index), size=min(n_queries, len(index)), replace=False)
+    noise = rng.normal(scale=0.02, size=(len(sample), index.dimension)).astype(np.float32)
+    queries = index.embeddings[sample] + noise
+
+    start = time.perf_counter()
+    exact = [{r['id'] for r in index.search(q, top_k=top_k)} for q in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    print(f"\nRecall@{top_k} vs latency ({len(queries)} queries, {len(index)} chunks, {index.ivf.n_lists} lists)")
+    print("-" * 50)
+    print(f"{'Mode':<14} | {'Recall':>8} | {'ms/query':>10} | {'Speedup':>8}")
+    print("-" * 50)
+    print(f"{'exact':<14} | {1.0:>8.3f} | {exact_ms:>10.3f} | {1.0:>7.1f}x")
+
+    for nprobe in NPROBE_VALUES:
+        if nprobe > index.ivf.n_lists:
+            break
+        start = time.perf_counter()
+        approx = [{r['id'] for r in index.search(q, top_k=top_k, nprobe=nprobe)} for q in queries]
+        ivf_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        recall = np.mean([len(a & e) / max(len(e), 1) for a, e in zip(approx, exact)])
+        print(f"{'ivf nprobe=' + str(nprobe):<14} | {recall:>8.3f} | {ivf_ms:>10.3f} | {exact_ms / ivf_ms:>7.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the IVF index for approximate knowledge search")
+    parser.add_argument("--lists", type=int, default=None, help="Number of IVF lists (default: 4 * sqrt(chunks))")
+    parser.add_argument("--iterations", type=int, default=20, help="k-means iterations")
+    parser.add_argument("--top-k", type=int, default=15, help="k used for the recall report")
+    parser.add_argument("--report-only", action="store_true", help="Skip building and only report on the persisted index")
+    args = parser.parse_args()
+
+    database_url = os.getenv("TURSO_DATABASE_URL")
+    auth_token = os.getenv("TURSO_AUTH_TOKEN")
+    if not database_url or not auth_token:
+        raise ValueError("Missing required environment variables: TURSO_DATABASE_URL and TURSO_AUTH_TOKEN")
+
+    print("Connecting to Turso database...")
+    client = connect(database_url, auth_token=auth_token)
+    index = KnowledgeIndex.load(client)
+    if len(index) == 0:
+        print("❌ No chunks found in the database!")
+        sys.exit(1)
+    print(f"Loaded {len(index)} chunks (dim {index.dimension})")
+
+    if args.report_only:
+        index.ivf = IVFIndex.load(client, index.ids, index.embeddings)
+        if index.ivf is None:
+            print("❌ No IVF index found - run without --report-only first")
+            sys.exit(1)
+    else:
+        start = time.perf_counter()
+        index.ivf = IVFIndex.build(index.embeddings, n_lists=args.lists, n_iter=args.iterations)
+        print(f"✅ Built {index.ivf.n_lists} lists in {time.perf_counter() - start:.1f}s")
+        index.ivf.save(client, index.ids)
+        print("✅ IVF index saved to database")
+
+    recall_report(index, top_k=args.top_k)
+    print("\nSet SEARCH_MODE=ivf and IVF_NPROBE=<n> on the server to use it.")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ Error: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,56 @@
+"""
+Create (or rebuild) the FTS5 full-text index over medical_knowledge.chunk_text
+New rows are indexed automatically by triggers; this indexes rows that existed before.
+Usage:
+  python build_fts_index.py             # Create the index and triggers if missing
+  python build_fts_index.py --rebuild   # Re-index every row
+  python build_fts_index.py --db local.db
+"""
+import os
+import sys
+import time
+import argparse
+from libsql_experimental import connect
+from dotenv import load_dotenv
+from lexical_index import ensure_fts_index, rebuild_fts_index, lexical_search
+
+load_dotenv()
+
+SAMPLE_QUERIES = ["potassium normal range", "norepinephrine dosing", "ARDS ventilation"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the FTS5 index for hybrid search")
+    parser.add_argument("--db", help="Local libSQL file to use instead of TURSO_DATABASE_URL")
+    parser.add_argument("--rebuild", action="store_true", help="Re-index all rows even if the index exists")
+    args = parser.parse_args()
+
+    if args.db:
+        client = connect(args.db)
+    else:
+        database_url = os.getenv("TURSO_DATABASE_URL")
+        auth_token = os.getenv("TURSO_AUTH_TOKEN")
+        if not database_url or not auth_token:
+            raise ValueError("Missing required environment variables: TURSO_DATABASE_URL and TURSO_AUTH_TOKEN")
+        print("Connecting to Turso database...")
+        client = connect(database_url, auth_token=auth_token)
+
+    start = time.perf_counter()
+    created = ensure_fts_index(client)
+    if args.rebuild and not created:
+        rebuild_fts_index(client)
+    action = "Created" if created else ("Rebuilt" if args.rebuild else "Verified")
+    print(f"✅ {action} full-text index in {time.perf_counter() - start:.1f}s")
+
+    cursor = client.cursor()
+    for query in SAMPLE_QUERIES:
+        start = time.perf_counter()
+        hits = lexical_search(cursor, query, 5)
+        print(f"   '{query}': {len(hits)} hits in {(time.perf_counter() - start) * 1000:.1f} ms")
+    print("\nSet RETRIEVAL_MODE=hybrid (or prefilter) on the server to use it.")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ Error: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,72 @@
+"""
+Build a versioned, memory-mappable snapshot of the knowledge base
+Run after ingesting books; servers with KNOWLEDGE_SNAPSHOT_DIR set map it at startup
+instead of pulling every embedding from Turso.
+Usage:
+  python build_snapshot.py                     # Write to snapshots/
+  python build_snapshot.py --out /data/kb      # Write to another directory
+  python build_snapshot.py --keep 2            # Also delete all but the 2 newest versions
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+from pathlib import Path
+from libsql_experimental import connect
+from dotenv import load_dotenv
+from knowledge_index import KnowledgeIndex
+from snapshot import write_snapshot, load_snapshot
+from book_stats import corpus_version
+
+load_dotenv()
+
+def prune_snapshots(root: str, keep: int):
+    """Delete all but the newest `keep` snapshot versions (never the current one)."""
+    current = (Path(root) / "CURRENT").read_text().strip()
+    versions = sorted((p for p in Path(root).iterdir() if p.is_dir() and p.name.startswith("v")), reverse=True)
+    for path in versions[keep:]:
+        if path.name != current:
+            shutil.rmtree(path)
+            print(f"   Removed old snapshot {path.name}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a memory-mapped knowledge-base snapshot")
+    parser.add_argument("--out", default=os.getenv("KNOWLEDGE_SNAPSHOT_DIR") or "snapshots", help="Snapshot directory")
+    parser.add_argument("--db", help="Local libSQL file to use instead of TURSO_DATABASE_URL")
+    parser.add_argument("--keep", type=int, default=0, help="Keep only this many versions (0 keeps all)")
+    args = parser.parse_args()
+
+    if args.db:
+        client = connect(args.db)
+    else:
+        database_url = os.getenv("TURSO_DATABASE_URL")
+        auth_token = os.getenv("TURSO_AUTH_TOKEN")
+        if not database_url or not auth_token:
+            raise ValueError("Missing required environment variables: TURSO_DATABASE_URL and TURSO_AUTH_TOKEN")
+        print("Connecting to Turso database...")
+        client = connect(database_url, auth_token=auth_token)
+
+    # Read before loading: an ingest finishing meanwhile makes the snapshot stale, not wrong
+    version = corpus_version(client)
+    start = time.perf_counter()
+    index = KnowledgeIndex.load(client)
+    print(f"Loaded {len(index)} chunks from database in {time.perf_counter() - start:.2f}s")
+
+    path = write_snapshot(index, args.out, version)
+    size_mb = sum(f.stat().st_size for f in path.iterdir()) / 1e6
+    print(f"✅ Snapshot written to {path} ({size_mb:.1f} MB)")
+
+    start = time.perf_counter()
+    mapped, manifest = load_snapshot(args.out)
+    print(f"   Memory-mapped {len(mapped)} chunks in {(time.perf_counter() - start) * 1000:.1f} ms (version {manifest['version']})")
+
+    if args.keep:
+        prune_snapshots(args.out, args.keep)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ Error: {e}", file=sys.stderr)
+        sys.exit(1)
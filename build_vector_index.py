@@ -0,0 +1,90 @@
+"""
+Migrate medical_knowledge to libSQL native vectors (F32_BLOB + DiskANN index)
+Adds the embedding_vec column and index if missing, backfills existing rows, and
+compares vector_top_k results to exact in-memory search.
+Usage:
+  python build_vector_index.py                      # Migrate the Turso database from .env
+  python build_vector_index.py --db local.db        # Migrate/test a local libSQL file
+  python build_vector_index.py --report-only
+"""
+import os
+import sys
+import time
+import argparse
+from contextlib import nullcontext
+import numpy as np
+from libsql_experimental import connect
+from dotenv import load_dotenv
+from knowledge_index import KnowledgeIndex
+from vector_backend import LibSQLVectorBackend, ensure_vector_column, backfill_vector_column
+
+load_dotenv()
+
+class _SingleConnection:
+    """Minimal pool stand-in so the backend can run on the script's connection."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def connection(self):
+        return nullcontext(self.client)
+
+def recall_report(client, index: KnowledgeIndex, top_k: int = 15, n_queries: int = 100, seed: int = 0):
+    """Compare libSQL vector_top_k results to exact in-memory search, unfiltered and per book."""
+    backend = LibSQLVectorBackend(_SingleConnection(client))
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(index), size=min(n_queries, len(index)), replace=False)
+    noise = rng.normal(scale=0.02, size=(len(sample), index.dimension)).astype(np.float32)
+    queries = index.embeddings[sample] + noise
+
+    cases = [("all books", None)] + [(title[:30], title) for title in index.books[:3]]
+    print(f"\nRecall@{top_k}: libSQL vector_top_k vs exact ({len(queries)} queries, {len(index)} chunks)")
+    print("-" * 62)
+    print(f"{'Filter':<32} | {'Recall':>8} | {'ms/query':>10}")
+    print("-" * 62)
+    for label, book in cases:
+        exact = [{r['id'] for r in index.search(q, top_k=top_k, book_title=book)} for q in queries]
+        start = time.perf_counter()
+        native = [{r['id'] for r in backend.search(q, top_k=top_k, book_title=book)} for q in queries]
+        elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        recall = np.mean([len(n & e) / max(len(e), 1) for n, e in zip(native, exact)])
+        print(f"{label:<32} | {recall:>8.3f} | {elapsed_ms:>10.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill libSQL native vector column and index")
+    parser.add_argument("--db", help="Local libSQL file to use instead of TURSO_DATABASE_URL")
+    parser.add_argument("--top-k", type=int, default=15, help="k used for the recall report")
+    parser.add_argument("--report-only", action="store_true", help="Skip the migration")
+    args = parser.parse_args()
+
+    if args.db:
+        print(f"Opening local database {args.db}...")
+        client = connect(args.db)
+    else:
+        database_url = os.getenv("TURSO_DATABASE_URL")
+        auth_token = os.getenv("TURSO_AUTH_TOKEN")
+        if not database_url or not auth_token:
+            raise ValueError("Missing required environment variables: TURSO_DATABASE_URL and TURSO_AUTH_TOKEN")
+        print("Connecting to Turso database...")
+        client = connect(database_url, auth_token=auth_token)
+
+    index = KnowledgeIndex.load(client)
+    if len(index) == 0:
+        print("❌ No chunks found in the database!")
+        sys.exit(1)
+
+    if not args.report_only:
+        ensure_vector_column(client, index.dimension)
+        print("Backfilling embedding_vec...")
+        updated = backfill_vector_column(client)
+        print(f"✅ Indexed {updated} existing rows")
+
+    recall_report(client, index, top_k=args.top_k)
+    print("\nSet SEARCH_BACKEND=libsql on the server to use it.")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ Error: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,162 @@
+"""
+Bulk, transactional writes to libSQL/Turso
+BulkWriter sends rows as multi-row INSERT ... VALUES statements (or executemany), one
+explicit transaction per batch, and retries a failed batch as a unit. Against a remote
+Turso database each statement is a network round trip, so batching rows per statement
+is what makes ingestion fast. Used by ingest_book.py for medical_knowledge; any other
+write path can build a BulkWriter for its own table the same way.
+"""
+import time
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from quantization import quantize_int8
+
+TABLE_NAME = "medical_knowledge"
+MAX_STATEMENT_PARAMS = 32766  # SQLite's limit on ? parameters per statement
+
+class BulkWriteError(Exception):
+    """Raised when a batch still fails after all retries (nothing of that batch is committed)."""
+
+class BulkWriter:
+    """
+    Batched INSERT writer for one table.
+
+    Args:
+        client: libSQL (or sqlite3) connection, used from one thread at a time
+        table: Target table
+        columns: Column names, in the order of each row's values
+        placeholders: SQL for one row's values (defaults to "(?, ?, ...)"); use it to wrap
+            a parameter in a function, e.g. "(?, ?, vector32(?))"
+        conflict: Optional clause appended to every statement (e.g. "ON CONFLICT (...) DO UPDATE SET ...")
+        batch_size: Rows per transaction
+        rows_per_statement: Rows per multi-row INSERT (capped by SQLite's parameter limit)
+        mode: "values" (multi-row INSERT statements) or "executemany"
+        max_retries: Retries of a failed batch
+        backoff: Initial wait in seconds before a retry, doubled each time
+    """
+
+    def __init__(self, client, table: str, columns: Sequence[str], placeholders: Optional[str] = None,
+                 conflict: str = "", batch_size: int = 200, rows_per_statement: int = 50,
+                 mode: str = "values", max_retries: int = 3, backoff: float = 0.5):
+        if mode not in ("values", "executemany"):
+            raise ValueError(f"Unknown bulk insert mode: {mode}")
+        self.client = client
+        self.table = table
+        self.columns = list(columns)
+        self.row_placeholders = placeholders or "(" + ", ".join("?" for _ in self.columns) + ")"
+        self.conflict = conflict
+        self.batch_size = max(1, batch_size)
+        self.rows_per_statement = max(1, min(rows_per_statement, MAX_STATEMENT_PARAMS // len(self.columns)))
+        self.mode = mode
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._prefix = f"INSERT INTO {table} ({', '.join(self.columns)}) VALUES "
+        self._statements: Dict[int, str] = {}
+        self._stats = {"rows": 0, "batches": 0, "statements": 0, "retries": 0, "seconds": 0.0}
+
+    def statement(self, rows: int) -> str:
+        """INSERT statement for `rows` rows (cached per row count)."""
+        sql = self._statements.get(rows)
+        if sql is None:
+            sql = self._prefix + ", ".join([self.row_placeholders] * rows)
+            if self.conflict:
+                sql += " " + self.conflict
+            self._statements[rows] = sql
+        return sql
+
+    def write(self, rows: Sequence[Sequence[Any]]) -> int:
+        """Write rows in batches of batch_size, committing each; returns the number of rows written."""
+        written = 0
+        for start in range(0, len(rows), self.batch_size):
+            written += self.write_batch(rows[start:start + self.batch_size])
+        return written
+
+    def write_batch(self, rows: Sequence[Sequence[Any]]) -> int:
+        """Write rows in one transaction, retrying the whole transaction on failure."""
+        if not rows:
+            return 0
+        delay = self.backoff
+        started = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._begin()
+                self._execute(rows)
+                self.client.commit()
+                break
+            except Exception as e:
+                self._rollback()
+                if attempt == self.max_retries:
+                    raise BulkWriteError(f"Writing {len(rows)} rows to {self.table} failed: {e}") from e
+                self._stats["retries"] += 1
+                print(f"⏳ Batch write to {self.table} failed ({e}), retrying in {delay:.1f}s...")
+                time.sleep(delay)
+                delay *= 2
+        self._stats["rows"] += len(rows)
+        self._stats["batches"] += 1
+        self._stats["seconds"] += time.perf_counter() - started
+        return len(rows)
+
+    def _begin(self):
+        # libSQL and sqlite3 open a transaction implicitly on the first write; open it
+        # explicitly so the whole batch is one transaction whatever the isolation level
+        if not getattr(self.client, "in_transaction", False):
+            self.client.execute("BEGIN")
+
+    def _rollback(self):
+        try:
+            self.client.rollback()
+        except Exception:
+            pass
+
+    def _execute(self, rows: Sequence[Sequence[Any]]):
+        cursor = self.client.cursor()
+        if self.mode == "executemany":
+            cursor.executemany(self.statement(1), [tuple(row) for row in rows])
+            self._stats["statements"] += 1
+            return
+        for start in range(0, len(rows), self.rows_per_statement):
+            group = rows[start:start + self.rows_per_statement]
+            cursor.execute(self.statement(len(group)), tuple(value for row in group for value in row))
+            self._stats["statements"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters and throughput for progress reporting and benchmarks."""
+        stats = dict(self._stats)
+        stats["rows_per_second"] = round(stats["rows"] / stats["seconds"], 1) if stats["seconds"] else 0.0
+        stats["seconds"] = round(stats["seconds"], 3)
+        return stats
+
+# medical_knowledge rows: (chunk_text, page_number, page_end, chunk_index, book_title, source_file, content_hash,
+# minhash) followed by the encoded embedding columns
+CHUNK_COLUMNS = [
+    "chunk_text", "page_number", "page_end", "chunk_index", "book_title", "source_file", "content_hash", "minhash",
+    "embedding", "embedding_q8", "embedding_scale", "embedding_vec"
+]
+CHUNK_PLACEHOLDERS = "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, vector32(?))"
+CHUNK_UPSERT = """ON CONFLICT (content_hash, chunk_index) DO UPDATE SET
+    chunk_text = excluded.chunk_text, embedding = excluded.embedding, page_number = excluded.page_number,
+    page_end = excluded.page_end, book_title = excluded.book_title, source_file = excluded.source_file,
+    minhash = excluded.minhash, embedding_q8 = excluded.embedding_q8, embedding_scale = excluded.embedding_scale,
+    embedding_vec = excluded.embedding_vec"""
+
+def chunk_writer(client, batch_size: int = 200, mode: str = "values", table: str = TABLE_NAME) -> BulkWriter:
+    """BulkWriter upserting medical_knowledge rows built by encode_chunk_rows()."""
+    return BulkWriter(client, table, CHUNK_COLUMNS, placeholders=CHUNK_PLACEHOLDERS,
+                      conflict=CHUNK_UPSERT, batch_size=batch_size, mode=mode)
+
+def encode_chunk_rows(chunks: Sequence[Sequence[Any]], embeddings: Sequence[np.ndarray]) -> List[tuple]:
+    """
+    Append the stored embedding columns to each chunk's metadata tuple.
+    Embeddings are converted to float32 and quantized as one matrix, not row by row.
+    """
+    if not chunks:
+        return []
+    matrix = np.asarray(np.stack([np.asarray(e, dtype=np.float32) for e in embeddings]), dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    codes, scales = quantize_int8(matrix / norms)
+    rows = []
+    for i, chunk in enumerate(chunks):
+        embedding_bytes = matrix[i].tobytes()
+        rows.append((*chunk, embedding_bytes, codes[i].tobytes(), float(scales[i]), embedding_bytes))
+    return rows
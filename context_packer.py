@@ -0,0 +1,147 @@
+"""
+Overlap-aware context packing
+Chunks are ingested with a 50-word overlap, so retrieving neighbouring chunks repeats
+the same paragraphs in the prompt. ContextPacker merges neighbouring chunks of the same
+book into one passage (dropping the repeated words), then packs the best-scoring
+passages into a token budget.
+"""
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+CHARS_PER_TOKEN = 4  # rough average for English text with Gemini tokenizers
+MAX_OVERLAP_WORDS = 100  # ingest_book.CHUNK_OVERLAP is 50; allow for re-chunked books
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count (no tokenizer round trip)."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def word_overlap(previous: List[str], following: List[str], max_overlap: int = MAX_OVERLAP_WORDS) -> int:
+    """Length of the longest suffix of `previous` that is also a prefix of `following` (0 if none)."""
+    for size in range(min(len(previous), len(following), max_overlap), 0, -1):
+        if previous[-size:] == following[:size]:
+            return size
+    return 0
+
+def _adjacent(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    """
+    Whether chunk b directly follows chunk a in the same book. Ids say nothing about
+    order (books ingest in parallel, upserts keep old ids, duplicates are skipped), so
+    chunks without a known chunk_index are never merged.
+    """
+    if a.get('book_title') != b.get('book_title'):
+        return False
+    if a.get('chunk_index') is None or b.get('chunk_index') is None:
+        return False
+    return b['chunk_index'] == a['chunk_index'] + 1
+
+def chunk_page_end(chunk: Dict[str, Any]) -> Optional[int]:
+    """Last page a chunk spans ('page_end'), or its first page when that is unknown."""
+    page_end = chunk.get('page_end')
+    return page_end if page_end is not None else chunk.get('page_number')
+
+def merge_adjacent(chunks: List[Dict[str, Any]], max_overlap: int = MAX_OVERLAP_WORDS) -> List[Dict[str, Any]]:
+    """
+    Merge runs of consecutive chunks from the same book into passages, removing the
+    words each chunk repeats from its predecessor. Chunks are only merged when the
+    overlap is actually found in the text.
+
+    Returns passages shaped like search results ('id', 'text', 'page_number',
+    'book_title', 'similarity'), plus 'ids' (merged chunk ids) and 'page_end'.
+    The passage similarity is the best similarity among its chunks.
+    """
+    ordered = sorted(chunks, key=lambda c: (c.get('book_title') or "", c.get('chunk_index') or 0, c['id']))
+    passages: List[Dict[str, Any]] = []
+    previous = None
+    words: List[str] = []
+    for chunk in ordered:
+        chunk_words = chunk['text'].split()
+        overlap = word_overlap(words, chunk_words, max_overlap) if previous and _adjacent(previous, chunk) else 0
+        if overlap:
+            passage = passages[-1]
+            words = words + chunk_words[overlap:]
+            passage['text'] = " ".join(words)
+            passage['ids'].append(chunk['id'])
+            passage['similarity'] = max(passage['similarity'], chunk['similarity'])
+            if chunk_page_end(chunk) is not None:
+                passage['page_end'] = chunk_page_end(chunk)
+        else:
+            words = chunk_words
+            passages.append({
+                'id': chunk['id'],
+                'ids': [chunk['id']],
+                'text': chunk['text'],
+                'page_number': chunk.get('page_number'),
+                'page_end': chunk_page_end(chunk),
+                'book_title': chunk.get('book_title'),
+                'similarity': chunk['similarity']
+            })
+        previous = chunk
+    return passages
+
+class ContextPacker:
+    """
+    Merge overlapping chunks and pack the best passages into a token budget.
+
+    Args:
+        token_budget: Default estimated-token budget per pack() call
+        max_overlap: Longest word overlap looked for between neighbouring chunks
+    """
+
+    def __init__(self, token_budget: int = 6000, max_overlap: int = MAX_OVERLAP_WORDS):
+        self.token_budget = token_budget
+        self.max_overlap = max_overlap
+        self.packs = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self._lock = threading.Lock()
+
+    def pack(self, chunks: List[Dict[str, Any]], token_budget: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """
+        Return (passages, report). Passages are ordered by similarity, best first, and
+        their estimated tokens fit the budget; a passage that does not fit is skipped
+        in favour of smaller, lower-scoring ones.
+        """
+        budget = self.token_budget if token_budget is None else token_budget
+        tokens_in = sum(estimate_tokens(c['text']) for c in chunks)
+        passages = sorted(merge_adjacent(chunks, self.max_overlap), key=lambda p: p['similarity'], reverse=True)
+        tokens_merged = sum(estimate_tokens(p['text']) for p in passages)
+
+        packed, used = [], 0
+        for passage in passages:
+            tokens = estimate_tokens(passage['text'])
+            if used + tokens <= budget:
+                packed.append(passage)
+                used += tokens
+
+        report = {
+            "chunks": len(chunks),
+            "passages": len(passages),
+            "packed": len(packed),
+            "tokens_in": tokens_in,
+            "tokens_merged": tokens_merged,  # after removing overlaps
+            "tokens_out": used,
+            "tokens_saved": tokens_in - used
+        }
+        with self._lock:
+            self.packs += 1
+            self.tokens_in += tokens_in
+            self.tokens_out += used
+        return packed, report
+
+    def stats(self) -> Dict[str, Any]:
+        """Cumulative packing counters for monitoring."""
+        return {
+            "token_budget": self.token_budget,
+            "packs": self.packs,
+            "tokens_in": self.tokens_in,
+            "tokens_out": self.tokens_out,
+            "tokens_saved": self.tokens_in - self.tokens_out,
+            "saved_ratio": round(1 - self.tokens_out / self.tokens_in, 3) if self.tokens_in else 0.0
+        }
+
+def page_label(passage: Dict[str, Any]) -> str:
+    """'Page 12' or 'Pages 12-13' for a passage (empty if the page is unknown)."""
+    start, end = passage.get('page_number'), passage.get('page_end')
+    if not start:
+        return ""
+    return f"Pages {start}-{end}" if end and end != start else f"Page {start}"
@@ -0,0 +1,168 @@
+"""
+Connection pool for Turso/libSQL clients
+Connections are checked out exclusively, so a libSQL connection is never used by
+two threads or tasks at the same time. Idle connections are health-checked before
+reuse and replaced when they fail.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the checkout timeout."""
+
+class ConnectionPool:
+    """
+    Bounded pool of database connections.
+
+    Args:
+        factory: Callable creating a new connection
+        min_size: Connections opened by open() and kept around
+        max_size: Maximum connections open at once (idle + checked out)
+        health_check_interval: Idle seconds after which a connection is pinged before reuse
+        checkout_timeout: Seconds to wait for a free connection before raising PoolTimeout
+    """
+
+    def __init__(self, factory: Callable[[], Any], min_size: int = 1, max_size: int = 4,
+                 health_check_interval: float = 30.0, checkout_timeout: float = 10.0):
+        self.factory = factory
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.health_check_interval = health_check_interval
+        self.checkout_timeout = checkout_timeout
+        self._idle = deque()  # (connection, last_used) pairs, most recently used on the right
+        self._size = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._stats = {"created": 0, "checkouts": 0, "waits": 0, "health_check_failures": 0, "discarded": 0}
+
+    def open(self):
+        """Pre-open min_size connections."""
+        with self._condition:
+            self._closed = False
+            missing = self.min_size - self._size
+            self._size += max(0, missing)
+        for _ in range(max(0, missing)):
+            try:
+                connection = self._create()
+            except Exception:
+                with self._condition:
+                    self._size -= 1
+                raise
+            self._release(connection)
+
+    def close(self):
+        """Close idle connections; connections still checked out are closed on return."""
+        with self._condition:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._condition.notify_all()
+        for connection, _ in idle:
+            self._close_connection(connection)
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the duration of the with-block."""
+        connection = self._acquire()
+        failed = False
+        try:
+            yield connection
+        except Exception:
+            failed = True
+            raise
+        finally:
+            # After an error the connection may be broken; only keep it if it still answers
+            if failed and not self._is_healthy(connection):
+                self._discard(connection)
+            else:
+                self._release(connection)
+
+    def _acquire(self):
+        deadline = time.monotonic() + self.checkout_timeout
+        with self._condition:
+            self._stats["checkouts"] += 1
+            while True:
+                if self._idle:
+                    connection, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    connection, last_used = None, None
+                    break
+                self._stats["waits"] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._condition.wait(remaining):
+                    raise PoolTimeout(f"No database connection available after {self.checkout_timeout}s")
+
+        if connection is None:
+            return self._create_reserved()
+
+        if time.monotonic() - last_used > self.health_check_interval and not self._is_healthy(connection):
+            self._close_connection(connection)
+            return self._create_reserved()
+        return connection
+
+    def _create(self):
+        connection = self.factory()
+        with self._condition:
+            self._stats["created"] += 1
+        return connection
+
+    def _create_reserved(self):
+        """Create a connection for a slot already counted in _size, freeing the slot on failure."""
+        try:
+            return self._create()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+    def _release(self, connection):
+        with self._condition:
+            if self._closed:
+                self._size -= 1
+            else:
+                self._idle.append((connection, time.monotonic()))
+                self._condition.notify()
+                return
+        self._close_connection(connection)
+
+    def _discard(self, connection):
+        with self._condition:
+            self._size -= 1
+            self._stats["discarded"] += 1
+            self._condition.notify()
+        self._close_connection(connection)
+
+    def _is_healthy(self, connection) -> bool:
+        try:
+            connection.cursor().execute("SELECT 1").fetchall()
+            return True
+        except Exception:
+            with self._condition:
+                self._stats["health_check_failures"] += 1
+            return False
+
+    @staticmethod
+    def _close_connection(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def stats(self) -> Dict[str, int]:
+        """Pool counters for monitoring."""
+        with self._condition:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                **self._stats
+            }
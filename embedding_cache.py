@@ -0,0 +1,103 @@
+"""
+Query embedding cache
+Bounded in-memory LRU keyed by a hash of the embedding model plus the normalized text,
+with an optional SQLite file so cached embeddings survive restarts.
+"""
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+import numpy as np
+
+def normalize_text(text: str) -> str:
+    """Normalize text for cache lookups: NFC, collapsed whitespace, stripped."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def cache_key(model: str, text: str) -> str:
+    """Stable key for (model, text)."""
+    return hashlib.sha256(f"{model}\n{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """
+    Thread-safe LRU cache of embedding vectors.
+
+    Args:
+        model: Embedding model name, part of every key
+        max_entries: Maximum number of vectors held in memory
+        persist_path: Optional SQLite file used as a second-level store
+    """
+
+    def __init__(self, model: str, max_entries: int = 1024, persist_path: Optional[str] = None):
+        self.model = model
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if persist_path:
+            self._db = sqlite3.connect(persist_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embedding_cache (key TEXT PRIMARY KEY, model TEXT, embedding BLOB NOT NULL)"
+            )
+            self._db.commit()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Return the cached embedding for text, or None on a miss."""
+        key = cache_key(self.model, text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+
+            if self._db is not None:
+                row = self._db.execute("SELECT embedding FROM embedding_cache WHERE key = ?", (key,)).fetchone()
+                if row:
+                    vector = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, vector)
+                    self.hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, text: str, vector: np.ndarray):
+        """Store the embedding for text (and persist it if a store is configured)."""
+        key = cache_key(self.model, text)
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._remember(key, vector)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embedding_cache (key, model, embedding) VALUES (?, ?, ?)",
+                    (key, self.model, vector.tobytes())
+                )
+                self._db.commit()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters for monitoring."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "persistent": self._db is not None
+        }
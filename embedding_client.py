@@ -0,0 +1,146 @@
+"""
+Shared Google AI Studio embedding client (text-embedding-004)
+Used by both the API server (main.py) and book ingestion (ingest_book.py).
+Sends texts through the batchEmbedContents endpoint over a persistent HTTP session,
+with retry/backoff on rate limits and optional bounded concurrency across batches.
+"""
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+DEFAULT_MODEL = "models/text-embedding-004"
+MAX_BATCH_SIZE = 100  # API limit for batchEmbedContents
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class EmbeddingError(Exception):
+    """Raised when the embedding API fails or returns an unexpected response."""
+
+class EmbeddingClient:
+    """
+    Batched embedding client.
+
+    Args:
+        api_key: Google AI Studio API key
+        model: Embedding model name (e.g. "models/text-embedding-004")
+        base_url: API root; override to point at a local stub server
+        batch_size: Texts per batchEmbedContents request (at most 100)
+        max_retries: Retries per request on 429/5xx and connection errors
+        backoff: Initial backoff in seconds, doubled on each retry
+        max_concurrency: Number of batch requests allowed in flight at once
+        timeout: Per-request timeout in seconds
+        cache: Optional EmbeddingCache consulted before calling the API
+    """
+
+    def __init__(self, api_key: str, model: str = DEFAULT_MODEL, base_url: Optional[str] = None,
+                 batch_size: int = MAX_BATCH_SIZE, max_retries: int = 5, backoff: float = 1.0,
+                 max_concurrency: int = 1, timeout: float = 30.0, cache=None):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = (base_url or os.getenv("EMBEDDING_API_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+        self.batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.cache = cache
+        self.requests_sent = 0
+        self._local = threading.local()
+
+    @property
+    def batch_url(self) -> str:
+        return f"{self.base_url}/{self.model}:batchEmbedContents"
+
+    def _session(self) -> requests.Session:
+        # requests.Session is not guaranteed thread-safe, so each thread keeps its own
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._local.session = session
+        return session
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed a single text."""
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Embed texts, preserving order.
+        Cached texts are skipped; the rest are split into batches of batch_size and
+        sent with up to max_concurrency requests in flight.
+        """
+        embeddings: List[Optional[np.ndarray]] = [None] * len(texts)
+        if self.cache is not None:
+            embeddings = [self.cache.get(text) for text in texts]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+
+        def run(positions):
+            return positions, self._post_batch([texts[i] for i in positions])
+
+        if self.max_concurrency > 1 and len(batches) > 1:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                completed = list(executor.map(run, batches))
+        else:
+            completed = [run(positions) for positions in batches]
+
+        for positions, vectors in completed:
+            for i, vector in zip(positions, vectors):
+                embeddings[i] = vector
+                if self.cache is not None:
+                    self.cache.put(texts[i], vector)
+        return embeddings
+
+    def _post_batch(self, texts: List[str]) -> List[np.ndarray]:
+        payload = {
+            "requests": [
+                {"model": self.model, "content": {"parts": [{"text": text}]}}
+                for text in texts
+            ]
+        }
+        response = self._post_with_retry(payload)
+        try:
+            results = response.json()["embeddings"]
+        except (ValueError, KeyError) as e:
+            raise EmbeddingError(f"Unexpected API response format: {e}")
+        if len(results) != len(texts) or not all(r.get("values") for r in results):
+            raise EmbeddingError("Missing embedding values in batch response")
+        return [np.array(r["values"], dtype=np.float32) for r in results]
+
+    def _post_with_retry(self, payload) -> requests.Response:
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                self.requests_sent += 1
+                response = self._session().post(
+                    self.batch_url, json=payload, params={"key": self.api_key}, timeout=self.timeout
+                )
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if last_attempt:
+                    raise EmbeddingError(f"Error calling Google AI Studio API: {e}")
+                time.sleep(delay)
+                delay *= 2
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES and not last_attempt:
+                retry_after = response.headers.get("Retry-After")
+                wait_time = float(retry_after) if retry_after and retry_after.isdigit() else delay
+                print(f"⏳ Embedding API returned {response.status_code}, retrying in {wait_time:.1f}s...")
+                time.sleep(wait_time)
+                delay *= 2
+                continue
+
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as e:
+                raise EmbeddingError(f"Error calling Google AI Studio API: {e}")
+            return response
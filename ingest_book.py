@@ -6,7 +6,6 @@ import os
 import sys
 from pathlib import Path
 import fitz  # PyMuPDF
-import numpy as np
 from libsql_experimental import connect
 from dotenv import load_dotenv
 import vertexai
@@ -14,7 +13,26 @@ from vertexai.preview.generative_models import GenerativeModel, Part
 from google.oauth2 import service_account
 import json
 import time
-import requests
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from embedding_client import EmbeddingClient
+from quantization import ensure_quantized_columns
+from vector_backend import ensure_vector_column
+from lexical_index import ensure_fts_index
+from book_catalog import ensure_book_catalog, register_book
+from book_stats import (
+    ensure_books_table, start_book_ingest, finish_book_ingest, book_is_ingested, file_sha256,
+    ensure_chunk_key, adopt_legacy_chunks, stored_chunk_digests, chunk_digest, delete_chunks_from
+)
+from pipeline import prefetch
+from bulk_writer import chunk_writer, encode_chunk_rows
+from ocr_cache import OCRCache
+from rate_limiter import AdaptiveRateLimiter, is_rate_limit_error
+from page_renderer import PageRenderer, fitz_lock
+from near_duplicates import (
+    NearDuplicateIndex, ensure_near_duplicate_tables, load_near_duplicate_index, minhash_signature,
+    signature_bytes, record_duplicates, clear_stale_duplicates, duplicate_counts
+)
+from concurrent.futures.process import BrokenProcessPool
 
 load_dotenv()
 
@@ -22,63 +40,22 @@ load_dotenv()
 CHUNK_SIZE = 300  # words per chunk
 CHUNK_OVERLAP = 50  # overlapping words
 TABLE_NAME = "medical_knowledge"
+EMBEDDING_DIMENSION = 768  # text-embedding-004
+INSERT_BATCH_SIZE = int(os.getenv("INSERT_BATCH_SIZE", "200"))  # rows per insert transaction
+# Estimated Jaccard similarity from which a chunk is skipped as a near-duplicate of a stored one (0 disables)
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.85"))
 
 # Google AI Studio API configuration
 GOOGLE_AI_STUDIO_API_KEY = os.getenv("GOOGLE_AI_STUDIO_API_KEY")
 if not GOOGLE_AI_STUDIO_API_KEY:
     raise ValueError("GOOGLE_AI_STUDIO_API_KEY not found in environment variables. Please set it in .env file.")
 
-EMBEDDING_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/text-embedding-004:embedContent"
-
-def get_embedding_google_ai_studio(text: str) -> np.ndarray:
-    """
-    Get embedding using Google AI Studio API (text-embedding-004).
-    Returns a numpy array of the embedding vector.
-    """
-    headers = {
-        "Content-Type": "application/json",
-    }
-    
-    payload = {
-        "model": "models/text-embedding-004",
-        "content": {
-            "parts": [{"text": text}]
-        }
-    }
-    
-    params = {
-        "key": GOOGLE_AI_STUDIO_API_KEY
-    }
-    
-    try:
-        response = requests.post(EMBEDDING_API_URL, json=payload, headers=headers, params=params)
-        response.raise_for_status()
-        
-        result = response.json()
-        embedding_values = result.get("embedding", {}).get("values", [])
-        
-        if not embedding_values:
-            raise ValueError("No embedding values returned from API")
-        
-        return np.array(embedding_values, dtype=np.float32)
-    except requests.exceptions.RequestException as e:
-        raise Exception(f"Error calling Google AI Studio API: {e}")
-    except KeyError as e:
-        raise Exception(f"Unexpected API response format: {e}")
-
-def get_embeddings_batch_google_ai_studio(texts: list) -> list:
-    """
-    Get embeddings for a batch of texts using Google AI Studio API.
-    Note: The API may have rate limits, so we'll process one at a time with a small delay.
-    """
-    embeddings = []
-    for i, text in enumerate(texts):
-        if i > 0 and i % 10 == 0:
-            print(f"    Processed {i}/{len(texts)} embeddings...")
-            time.sleep(0.1)  # Small delay to avoid rate limits
-        embedding = get_embedding_google_ai_studio(text)
-        embeddings.append(embedding)
-    return embeddings
+# Shared batched client: batchEmbedContents over a persistent session with retry on 429
+embedding_client = EmbeddingClient(
+    GOOGLE_AI_STUDIO_API_KEY,
+    batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "100")),
+    max_concurrency=int(os.getenv("EMBEDDING_CONCURRENCY", "2"))
+)
 
 print("✅ Using Google AI Studio API for embeddings (text-embedding-004)")
 
@@ -105,70 +82,65 @@ if os.path.exists(GOOGLE_APPLICATION_CREDENTIALS):
 else:
     raise FileNotFoundError(f"Google credentials file not found: {GOOGLE_APPLICATION_CREDENTIALS}")
 
-def chunk_text(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
-    """Split text into overlapping chunks by word count."""
-    words = text.split()
-    chunks = []
-    
-    i = 0
-    while i < len(words):
-        chunk_words = words[i:i + chunk_size]
-        chunk_text = ' '.join(chunk_words)
-        chunks.append({
-            'text': chunk_text,
-            'start_word': i,
-            'end_word': min(i + chunk_size, len(words))
-        })
-        i += chunk_size - overlap
-    
-    return chunks
+# Gemini Vision OCR: requests in flight (shared by every book) and the request rate ceiling.
+# The limiter halves the rate on 429 / resource exhausted and recovers while requests succeed.
+OCR_CONCURRENCY = int(os.getenv("OCR_CONCURRENCY", "8"))
+OCR_REQUESTS_PER_MINUTE = float(os.getenv("OCR_REQUESTS_PER_MINUTE", "60"))
+OCR_MAX_RETRIES = 10
+# How pages are read: "auto" (embedded text layer where it is good, Gemini Vision OCR for
+# scans and figures), "ocr" (OCR every page) or "text" (text layer only, no OCR calls)
+PAGE_EXTRACTION = os.getenv("PAGE_EXTRACTION", "auto").lower()
+if PAGE_EXTRACTION not in ("auto", "ocr", "text"):
+    raise ValueError(f"PAGE_EXTRACTION must be auto, ocr or text (got {PAGE_EXTRACTION!r})")
+# PDFs processed at the same time, each through its own pipeline
+OCR_PARALLEL_BOOKS = int(os.getenv("OCR_PARALLEL_BOOKS", "2"))
+# Processes that classify and render pages (shared by every book); 0 renders in this process
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(os.cpu_count() or 1)))
+# Pages a book may have in flight (rendering, waiting for OCR, or extracted ahead of the
+# chunker); this bounds the rendered images held in memory
+PAGE_LOOKAHEAD = max(OCR_CONCURRENCY, RENDER_WORKERS, 1) * 2
+
+ocr_limiter = AdaptiveRateLimiter(OCR_REQUESTS_PER_MINUTE)
+ocr_executor = ThreadPoolExecutor(max_workers=max(1, OCR_CONCURRENCY), thread_name_prefix="ocr")
+page_renderer = PageRenderer(RENDER_WORKERS)
+# OCR'd page text and per-book checkpoints, so an interrupted ingest resumes without re-OCR
+# (an empty OCR_CACHE_PATH disables it)
+ocr_cache = OCRCache(os.getenv("OCR_CACHE_PATH", "ocr_cache.sqlite3") or None)
 
-def extract_text_from_pdf_with_gemini(pdf_path, book_title=None):
+def chunk_pages(pages, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
     """
-    Extract text from PDF using Gemini Vision for high-quality OCR.
-    Converts each PDF page to an image and sends to Gemini for text extraction.
-    
-    Args:
-        pdf_path: Path to the PDF file
-        book_title: Optional title for the book (if None, uses filename)
+    Split a stream of (page_number, text) pairs into overlapping chunks by word count.
+    Only the current chunk's words are held in memory. Each chunk carries the exact
+    page span of its words ('page_start', 'page_end'; 1-based) and its word offsets.
     """
-    if not os.path.exists(pdf_path):
-        raise FileNotFoundError(f"PDF file not found: {pdf_path}")
-    
-    if book_title is None:
-        book_title = Path(pdf_path).stem  # Use filename without extension as title
+    step = chunk_size - overlap
+    words, word_pages = [], []  # words not yet emitted past, with the page each came from
+    offset = 0                  # book-wide index of words[0]
     
-    print(f"📖 Reading PDF: {pdf_path}")
-    print(f"   Book Title: {book_title}")
-    doc = fitz.open(pdf_path)
-    total_pages = len(doc)
-    print(f"   Found {total_pages} pages")
-    
-    full_text = ""
+    def emit():
+        end = min(chunk_size, len(words))
+        return {
+            'text': ' '.join(words[:end]),
+            'page_start': word_pages[0],
+            'page_end': word_pages[end - 1],
+            'start_word': offset,
+            'end_word': offset + end
+        }
     
-    for page_num in range(total_pages):
-        page = doc[page_num]
-        
-        # Convert PDF page to image (PNG)
-        # Scale factor of 2 for better quality
-        mat = fitz.Matrix(2.0, 2.0)  # 2x zoom for better OCR quality
-        pix = page.get_pixmap(matrix=mat)
-        img_data = pix.tobytes("png")
-        
-        print(f"   Processing page {page_num + 1}/{total_pages} with Gemini Vision...", end=" ", flush=True)
-        
-        # Retry logic with exponential backoff for rate limits
-        max_retries = 10
-        retry_delay = 2  # Start with 2 seconds
-        page_text = None
-        
-        for attempt in range(max_retries):
-            try:
-                # Create image part for Gemini
-                image_part = Part.from_data(data=img_data, mime_type="image/png")
-                
-                # Prompt for Gemini to extract text
-                prompt = """Extract all text from this medical textbook page. 
+    for page_number, text in pages:
+        page_words = text.split()
+        words.extend(page_words)
+        word_pages.extend([page_number] * len(page_words))
+        while len(words) >= chunk_size:
+            yield emit()
+            del words[:step], word_pages[:step]
+            offset += step
+    while words:
+        yield emit()
+        del words[:step], word_pages[:step]
+        offset += step
+
+OCR_PROMPT = """Extract all text from this medical textbook page. 
                 
 Please:
 1. Extract ALL visible text including headers, body text, captions, footnotes, and any text in tables or diagrams
@@ -179,50 +151,185 @@ Please:
 6. For multi-column layouts, maintain column separation
 
 Return ONLY the extracted text, nothing else. Do not add explanations or summaries."""
-                
-                # Get response from Gemini
-                response = gemini_model.generate_content([image_part, prompt])
-                page_text = response.text.strip()
-                break  # Success, exit retry loop
-                
-            except Exception as e:
-                error_str = str(e).lower()
-                # Check if it's a rate limit error (429 or "resource exhausted")
-                is_rate_limit = "429" in error_str or "resource exhausted" in error_str or "quota" in error_str
-                
-                if is_rate_limit:
-                    if attempt < max_retries - 1:
-                        # Exponential backoff: 2s, 4s, 8s, 16s, 32s...
-                        # If quota exhausted, we might need a longer wait
-                        wait_time = retry_delay * (2 ** attempt)
-                        if "per_minute" in error_str:
-                             wait_time = max(wait_time, 30) # Wait at least 30s if minute quota hit
-                        
-                        print(f"⏳ Rate limited, waiting {wait_time}s before retry...", end=" ", flush=True)
-                        time.sleep(wait_time)
-                        continue
-                
-                print(f"❌ Error: {e}")
-                # Only fallback if it's NOT a rate limit or we ran out of retries
-                if attempt == max_retries - 1:
-                    try:
-                        page_text = page.get_text()
-                        full_text += f"\n\n--- Page {page_num + 1} (fallback extraction) ---\n\n{page_text}"
-                        print(f"   Used fallback extraction ({len(page_text)} characters)")
-                    except:
-                        print(f"   ⚠️  Skipped page {page_num + 1}")
-                    page_text = None
-                break
-        
-        if page_text:
-            full_text += f"\n\n--- Page {page_num + 1} ---\n\n{page_text}"
-            print(f"✅ ({len(page_text)} characters)")
-        
-        # Rate limiting: 5 second delay to stay under RPM limits
-        time.sleep(5)
+
+OCR_FIGURE_PROMPT = """Extract all text from this figure or table cropped from a medical textbook page.
+
+Preserve table structure with clear separators and keep medical terminology exactly as shown.
+Return ONLY the extracted text, nothing else. If there is no text, return nothing."""
+
+def ocr_page(img_data, label="", mime_type="image/png", prompt=OCR_PROMPT):
+    """
+    Extract the text of one rendered page (or page region) with Gemini Vision.
+    Every attempt waits for the shared limiter, which slows down on rate limits.
+    Returns None if the page still fails after OCR_MAX_RETRIES attempts.
+    """
+    for attempt in range(OCR_MAX_RETRIES):
+        ocr_limiter.acquire()
+        try:
+            image_part = Part.from_data(data=img_data, mime_type=mime_type)
+            response = gemini_model.generate_content([image_part, prompt])
+            ocr_limiter.record_success()
+            return response.text.strip()
+        except Exception as e:
+            if is_rate_limit_error(e) and attempt < OCR_MAX_RETRIES - 1:
+                ocr_limiter.record_rate_limit()
+                print(f"   ⏳ {label}: rate limited, OCR slowed to {ocr_limiter.requests_per_minute:.0f} requests/min")
+                continue
+            print(f"   ❌ {label}: {e}")
+            return None
+    return None
+
+def iter_pdf_pages(pdf_path, content_hash, label=None):
+    """
+    Yield (page_number, text) for every page of a PDF in order (1-based page numbers).
+    Each page is classified and rendered on page_renderer's worker processes: pages with
+    a good embedded text layer are read there, and only scanned pages, pages with a
+    garbage text layer, and figure regions come back as images to OCR with Gemini Vision.
+    OCR runs concurrently on the shared ocr_executor (at most OCR_CONCURRENCY requests in
+    flight across all books, paced by ocr_limiter). At most PAGE_LOOKAHEAD pages are in
+    flight ahead of the consumer, so a slow consumer pauses rendering and OCR.
+    OCR results are kept in ocr_cache and not requested again; a page whose OCR fails
+    falls back to its text layer.
     
-    doc.close()
-    return full_text, book_title
+    Args:
+        pdf_path: Path to the PDF file
+        content_hash: SHA-256 of the PDF; keys the OCR cache and the workers' open documents
+        label: Name used in progress output (defaults to the file name)
+    """
+    label = label or Path(pdf_path).stem
+    with fitz_lock, fitz.open(pdf_path) as doc:
+        total_pages = len(doc)
+    cached = ocr_cache.cached_pages(content_hash)
+    todo = [page_num for page_num in range(total_pages) if page_num not in cached]
+    if cached:
+        print(f"   Resuming: {total_pages - len(todo)}/{total_pages} pages already OCR'd (cache: {ocr_cache.path})")
+    ocr_cache.save_progress(content_hash, source_file=Path(pdf_path).name, book_title=label,
+                            page_count=total_pages, pages_done=total_pages - len(todo), stage="ocr")
+    
+    planning = {}  # render future -> page number
+    pending = {}   # OCR future -> (page number, plan)
+    ready = {}     # extracted pages waiting for an earlier page
+    methods = {"cached": total_pages - len(todo), "text": 0, "ocr": 0, "both": 0}
+    next_todo = 0
+    completed = total_pages - len(todo)
+    started = time.time()
+    
+    def page_done(done_page, page_text):
+        nonlocal completed
+        ready[done_page] = page_text
+        completed += 1
+        if completed % 25 == 0 or completed == total_pages:
+            ocr_cache.save_progress(content_hash, pages_done=completed)
+            print(f"   {label[:40]}: {completed}/{total_pages} pages extracted "
+                  f"({time.time() - started:.0f}s; text layer {methods['text']}, OCR {methods['ocr']}, "
+                  f"text + figure OCR {methods['both']}; {ocr_limiter.requests_per_minute:.0f} requests/min)")
+    
+    def planned(done_page, plan):
+        methods[plan["method"]] += 1
+        if plan["image"] is None:
+            page_done(done_page, plan["text"])
+            return
+        prompt = OCR_FIGURE_PROMPT if plan["method"] == "both" else OCR_PROMPT
+        future = ocr_executor.submit(ocr_page, plan["image"], f"{label[:30]} p{done_page + 1}",
+                                     plan["mime_type"], prompt)
+        plan["image"] = None  # the request holds the bytes; do not keep a second reference
+        pending[future] = (done_page, plan)
+    
+    def ocr_done(done_page, plan, ocr_text):
+        if ocr_text is None:
+            # Fall back to the PDF's own text layer (not cached, so a rerun retries OCR)
+            if plan["method"] == "ocr":
+                print(f"   Used fallback extraction for page {done_page + 1} ({len(plan['text'])} characters)")
+            page_text = plan["text"]
+        else:
+            page_text = f"{plan['text'].rstrip()}\n\n{ocr_text}" if plan["method"] == "both" else ocr_text
+            ocr_cache.put_page(content_hash, done_page, page_text)
+        page_done(done_page, page_text)
+    
+    try:
+        for page_num in range(total_pages):
+            if page_num in cached:
+                page_text = ocr_cache.page(content_hash, page_num)
+                if page_text is not None:
+                    yield page_num + 1, page_text
+                    continue
+                # Gone since we listed the cache (e.g. the file was replaced): extract it now
+                todo.insert(next_todo, page_num)
+            while page_num not in ready:
+                # Keep up to PAGE_LOOKAHEAD pages in flight (always at least the page we need next)
+                while next_todo < len(todo) and (len(planning) + len(pending) + len(ready) < PAGE_LOOKAHEAD
+                                                 or todo[next_todo] <= page_num):
+                    todo_page = todo[next_todo]
+                    next_todo += 1
+                    planning[page_renderer.submit(pdf_path, content_hash, todo_page, PAGE_EXTRACTION)] = todo_page
+                done, _ = wait(list(planning) + list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in planning:
+                        done_page = planning.pop(future)
+                        try:
+                            plan = future.result()
+                        except BrokenProcessPool as e:
+                            # A worker died (e.g. MuPDF crashed on a page): render the rest here
+                            page_renderer.disable_workers(str(e) or "a worker process died")
+                            planning[page_renderer.submit(pdf_path, content_hash, done_page, PAGE_EXTRACTION)] = done_page
+                            continue
+                        planned(done_page, plan)
+                    else:
+                        done_page, plan = pending.pop(future)
+                        ocr_done(done_page, plan, future.result())
+            yield page_num + 1, ready.pop(page_num)
+    finally:
+        for future in list(planning) + list(pending):
+            future.cancel()
+    if total_pages - methods["cached"]:
+        print(f"   {label[:40]}: {methods['text']} pages from the text layer, {methods['ocr']} OCR'd, "
+              f"{methods['both']} text layer + figure OCR ({methods['cached']} cached)")
+
+def embed_chunks(chunks, stored_digests, totals, content_hash, book_title, index=None, pending=None):
+    """
+    Group chunks into embedding rounds and yield (embedded, duplicates) pairs, where
+    embedded is a list of (chunk_index, chunk, embedding) and duplicates a list of
+    chunk_duplicates rows for chunks skipped since the previous round.
+    Chunks already stored with identical text (per stored_digests) are skipped, and so
+    are near-duplicates of a chunk in `index` (this book's stored chunks) or `pending`
+    (chunks accepted earlier in this run, indexed there until the caller has written them).
+    totals['chunks'], totals['skipped'] and totals['duplicates'] are kept up to date for the caller.
+    """
+    # Enough chunks per round to keep every concurrent batch request full
+    embedding_batch_size = embedding_client.batch_size * embedding_client.max_concurrency
+    batch = []
+    duplicates = []
+    for chunk_index, chunk in enumerate(chunks):
+        totals['chunks'] = chunk_index + 1
+        if stored_digests.get(chunk_index) == chunk_digest(chunk['text']):
+            totals['skipped'] += 1
+            continue
+        signature = minhash_signature(chunk['text'])
+        chunk['signature'] = signature
+        chunk['minhash'] = signature_bytes(signature)
+        match = None
+        if index is not None and signature is not None:
+            key = (content_hash, chunk_index)
+            # A stored chunk at this index has different text now; its signature is stale
+            index.remove(key)
+            match = index.find(key, signature) or pending.find(key, signature)
+            if match is None:
+                pending.add(key, signature)
+        if match is not None:
+            (canonical_hash, canonical_index), similarity = match
+            totals['duplicates'] += 1
+            duplicates.append((content_hash, chunk_index, book_title, chunk['page_start'], chunk['page_end'],
+                               canonical_hash, canonical_index, round(similarity, 3)))
+            continue
+        batch.append((chunk_index, chunk))
+        if len(batch) >= embedding_batch_size:
+            embeddings = embedding_client.embed_batch([chunk['text'] for _, chunk in batch])
+            yield [(i, chunk, embedding) for (i, chunk), embedding in zip(batch, embeddings)], duplicates
+            batch = []
+            duplicates = []
+    if batch or duplicates:
+        embeddings = embedding_client.embed_batch([chunk['text'] for _, chunk in batch]) if batch else []
+        yield [(i, chunk, embedding) for (i, chunk), embedding in zip(batch, embeddings)], duplicates
 
 def create_table_if_not_exists(client):
     """Create the medical_knowledge table if it doesn't exist."""
@@ -232,64 +339,78 @@ def create_table_if_not_exists(client):
         chunk_text TEXT NOT NULL,
         embedding BLOB NOT NULL,
         page_number INTEGER,
+        page_end INTEGER,
         chunk_index INTEGER,
         book_title TEXT,
         source_file TEXT,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        embedding_q8 BLOB,
+        embedding_scale REAL,
+        embedding_vec F32_BLOB({EMBEDDING_DIMENSION})
     );
     """
     cursor = client.cursor()
     cursor.execute(create_table_sql)
     client.commit()
+    # Tables created before int8 storage / native vectors / page spans existed get the new columns added
+    ensure_page_end_column(client)
+    ensure_quantized_columns(client)
+    ensure_vector_column(client, EMBEDDING_DIMENSION)
+    # FTS5 index over chunk_text, kept in sync by triggers on every insert
+    if ensure_fts_index(client):
+        print("Indexed existing chunks for full-text search.")
+    ensure_book_catalog(client)
+    # Chunks are keyed by (PDF content hash, chunk_index) so reruns upsert instead of duplicating
+    ensure_chunk_key(client)
+    # MinHash signatures and links from skipped near-duplicate chunks to their canonical chunk
+    ensure_near_duplicate_tables(client)
+    if ensure_books_table(client):
+        print("Backfilled the books table from existing chunks.")
     print(f"Table '{TABLE_NAME}' ready.")
 
-def insert_chunk_batch(client, chunks_data):
+def ensure_page_end_column(client):
+    """Add medical_knowledge.page_end (last page a chunk spans; page_number is the first) if missing."""
+    cursor = client.cursor()
+    cursor.execute(f"PRAGMA table_info({TABLE_NAME})")
+    if "page_end" not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN page_end INTEGER")
+    client.commit()
+
+def insert_chunk_batch(client, chunks_data, writer=None):
     """
-    Insert a batch of chunks with their embeddings into Turso.
-    chunks_data: List of tuples (chunk_text, embedding, page_number, chunk_index, book_title, source_file)
+    Upsert chunks with their embeddings into Turso, keyed by (content_hash, chunk_index).
+    Rows go out as multi-row INSERTs, one transaction per INSERT_BATCH_SIZE rows, each
+    retried as a unit on failure.
+    chunks_data: List of tuples (chunk_text, embedding, page_number, page_end, chunk_index, book_title, source_file,
+                 content_hash, minhash)
+    writer: BulkWriter from chunk_writer() to reuse across calls
     """
     if not chunks_data:
         return 0
-    
-    cursor = client.cursor()
-    insert_sql = f"""
-    INSERT INTO {TABLE_NAME} (chunk_text, embedding, page_number, chunk_index, book_title, source_file)
-    VALUES (?, ?, ?, ?, ?, ?)
-    """
-    
-    rows_inserted = 0
-    for chunk_text, embedding, page_number, chunk_index, book_title, source_file in chunks_data:
-        # Ensure embedding is float32 and convert to bytes
-        if isinstance(embedding, np.ndarray):
-            embedding_array = embedding.astype(np.float32)
-        else:
-            embedding_array = np.array(embedding, dtype=np.float32)
-        embedding_bytes = embedding_array.tobytes()
-        
-        # Execute with tuple parameters (not list)
-        cursor.execute(insert_sql, (
-            chunk_text, 
-            embedding_bytes, 
-            page_number, 
-            chunk_index, 
-            book_title, 
-            source_file
-        ))
-        rows_inserted += 1
-    
-    # Explicitly commit the batch
-    client.commit()
-    return rows_inserted
+    writer = writer or chunk_writer(client, batch_size=INSERT_BATCH_SIZE)
+    rows = encode_chunk_rows([(text, *metadata) for text, _, *metadata in chunks_data],
+                             [embedding for _, embedding, *_ in chunks_data])
+    return writer.write(rows)
 
-def process_pdf(pdf_path, book_title=None, client=None):
+def process_pdf(pdf_path, book_title=None, client=None, ensure_schema=True):
     """
-    Process a single PDF file: extract text, chunk, generate embeddings, and upload to Turso.
+    Process a single PDF file as a streaming pipeline: OCR pages -> chunk -> generate
+    embeddings -> upload to Turso. Each stage runs in its own thread and hands work to
+    the next through a bounded queue, so memory stays flat however large the book is
+    and the first rows are written while later pages are still being OCR'd.
     
     Args:
         pdf_path: Path to the PDF file
         book_title: Optional title for the book (if None, uses filename)
         client: Turso database client (if None, creates a new one)
+        ensure_schema: Run create_table_if_not_exists on a newly created client; pass False
+            when the caller already set up the schema (parallel books share one setup)
+    
+    Safe to rerun: a PDF that already finished ingesting is skipped, cached OCR pages are
+    reused, and only chunks that are missing or whose text changed are embedded and upserted.
     """
+    if not os.path.exists(pdf_path):
+        raise FileNotFoundError(f"PDF file not found: {pdf_path}")
     if client is None:
         # Get environment variables
         database_url = os.getenv("TURSO_DATABASE_URL")
@@ -303,70 +424,97 @@ def process_pdf(pdf_path, book_title=None, client=None):
         # Connect to Turso
         print("Connecting to Turso database...")
         client = connect(database_url, auth_token=auth_token)
-        create_table_if_not_exists(client)
+        if ensure_schema:
+            create_table_if_not_exists(client)
+    
+    if book_title is None:
+        book_title = Path(pdf_path).stem  # Use filename without extension as title
+    source_filename = Path(pdf_path).name
+    content_hash = file_sha256(pdf_path)
     
-    # Extract text from PDF using Gemini Vision
     print(f"\n{'='*60}")
     print(f"🔍 Processing: {pdf_path}")
+    print(f"   Book Title: {book_title}")
     print(f"{'='*60}")
-    full_text, final_book_title = extract_text_from_pdf_with_gemini(pdf_path, book_title)
-    print(f"\n✅ Extracted {len(full_text)} characters from PDF")
-    
-    # Split into chunks
-    print(f"Chunking text (size: {CHUNK_SIZE} words, overlap: {CHUNK_OVERLAP} words)...")
-    chunks = chunk_text(full_text)
-    print(f"Created {len(chunks)} chunks")
+    if book_is_ingested(client, book_title, source_filename, content_hash):
+        print(f"⏭️  Already ingested (content hash {content_hash[:12]}), skipping")
+        return 0
+    with fitz_lock, fitz.open(pdf_path) as doc:
+        page_count = len(doc)
+    print(f"   Found {page_count} pages")
     
-    # Generate embeddings and insert into database
-    print("Generating embeddings and uploading to Turso...")
-    embedding_batch_size = 50  # Generate embeddings in batches
-    insert_batch_size = 50  # Insert in batches of 50 and commit
+    # Chunks stored by an earlier (interrupted) run with identical text are not embedded again
+    adopted = adopt_legacy_chunks(client, content_hash, book_title, source_filename)
+    if adopted:
+        print(f"Adopted {adopted} chunks ingested before content hashes were recorded")
+    stored_digests = stored_chunk_digests(client, content_hash)
+    if stored_digests:
+        print(f"Resuming: {len(stored_digests)} chunks already stored")
+    start_book_ingest(client, book_title, source_filename, content_hash, page_count,
+                      embedding_client.model, EMBEDDING_DIMENSION)
+    index = pending = None
+    if NEAR_DUPLICATE_THRESHOLD > 0:
+        index = load_near_duplicate_index(client, content_hash, NEAR_DUPLICATE_THRESHOLD)
+        pending = NearDuplicateIndex(NEAR_DUPLICATE_THRESHOLD)
     
-    source_filename = Path(pdf_path).name
+    print(f"Chunking (size: {CHUNK_SIZE} words, overlap: {CHUNK_OVERLAP} words), embedding and uploading to Turso as pages arrive...")
+    writer = chunk_writer(client, batch_size=INSERT_BATCH_SIZE)
+    totals = {'chunks': 0, 'skipped': 0, 'duplicates': 0}
     total_inserted = 0
-    
-    # Process chunks in embedding batches
-    for emb_i in range(0, len(chunks), embedding_batch_size):
-        emb_batch = chunks[emb_i:emb_i + embedding_batch_size]
-        chunk_texts = [chunk['text'] for chunk in emb_batch]
-        
-        # Generate embeddings for batch using Google AI Studio API
-        print(f"Generating embeddings for batch {emb_i//embedding_batch_size + 1}/{(len(chunks) + embedding_batch_size - 1)//embedding_batch_size}...")
-        embeddings = get_embeddings_batch_google_ai_studio(chunk_texts)
-        
-        # Prepare data for batch insertion
-        batch_data = []
-        for j, (chunk, embedding) in enumerate(zip(emb_batch, embeddings)):
-            # Try to extract page number from chunk text
-            page_num = None
-            if "--- Page" in chunk['text']:
-                try:
-                    page_line = [line for line in chunk['text'].split('\n') if '--- Page' in line]
-                    if page_line:
-                        page_num = int(page_line[0].split('Page')[1].split('---')[0].strip())
-                except:
-                    pass
-            
-            batch_data.append((
-                chunk['text'],
-                embedding,
-                page_num,
-                emb_i + j,
-                final_book_title,
-                source_filename
-            ))
+    # OCR + chunking and embedding each run ahead of the writer by a few batches at most
+    pages = iter_pdf_pages(pdf_path, content_hash, book_title)
+    chunks = prefetch(chunk_pages(pages), maxsize=embedding_client.batch_size * embedding_client.max_concurrency * 2, name="chunker")
+    batches = prefetch(embed_chunks(chunks, stored_digests, totals, content_hash, book_title, index, pending),
+                       maxsize=2, name="embedder")
+    for embedded, duplicates in batches:
+        if not embedded:
+            record_duplicates(client, duplicates)
+            continue
+        batch_data = [(
+            chunk['text'],
+            embedding,
+            chunk['page_start'],
+            chunk['page_end'],
+            chunk_index,
+            book_title,
+            source_filename,
+            content_hash,
+            chunk['minhash']
+        ) for chunk_index, chunk, embedding in embedded]
         
-        # Insert in batches of 50 and commit after each batch
-        for insert_i in range(0, len(batch_data), insert_batch_size):
-            insert_batch = batch_data[insert_i:insert_i + insert_batch_size]
-            rows_inserted = insert_chunk_batch(client, insert_batch)
-            total_inserted += rows_inserted
-            print(f"  ✅ Successfully inserted {rows_inserted} rows (Total: {total_inserted}/{len(chunks)})")
+        # One transaction per INSERT_BATCH_SIZE rows
+        rows_inserted = insert_chunk_batch(client, batch_data, writer)
+        total_inserted += rows_inserted
+        # Only written chunks become canonical for later ones, and duplicate links are
+        # recorded once the chunks they point to are stored
+        if index is not None:
+            for chunk_index, chunk, _ in embedded:
+                if chunk['signature'] is not None:
+                    index.add((content_hash, chunk_index), chunk['signature'])
+                    pending.remove((content_hash, chunk_index))
+        record_duplicates(client, duplicates)
+        ocr_cache.save_progress(content_hash, chunks_stored=totals['skipped'] + totals['duplicates'] + total_inserted)
+        print(f"  ✅ Successfully inserted {rows_inserted} rows (Total: {total_inserted}, through page {embedded[-1][1]['page_end']}/{page_count})")
     
-    print(f"\n✅ Successfully ingested {total_inserted} chunks from '{final_book_title}' into Turso database!")
+    # A rerun whose text came out shorter leaves stale chunks past the end
+    stale = delete_chunks_from(client, content_hash, totals['chunks'])
+    if stale:
+        print(f"Removed {stale} stale chunks")
+    clear_stale_duplicates(client, content_hash, totals['chunks'])
+    finish_book_ingest(client, book_title, source_filename, content_hash)
+    ocr_cache.save_progress(content_hash, chunk_count=totals['chunks'], chunks_stored=totals['chunks'], stage="complete")
+    print(f"\n✅ Successfully ingested {total_inserted} chunks from '{book_title}' into Turso database!"
+          f" ({totals['chunks']} chunks in total, {totals['skipped']} already stored,"
+          f" {totals['duplicates']} near-duplicates skipped)")
+    # Make the book routable by /chat (aliases are derived from its title; edit book_catalog to add more)
+    book_id = register_book(client, book_title)
+    print(f"📚 Book catalog id: {book_id}")
     return total_inserted
 
 def main():
+    # Fork the render workers before any other thread exists (see PageRenderer.start)
+    page_renderer.start()
+    
     # Get environment variables
     database_url = os.getenv("TURSO_DATABASE_URL")
     auth_token = os.getenv("TURSO_AUTH_TOKEN")
@@ -426,22 +574,44 @@ def main():
         print(f"\n📚 Found {len(pdf_files)} PDF file(s)...")
     
     total_chunks = 0
+    pdf_paths = []
     for pdf_path in pdf_files:
         pdf_path = str(pdf_path)
         if not os.path.exists(pdf_path):
             print(f"⚠️  Skipping {pdf_path} (file not found)")
             continue
-        
-        try:
-            chunks_count = process_pdf(pdf_path, client=client)
-            total_chunks += chunks_count
-        except Exception as e:
-            print(f"❌ Error processing {pdf_path}: {e}")
-            continue
+        pdf_paths.append(pdf_path)
+    
+    # Run several book pipelines at once; they share ocr_limiter, the OCR workers and the
+    # embedding client. libSQL connections are per thread, so each book opens its own.
+    with ThreadPoolExecutor(max_workers=max(1, OCR_PARALLEL_BOOKS), thread_name_prefix="book") as books:
+        if OCR_PARALLEL_BOOKS > 1 and len(pdf_paths) > 1:
+            # Schema setup and migrations ran once above, so workers only open a connection
+            runs = [(pdf_path, books.submit(process_pdf, pdf_path, ensure_schema=False)) for pdf_path in pdf_paths]
+        else:
+            runs = [(pdf_path, None) for pdf_path in pdf_paths]
+        for pdf_path, run in runs:
+            try:
+                chunks_count = run.result() if run else process_pdf(pdf_path, client=client)
+                total_chunks += chunks_count
+            except Exception as e:
+                print(f"❌ Error processing {pdf_path}: {e}")
+                continue
+    ocr_executor.shutdown()
+    page_renderer.shutdown()
+    
+    stats = ocr_limiter.stats()
+    print(f"OCR: {stats['acquired']} requests, {stats['rate_limited']} rate-limited, "
+          f"final rate {stats['requests_per_minute']}/{stats['max_requests_per_minute']} requests/min")
+    
+    counts = duplicate_counts(client)
+    if counts:
+        print(f"Near-duplicate chunks skipped (all books): {sum(counts.values())}")
     
     print(f"\n{'='*60}")
     print(f"🎉 All done! Total chunks ingested: {total_chunks}")
     print(f"Table: {TABLE_NAME}")
+    print("Run 'python build_snapshot.py' to refresh the server's knowledge-base snapshot.")
     print(f"{'='*60}")
 
 if __name__ == "__main__":
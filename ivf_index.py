@@ -0,0 +1,165 @@
+"""
+Inverted-file (IVF) approximate nearest-neighbour index for the knowledge base
+Spherical k-means partitions the normalized embeddings into lists; a query only
+scores the rows in its `nprobe` closest lists. The centroids and list membership
+are persisted in the same database as the embeddings.
+"""
+from typing import List, Optional, Tuple
+import numpy as np
+
+IVF_TABLE_NAME = "medical_knowledge_ivf"
+ASSIGN_BATCH_SIZE = 8192  # rows scored against the centroids at once
+
+class IVFIndex:
+    """
+    IVF lists over the rows of a KnowledgeIndex.
+
+    `order` holds row numbers grouped by list, and list i covers
+    order[list_offsets[i]:list_offsets[i + 1]].
+    """
+
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.assignments = np.asarray(assignments, dtype=np.int32)
+        self.order = np.argsort(self.assignments, kind="stable")
+        counts = np.bincount(self.assignments, minlength=len(self.centroids))
+        self.list_offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, n_lists: Optional[int] = None, n_iter: int = 20, seed: int = 0) -> "IVFIndex":
+        """
+        Cluster normalized embeddings with spherical k-means.
+
+        Args:
+            embeddings: L2-normalized (n, dim) matrix
+            n_lists: Number of lists (defaults to 4 * sqrt(n))
+            n_iter: k-means iterations
+            seed: Random seed for centroid initialization
+        """
+        n = len(embeddings)
+        if n == 0:
+            raise ValueError("Cannot build an IVF index over an empty corpus")
+        if n_lists is None:
+            n_lists = int(4 * np.sqrt(n))
+        n_lists = max(1, min(n_lists, n))
+
+        rng = np.random.default_rng(seed)
+        centroids = embeddings[rng.choice(n, size=n_lists, replace=False)].copy()
+        assignments = np.zeros(n, dtype=np.int32)
+
+        for _ in range(n_iter):
+            assignments = assign_to_centroids(embeddings, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, embeddings)
+            counts = np.bincount(assignments, minlength=n_lists)
+
+            # Reseed empty lists from random rows so every list stays useful
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                sums[empty] = embeddings[rng.choice(n, size=len(empty), replace=False)]
+
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        return cls(centroids, assign_to_centroids(embeddings, centroids))
+
+    def candidate_rows(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Rows in the nprobe lists whose centroids are closest to the normalized query."""
+        nprobe = max(1, min(nprobe, self.n_lists))
+        centroid_scores = self.centroids @ query
+        if nprobe < self.n_lists:
+            lists = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            lists = np.arange(self.n_lists)
+        return np.concatenate([self.order[self.list_offsets[i]:self.list_offsets[i + 1]] for i in lists])
+
+    def save(self, client, ids: np.ndarray):
+        """
+        Persist centroids and list membership (as chunk ids) to the database.
+
+        Args:
+            client: Database client
+            ids: Chunk id of every row, in the row order the index was built on
+        """
+        cursor = client.cursor()
+        create_ivf_table_if_not_exists(client)
+        cursor.execute(f"DELETE FROM {IVF_TABLE_NAME}")
+        for list_id in range(self.n_lists):
+            rows = self.order[self.list_offsets[list_id]:self.list_offsets[list_id + 1]]
+            cursor.execute(
+                f"INSERT INTO {IVF_TABLE_NAME} (list_id, centroid, chunk_ids) VALUES (?, ?, ?)",
+                (list_id, self.centroids[list_id].tobytes(), np.asarray(ids[rows], dtype=np.int64).tobytes())
+            )
+        client.commit()
+
+    @classmethod
+    def load(cls, client, ids: np.ndarray, embeddings: np.ndarray) -> Optional["IVFIndex"]:
+        """
+        Load a persisted index and map it onto the current rows.
+        Chunks ingested after the index was built are assigned to their nearest centroid.
+        Returns None if no index has been built.
+
+        Args:
+            client: Database client
+            ids: Chunk id of every row in the current KnowledgeIndex
+            embeddings: Normalized embedding matrix of the current KnowledgeIndex
+        """
+        cursor = client.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (IVF_TABLE_NAME,))
+        if not cursor.fetchone():
+            return None
+        cursor.execute(f"SELECT list_id, centroid, chunk_ids FROM {IVF_TABLE_NAME} ORDER BY list_id")
+        rows = cursor.fetchall()
+        if not rows:
+            return None
+
+        centroids = np.vstack([np.frombuffer(centroid, dtype=np.float32) for _, centroid, _ in rows])
+        if centroids.shape[1] != embeddings.shape[1]:
+            print(f"⚠️  IVF index dimension {centroids.shape[1]} does not match embeddings ({embeddings.shape[1]}), ignoring it")
+            return None
+
+        row_of_id = {int(chunk_id): row for row, chunk_id in enumerate(ids)}
+        assignments = np.full(len(ids), -1, dtype=np.int32)
+        for list_id, _, chunk_ids in rows:
+            for chunk_id in np.frombuffer(chunk_ids, dtype=np.int64):
+                row = row_of_id.get(int(chunk_id))
+                if row is not None:
+                    assignments[row] = list_id
+
+        unassigned = np.flatnonzero(assignments < 0)
+        if len(unassigned):
+            assignments[unassigned] = assign_to_centroids(embeddings[unassigned], centroids)
+        return cls(centroids, assignments)
+
+def assign_to_centroids(embeddings: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the most similar centroid for every row, computed in batches to bound memory."""
+    assignments = np.empty(len(embeddings), dtype=np.int32)
+    for start in range(0, len(embeddings), ASSIGN_BATCH_SIZE):
+        batch = embeddings[start:start + ASSIGN_BATCH_SIZE]
+        assignments[start:start + len(batch)] = np.argmax(batch @ centroids.T, axis=1)
+    return assignments
+
+def create_ivf_table_if_not_exists(client):
+    """Create the table holding IVF centroids and list membership."""
+    cursor = client.cursor()
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {IVF_TABLE_NAME} (
+        list_id INTEGER PRIMARY KEY,
+        centroid BLOB NOT NULL,
+        chunk_ids BLOB NOT NULL,
+        built_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+    client.commit()
+
+def rows_in_ranges(rows: np.ndarray, ranges: List[Tuple[int, int]]) -> np.ndarray:
+    """Subset of rows that fall inside any of the (start, end) ranges."""
+    mask = np.zeros(len(rows), dtype=bool)
+    for start, end in ranges:
+        mask |= (rows >= start) & (rows < end)
+    return rows[mask]
@@ -0,0 +1,146 @@
+"""
+Incremental parsing of a streamed JSON object
+Gemini streams the SBAR report as one JSON object in arbitrary text fragments.
+IncrementalJSONObject consumes those fragments and reports the decoded text of each
+top-level string value as it arrives, so a client can render one section while the
+next is still being generated. Non-string values (objects, lists, numbers) are skipped;
+the complete text is still parsed normally once generation finishes.
+"""
+from typing import List, Optional, Tuple
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+# Parser states
+_BEFORE_OBJECT = 0  # skipping anything (e.g. a ```json fence) before the opening brace
+_EXPECT_KEY = 1
+_IN_KEY = 2
+_EXPECT_COLON = 3
+_EXPECT_VALUE = 4
+_IN_STRING = 5
+_IN_OTHER = 6      # non-string value: track nesting until it ends
+_DONE = 7
+
+class IncrementalJSONObject:
+    """
+    Streaming decoder for the string values of a top-level JSON object.
+
+    feed() returns (key, text) deltas in order; concatenating every delta for a key
+    gives that key's decoded string value.
+    """
+
+    def __init__(self):
+        self.state = _BEFORE_OBJECT
+        self.key: Optional[str] = None
+        self._key_chars: List[str] = []
+        self._escape: Optional[str] = None      # pending escape sequence after a backslash
+        self._high_surrogate: Optional[int] = None
+        self._depth = 0                         # nesting depth inside a non-string value
+        self._other_in_string = False
+        self._other_escape = False
+
+    @property
+    def done(self) -> bool:
+        return self.state == _DONE
+
+    def feed(self, text: str) -> List[Tuple[str, str]]:
+        """Consume a fragment of the stream and return the new (key, text) deltas."""
+        deltas: List[Tuple[str, str]] = []
+        value: List[str] = []
+        for char in text:
+            state = self.state
+            if state == _IN_STRING:
+                if self._escape is not None:
+                    decoded = self._continue_escape(char)
+                    if decoded:
+                        value.append(decoded)
+                elif char == '\\':
+                    self._escape = ''
+                elif char == '"':
+                    self.state = _EXPECT_KEY
+                    self._flush(deltas, value)
+                else:
+                    value.append(char)
+            elif state == _IN_KEY:
+                if self._escape is not None:
+                    decoded = self._continue_escape(char)
+                    if decoded:
+                        self._key_chars.append(decoded)
+                elif char == '\\':
+                    self._escape = ''
+                elif char == '"':
+                    self.key = "".join(self._key_chars)
+                    self._key_chars = []
+                    self.state = _EXPECT_COLON
+                else:
+                    self._key_chars.append(char)
+            elif state == _IN_OTHER:
+                self._skip_other(char)
+            elif state == _BEFORE_OBJECT:
+                if char == '{':
+                    self.state = _EXPECT_KEY
+            elif state == _EXPECT_KEY:
+                if char == '"':
+                    self.state = _IN_KEY
+                elif char == '}':
+                    self.state = _DONE
+            elif state == _EXPECT_COLON:
+                if char == ':':
+                    self.state = _EXPECT_VALUE
+            elif state == _EXPECT_VALUE:
+                if char == '"':
+                    self.state = _IN_STRING
+                elif not char.isspace():
+                    self.state = _IN_OTHER
+                    self._depth = 0
+                    self._skip_other(char)
+        self._flush(deltas, value)
+        return deltas
+
+    def _flush(self, deltas: List[Tuple[str, str]], value: List[str]):
+        if value:
+            deltas.append((self.key, "".join(value)))
+            value.clear()
+
+    def _continue_escape(self, char: str) -> str:
+        """Extend the pending escape with char; returns decoded text once it is complete."""
+        sequence = self._escape + char
+        if sequence[0] != 'u':
+            self._escape = None
+            return _ESCAPES.get(char, char)
+        if len(sequence) < 5:
+            self._escape = sequence
+            return ''
+        self._escape = None
+        try:
+            code = int(sequence[1:], 16)
+        except ValueError:
+            return ''
+        if 0xD800 <= code < 0xDC00:
+            self._high_surrogate = code
+            return ''
+        if 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._high_surrogate = None
+        return chr(code)
+
+    def _skip_other(self, char: str):
+        """Advance through a non-string value; hands back to the object level when it ends."""
+        if self._other_in_string:
+            if self._other_escape:
+                self._other_escape = False
+            elif char == '\\':
+                self._other_escape = True
+            elif char == '"':
+                self._other_in_string = False
+        elif char == '"':
+            self._other_in_string = True
+        elif char in '{[':
+            self._depth += 1
+        elif char in '}]':
+            if self._depth == 0:
+                # Closing brace of the top-level object right after a scalar value
+                self.state = _DONE
+            else:
+                self._depth -= 1
+        elif char == ',' and self._depth == 0:
+            self.state = _EXPECT_KEY
@@ -0,0 +1,460 @@
+"""
+In-memory retrieval index for the medical_knowledge table
+Loads every embedding once into a contiguous, pre-normalized float32 matrix so a
+search is a single matrix-vector product plus an argpartition top-k.
+"""
+import threading
+from typing import List, Dict, Any, Callable, Optional, Sequence, Tuple, Union
+import numpy as np
+from ivf_index import IVFIndex, rows_in_ranges
+from quantization import QuantizedMatrix, quantize_vector, fetch_float_embeddings
+from lexical_index import reciprocal_rank_fusion, RRF_K
+
+TABLE_NAME = "medical_knowledge"
+
+BookFilter = Optional[Union[str, Sequence[str]]]
+
+class KnowledgeIndex:
+    """
+    Resident copy of the knowledge base.
+
+    Row i of `embeddings` is the L2-normalized embedding of chunk `ids[i]`, with
+    `book_titles[i]`, `page_numbers[i]`, `texts[i]`, `chunk_indexes[i]` (position
+    of the chunk in its book, None if unknown) and `page_ends[i]` (last page the chunk
+    spans, None if unknown) as its parallel metadata.
+    Zero-norm embeddings are left as zero rows so they always score 0.0.
+
+    Rows are stored grouped by book, and `book_offsets` maps each title to its
+    (start, end) row range, so a filtered search only touches a contiguous slice.
+
+    `embeddings` may instead be a QuantizedMatrix (int8 codes); set `rescorer` to
+    re-rank the coarse shortlist with full-precision vectors.
+    """
+
+    def __init__(self, ids, embeddings, book_titles, page_numbers, texts, chunk_indexes=None, page_ends=None):
+        ids = np.asarray(ids, dtype=np.int64)
+        if chunk_indexes is None:
+            chunk_indexes = [None] * len(ids)
+        if page_ends is None:
+            page_ends = [None] * len(ids)
+        book_keys = np.array([title or "" for title in book_titles], dtype=object)
+        order = np.lexsort((ids, book_keys)) if len(ids) else np.arange(0)
+
+        if isinstance(embeddings, QuantizedMatrix):
+            embeddings = embeddings[order]  # quantized from normalized vectors
+        else:
+            embeddings = normalize_rows(np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32)[order]))
+        sorted_titles = [book_titles[i] for i in order]
+        self._assign(
+            ids[order], embeddings, sorted_titles,
+            [page_numbers[i] for i in order], [texts[i] for i in order],
+            book_partition_offsets(sorted_titles), [chunk_indexes[i] for i in order],
+            [page_ends[i] for i in order]
+        )
+
+    def _assign(self, ids, embeddings, book_titles, page_numbers, texts, book_offsets, chunk_indexes, page_ends):
+        self.ids = ids
+        self.embeddings = embeddings
+        self.book_titles = book_titles
+        self.page_numbers = page_numbers
+        self.texts = texts
+        self.chunk_indexes = chunk_indexes
+        self.page_ends = page_ends
+        self.book_offsets = book_offsets
+        self.ivf = None  # Optional IVFIndex for approximate search
+        self.rescorer: Optional[Callable[[List[int]], Dict[int, np.ndarray]]] = None  # ids -> float32 vectors
+        self.rescore_factor = 4
+        self._id_order = None  # argsort of ids, built on first rows_for_ids()
+
+    @classmethod
+    def from_sorted(cls, ids, embeddings, book_titles, page_numbers, texts,
+                    book_offsets: Dict[str, Tuple[int, int]], chunk_indexes=None, page_ends=None) -> "KnowledgeIndex":
+        """
+        Wrap rows that are already grouped by book and L2-normalized, without copying them.
+        Used for memory-mapped snapshot arrays; any sequence type works for the metadata.
+        """
+        index = cls.__new__(cls)
+        if chunk_indexes is None:
+            chunk_indexes = [None] * len(ids)
+        if page_ends is None:
+            page_ends = [None] * len(ids)
+        index._assign(ids, embeddings, book_titles, page_numbers, texts, dict(book_offsets), chunk_indexes, page_ends)
+        return index
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dimension(self) -> int:
+        return self.embeddings.shape[1] if self.embeddings.ndim == 2 else 0
+
+    @classmethod
+    def from_rows(cls, rows) -> "KnowledgeIndex":
+        """
+        Build an index from (id, chunk_text, embedding_bytes, page_number, book_title[, chunk_index[, page_end]])
+        rows. Rows whose embedding dimension differs from the first row are skipped.
+        """
+        ids, vectors, book_titles, page_numbers, texts, chunk_indexes, page_ends = [], [], [], [], [], [], []
+        dimension = None
+        skipped = 0
+        for row in rows:
+            chunk_id, chunk_text, embedding_bytes, page_number, book_title = row[:5]
+            chunk_index = row[5] if len(row) > 5 else None
+            page_end = row[6] if len(row) > 6 else None
+            vector = np.frombuffer(embedding_bytes, dtype=np.float32)
+            if dimension is None:
+                dimension = vector.shape[0]
+            if vector.shape[0] != dimension:
+                skipped += 1
+                continue
+            ids.append(chunk_id)
+            vectors.append(vector)
+            book_titles.append(book_title)
+            page_numbers.append(page_number)
+            texts.append(chunk_text)
+            chunk_indexes.append(chunk_index)
+            page_ends.append(page_end)
+
+        if skipped:
+            print(f"⚠️  Skipped {skipped} chunks with unexpected embedding dimension")
+
+        embeddings = np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+        return cls(ids, embeddings, book_titles, page_numbers, texts, chunk_indexes, page_ends)
+
+    @classmethod
+    def load(cls, client) -> "KnowledgeIndex":
+        """Load every chunk from the database in a single pass."""
+        cursor = client.cursor()
+        cursor.execute(f"SELECT id, chunk_text, embedding, page_number, book_title, chunk_index, page_end FROM {TABLE_NAME} ORDER BY id")
+        return cls.from_rows(cursor.fetchall())
+
+    @classmethod
+    def load_quantized(cls, client) -> "KnowledgeIndex":
+        """
+        Load int8 codes instead of float32 embeddings (4x less transfer and memory).
+        Rows not yet backfilled by quantize_embeddings.py are quantized on load.
+        """
+        cursor = client.cursor()
+        cursor.execute(f"""
+            SELECT id, chunk_text, embedding_q8, embedding_scale,
+                   CASE WHEN embedding_q8 IS NULL THEN embedding END,
+                   page_number, book_title, chunk_index, page_end
+            FROM {TABLE_NAME} ORDER BY id
+        """)
+        ids, codes, scales, book_titles, page_numbers, texts, chunk_indexes, page_ends = [], [], [], [], [], [], [], []
+        for (chunk_id, chunk_text, q8_bytes, scale, embedding_bytes,
+             page_number, book_title, chunk_index, page_end) in cursor.fetchall():
+            if q8_bytes is None:
+                q8_bytes, scale = quantize_vector(np.frombuffer(embedding_bytes, dtype=np.float32))
+            ids.append(chunk_id)
+            codes.append(np.frombuffer(q8_bytes, dtype=np.int8))
+            scales.append(scale)
+            book_titles.append(book_title)
+            page_numbers.append(page_number)
+            texts.append(chunk_text)
+            chunk_indexes.append(chunk_index)
+            page_ends.append(page_end)
+
+        if codes and len({len(c) for c in codes}) > 1:
+            raise ValueError("Quantized embeddings have inconsistent dimensions")
+        matrix = QuantizedMatrix(
+            np.vstack(codes) if codes else np.zeros((0, 0), dtype=np.int8),
+            np.array(scales, dtype=np.float32)
+        )
+        return cls(ids, matrix, book_titles, page_numbers, texts, chunk_indexes, page_ends)
+
+    @property
+    def books(self) -> List[str]:
+        return list(self.book_offsets)
+
+    def book_ranges(self, book_title: BookFilter = None) -> List[Tuple[int, int]]:
+        """
+        Row ranges covered by a book filter.
+
+        Args:
+            book_title: None for the whole corpus, a single title, or a list of titles
+        """
+        if not book_title:
+            return [(0, len(self))]
+        titles = [book_title] if isinstance(book_title, str) else list(dict.fromkeys(book_title))
+        return [self.book_offsets[title] for title in titles if title in self.book_offsets]
+
+    def search(self, query_embedding: np.ndarray, top_k: int = 5, book_title: BookFilter = None,
+               nprobe: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Return the top_k chunks by cosine similarity to query_embedding.
+        Result dicts are only built for the winning rows.
+
+        Args:
+            query_embedding: Raw (unnormalized) query vector
+            top_k: Number of results to return
+            book_title: Optional book title, or list of titles, to restrict the search to
+            nprobe: If set and an IVF index is attached, only score rows in the nprobe
+                closest IVF lists (approximate); otherwise search exactly. A book-filtered
+                query whose probed lists hold fewer than top_k of the book's rows scores
+                the book exactly instead
+        """
+        return self.search_batch([query_embedding], [(book_title, top_k)], nprobe=nprobe)[0]
+
+    def search_batch(self, query_embeddings: np.ndarray, requests: Sequence[Tuple[BookFilter, int]],
+                     nprobe: Optional[int] = None,
+                     candidate_rows: Optional[Sequence[Optional[np.ndarray]]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Search several queries at once.
+        Queries sharing a book filter are scored together with one matrix-matrix product.
+        With a quantized matrix, each query keeps top_k * rescore_factor coarse candidates
+        and the union of all shortlists is rescored with one full-precision fetch.
+
+        Args:
+            query_embeddings: (m, dim) matrix of raw query vectors
+            requests: (book_title, top_k) for each query row
+            nprobe: Use the IVF index, as in search()
+            candidate_rows: Optional per-query row subsets (e.g. lexical prefilter hits);
+                a query with candidates only scores those rows
+        """
+        results = [[] for _ in requests]
+        if len(self) == 0 or not len(requests):
+            return results
+
+        queries = normalize_rows(np.array(query_embeddings, dtype=np.float32, ndmin=2))
+        if queries.shape[1] != self.dimension:
+            raise ValueError(f"Query embedding has dimension {queries.shape[1]}, index has {self.dimension}")
+
+        factor = self.rescore_factor if self.rescorer is not None else 1
+        shortlists: List[Optional[Tuple[np.ndarray, np.ndarray]]] = [None] * len(requests)
+
+        grouped = []
+        for i, (book, top_k) in enumerate(requests):
+            ranges = self.book_ranges(book)
+            if not ranges or top_k <= 0:
+                continue
+            if candidate_rows is not None and candidate_rows[i] is not None:
+                rows = np.asarray(candidate_rows[i], dtype=np.int64)
+                if book:
+                    rows = rows_in_ranges(rows, ranges)
+            elif nprobe and self.ivf is not None:
+                rows = self.ivf.candidate_rows(queries[i], nprobe)
+                if book:
+                    rows = rows_in_ranges(rows, ranges)
+                    # The probed lists held too few of the book's rows: score its slice exactly
+                    if len(rows) < min(top_k, sum(end - start for start, end in ranges)):
+                        grouped.append(i)
+                        continue
+            else:
+                grouped.append(i)
+                continue
+            scores = self.embeddings[rows] @ queries[i]
+            best = top_k_indices(scores, top_k * factor)
+            shortlists[i] = (rows[best], scores[best])
+
+        groups: Dict[Tuple[Tuple[int, int], ...], List[int]] = {}
+        for i in grouped:
+            groups.setdefault(tuple(self.book_ranges(requests[i][0])), []).append(i)
+
+        for ranges, members in groups.items():
+            # Book slices are views, so only the filtered rows are scored
+            block = queries[members].T
+            scores = np.concatenate([self.embeddings[start:end] @ block for start, end in ranges])
+            rows = np.concatenate([np.arange(start, end) for start, end in ranges])
+            for column, i in enumerate(members):
+                best = top_k_indices(scores[:, column], requests[i][1] * factor)
+                shortlists[i] = (rows[best], scores[best, column])
+
+        if self.rescorer is not None:
+            shortlists = self._rescore(queries, shortlists)
+
+        for i, shortlist in enumerate(shortlists):
+            if shortlist is None:
+                continue
+            rows, scores = shortlist
+            top_k = requests[i][1]
+            results[i] = [self._result(row, score) for row, score in zip(rows[:top_k], scores[:top_k])]
+        return results
+
+    def hybrid_search_batch(self, query_embeddings: np.ndarray, requests: Sequence[Tuple[BookFilter, int]],
+                            lexical_hits: Sequence[Sequence[int]], vector_candidates: int = 50,
+                            nprobe: Optional[int] = None, rrf_k: int = RRF_K) -> List[List[Dict[str, Any]]]:
+        """
+        Fuse vector and lexical rankings with reciprocal rank fusion.
+        Results are ordered by fused score; 'similarity' stays the cosine similarity
+        (computed for lexical-only hits too) and 'rrf_score' holds the fused score.
+
+        Args:
+            query_embeddings: (m, dim) matrix of raw query vectors
+            requests: (book_title, top_k) for each query row
+            lexical_hits: Ranked chunk ids per query, already restricted to the query's books
+            vector_candidates: Vector results considered per query before fusion
+            nprobe: Use the IVF index for the vector side, as in search()
+            rrf_k: Reciprocal rank fusion constant
+        """
+        vector_results = self.search_batch(
+            query_embeddings, [(book, max(top_k, vector_candidates)) for book, top_k in requests], nprobe=nprobe
+        )
+        queries = normalize_rows(np.array(query_embeddings, dtype=np.float32, ndmin=2))
+
+        results = []
+        for i, (_, top_k) in enumerate(requests):
+            by_id = {r['id']: r for r in vector_results[i]}
+            lexical_ids = list(lexical_hits[i])
+            lexical_only = [chunk_id for chunk_id in lexical_ids if chunk_id not in by_id]
+            rows = self.rows_for_ids(lexical_only)
+            if len(rows):
+                scores = self.embeddings[rows] @ queries[i]
+                for row, score in zip(rows, scores):
+                    by_id[int(self.ids[row])] = self._result(row, score)
+            lexical_ids = [chunk_id for chunk_id in lexical_ids if chunk_id in by_id]
+
+            fused = reciprocal_rank_fusion([[r['id'] for r in vector_results[i]], lexical_ids], k=rrf_k)
+            ranked = sorted(fused, key=lambda chunk_id: fused[chunk_id], reverse=True)[:max(top_k, 0)]
+            results.append([dict(by_id[chunk_id], rrf_score=round(fused[chunk_id], 6)) for chunk_id in ranked])
+        return results
+
+    def rows_for_ids(self, ids: Sequence[int]) -> np.ndarray:
+        """Rows holding the given chunk ids, in the same order; unknown ids are dropped."""
+        if not len(ids) or len(self) == 0:
+            return np.zeros(0, dtype=np.int64)
+        if self._id_order is None:
+            self._id_order = np.argsort(self.ids, kind="stable")
+        sorted_ids = self.ids[self._id_order]
+        ids = np.asarray(ids, dtype=np.int64)
+        positions = np.clip(np.searchsorted(sorted_ids, ids), 0, len(sorted_ids) - 1)
+        found = sorted_ids[positions] == ids
+        return self._id_order[positions[found]].astype(np.int64)
+
+    def _rescore(self, queries: np.ndarray, shortlists):
+        """Re-rank coarse shortlists with full-precision embeddings fetched in one call."""
+        candidate_rows = sorted({int(row) for shortlist in shortlists if shortlist is not None for row in shortlist[0]})
+        if not candidate_rows:
+            return shortlists
+        vectors = self.rescorer([int(self.ids[row]) for row in candidate_rows])
+
+        rescored = []
+        for query, shortlist in zip(queries, shortlists):
+            if shortlist is None:
+                rescored.append(None)
+                continue
+            rows, coarse = shortlist
+            exact = np.array([
+                float(normalize_vector(vectors[int(self.ids[row])]) @ query) if int(self.ids[row]) in vectors else score
+                for row, score in zip(rows, coarse)
+            ], dtype=np.float32)
+            order = np.argsort(-exact, kind="stable")
+            rescored.append((rows[order], exact[order]))
+        return rescored
+
+    def _result(self, row: int, score) -> Dict[str, Any]:
+        return {
+            'id': int(self.ids[row]),
+            'text': self.texts[row],
+            'page_number': self.page_numbers[row],
+            'book_title': self.book_titles[row],
+            'chunk_index': self.chunk_indexes[row],
+            'page_end': self.page_ends[row],
+            'similarity': float(score)  # Python float for JSON serialization
+        }
+
+def book_partition_offsets(sorted_book_titles: Sequence[Optional[str]]) -> Dict[str, Tuple[int, int]]:
+    """Map each title to its (start, end) row range in a list already grouped by book."""
+    offsets = {}
+    start = 0
+    for i in range(1, len(sorted_book_titles) + 1):
+        if i == len(sorted_book_titles) or sorted_book_titles[i] != sorted_book_titles[start]:
+            if sorted_book_titles[start] is not None:
+                offsets[sorted_book_titles[start]] = (start, i)
+            start = i
+    return offsets
+
+def normalize_vector(vector: np.ndarray) -> np.ndarray:
+    """Return vector as float32 with unit L2 norm (unchanged if the norm is zero)."""
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        return vector
+    return vector / norm
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row of a 2-D matrix in place, leaving zero rows as zeros."""
+    if matrix.size == 0:
+        return matrix
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Indices of the top_k highest scores, best first."""
+    if top_k < len(scores):
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+_index: Optional[KnowledgeIndex] = None
+_index_lock = threading.Lock()
+
+def get_knowledge_index(pool, load_ivf: bool = False, quantized: bool = False, rescore_factor: int = 4,
+                        snapshot_dir: Optional[str] = None) -> KnowledgeIndex:
+    """
+    Return the process-wide index, loading it on first use.
+
+    Args:
+        pool: ConnectionPool used to read the database, only touched when the index is loaded
+            (and, in quantized mode, to fetch full-precision vectors for rescoring)
+        load_ivf: Also load the persisted IVF index for approximate search
+        quantized: Hold int8 codes in memory and rescore shortlists with float32 vectors
+        rescore_factor: Coarse candidates kept per requested result in quantized mode
+        snapshot_dir: Memory-map the current snapshot from this directory instead of
+            pulling embeddings from the database, when it matches the database
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = None
+                if snapshot_dir and not quantized:
+                    index = _load_current_snapshot(pool, snapshot_dir)
+                with pool.connection() as client:
+                    if index is None:
+                        index = KnowledgeIndex.load_quantized(client) if quantized else KnowledgeIndex.load(client)
+                        print(f"✅ Knowledge index loaded ({len(index)} chunks, dim {index.dimension}, "
+                              f"{index.embeddings.nbytes / 1e6:.1f} MB{', int8' if quantized else ''})")
+                    if load_ivf and len(index):
+                        index.ivf = IVFIndex.load(client, index.ids, index.embeddings)
+                        if index.ivf is None:
+                            print("⚠️  No IVF index found (run build_ann_index.py) - using exact search")
+                        else:
+                            print(f"✅ IVF index loaded ({index.ivf.n_lists} lists)")
+                if quantized:
+                    index.rescore_factor = rescore_factor
+                    index.rescorer = lambda ids: _fetch_with_pool(pool, ids)
+                _index = index
+    return _index
+
+def _load_current_snapshot(pool, snapshot_dir: str) -> Optional[KnowledgeIndex]:
+    """Memory-map the current snapshot if it exists and is not stale, else None."""
+    from snapshot import load_snapshot, snapshot_is_current
+
+    loaded = load_snapshot(snapshot_dir)
+    if loaded is None:
+        print(f"⚠️  No snapshot found in {snapshot_dir} - loading from database")
+        return None
+    index, manifest = loaded
+    try:
+        with pool.connection() as client:
+            if not snapshot_is_current(manifest, client):
+                print(f"⚠️  Snapshot {manifest['version']} is stale (run build_snapshot.py) - loading from database")
+                return None
+    except Exception as e:
+        print(f"⚠️  Could not check snapshot staleness ({e}) - using snapshot {manifest['version']}")
+    print(f"✅ Knowledge index memory-mapped from snapshot {manifest['version']} ({len(index)} chunks)")
+    return index
+
+def _fetch_with_pool(pool, ids: List[int]) -> Dict[int, np.ndarray]:
+    with pool.connection() as client:
+        return fetch_float_embeddings(client, ids)
+
+def invalidate_knowledge_index():
+    """Drop the resident index so the next search reloads it from the database."""
+    global _index
+    with _index_lock:
+        _index = None
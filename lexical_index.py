@@ -0,0 +1,106 @@
+"""
+FTS5 (BM25) lexical index over medical_knowledge.chunk_text
+An external-content FTS5 table kept in sync by triggers, so every insert path
+(ingest_book.py included) maintains it. Used for hybrid lexical + vector retrieval
+and as a cheap candidate prefilter for vector scoring.
+"""
+import re
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+TABLE_NAME = "medical_knowledge"
+FTS_TABLE_NAME = "medical_knowledge_fts"
+MAX_QUERY_TERMS = 32
+RRF_K = 60  # Reciprocal rank fusion constant
+
+BookFilter = Optional[Union[str, Sequence[str]]]
+
+def ensure_fts_index(client) -> bool:
+    """
+    Create the FTS5 table and sync triggers if missing (idempotent).
+    Returns True if the table was created and existing rows were indexed.
+    """
+    cursor = client.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (FTS_TABLE_NAME,))
+    created = cursor.fetchone() is None
+
+    cursor.execute(f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE_NAME} USING fts5(
+        chunk_text, content='{TABLE_NAME}', content_rowid='id', tokenize='porter unicode61'
+    )
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE_NAME}_ai AFTER INSERT ON {TABLE_NAME} BEGIN
+        INSERT INTO {FTS_TABLE_NAME}(rowid, chunk_text) VALUES (new.id, new.chunk_text);
+    END
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE_NAME}_ad AFTER DELETE ON {TABLE_NAME} BEGIN
+        INSERT INTO {FTS_TABLE_NAME}({FTS_TABLE_NAME}, rowid, chunk_text) VALUES ('delete', old.id, old.chunk_text);
+    END
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE_NAME}_au AFTER UPDATE OF chunk_text ON {TABLE_NAME} BEGIN
+        INSERT INTO {FTS_TABLE_NAME}({FTS_TABLE_NAME}, rowid, chunk_text) VALUES ('delete', old.id, old.chunk_text);
+        INSERT INTO {FTS_TABLE_NAME}(rowid, chunk_text) VALUES (new.id, new.chunk_text);
+    END
+    """)
+    if created:
+        rebuild_fts_index(client)
+    client.commit()
+    return created
+
+def rebuild_fts_index(client):
+    """Re-index every existing row (migration for rows inserted before the triggers existed)."""
+    client.cursor().execute(f"INSERT INTO {FTS_TABLE_NAME}({FTS_TABLE_NAME}) VALUES ('rebuild')")
+    client.commit()
+
+def fts_index_exists(client) -> bool:
+    cursor = client.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (FTS_TABLE_NAME,))
+    return cursor.fetchone() is not None
+
+def match_expression(text: str) -> Optional[str]:
+    """
+    Turn free text into a safe FTS5 query: quoted terms joined with OR.
+    Returns None if the text has no searchable terms.
+    """
+    terms = list(dict.fromkeys(term.lower() for term in re.findall(r"\w+", text) if len(term) > 1 or term.isdigit()))
+    if not terms:
+        return None
+    return " OR ".join(f'"{term}"' for term in terms[:MAX_QUERY_TERMS])
+
+def lexical_search(cursor, text: str, limit: int, book_title: BookFilter = None) -> List[Tuple[int, float]]:
+    """
+    Return up to `limit` (chunk_id, bm25) pairs, best first (lower bm25 is better).
+
+    Args:
+        cursor: Database cursor
+        text: Free-text query
+        limit: Maximum hits
+        book_title: Optional book title, or list of titles, joined against medical_knowledge
+    """
+    expression = match_expression(text)
+    if expression is None or limit <= 0:
+        return []
+    sql = f"SELECT {FTS_TABLE_NAME}.rowid, bm25({FTS_TABLE_NAME}) FROM {FTS_TABLE_NAME}"
+    params: list = []
+    if book_title:
+        titles = [book_title] if isinstance(book_title, str) else list(book_title)
+        sql += f" JOIN {TABLE_NAME} AS m ON m.id = {FTS_TABLE_NAME}.rowid"
+        sql += f" WHERE {FTS_TABLE_NAME} MATCH ? AND m.book_title IN ({', '.join('?' for _ in titles)})"
+        params = [expression] + titles
+    else:
+        sql += f" WHERE {FTS_TABLE_NAME} MATCH ?"
+        params = [expression]
+    sql += f" ORDER BY bm25({FTS_TABLE_NAME}) LIMIT ?"
+    params.append(limit)
+    cursor.execute(sql, tuple(params))
+    return [(int(chunk_id), float(score)) for chunk_id, score in cursor.fetchall()]
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = RRF_K) -> Dict[int, float]:
+    """Fuse several ranked id lists: score(id) = sum over lists of 1 / (k + rank)."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, 1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return scores
@@ -1,6 +1,8 @@
 import os
 from libsql_experimental import connect
 from dotenv import load_dotenv
+from book_stats import books_table_exists, list_books
+from near_duplicates import duplicate_counts
 
 load_dotenv()
 
@@ -22,23 +24,34 @@ def list_vectorized_books():
             print("Table 'medical_knowledge' does not exist yet.")
             return
 
-        # Query distinct book titles
-        cursor.execute("SELECT DISTINCT book_title, source_file, COUNT(*) as chunks FROM medical_knowledge GROUP BY book_title, source_file")
-        rows = cursor.fetchall()
+        if not books_table_exists(conn):
+            # Databases ingested before the books table existed: aggregate the chunk table
+            print("⚠️  No books table yet (run python ingest_book.py once to create it); scanning all chunks...")
+            cursor.execute("SELECT DISTINCT book_title, source_file, COUNT(*) as chunks FROM medical_knowledge GROUP BY book_title, source_file")
+            rows = [{"title": r[0], "source_file": r[1], "chunk_count": r[2], "page_count": None, "status": "complete",
+                     "content_hash": None} for r in cursor.fetchall()]
+        else:
+            rows = list_books(conn)
         
         if not rows:
             print("No books found in the database.")
             return
 
+        # Near-duplicate chunks skipped at ingest
+        duplicates = duplicate_counts(conn)
         print(f"Found {len(rows)} book(s) in the database:")
-        print("-" * 80)
-        print(f"{'Book Title':<40} | {'Source File':<30} | {'Chunks':<10}")
-        print("-" * 80)
+        print("-" * 112)
+        print(f"{'Book Title':<40} | {'Source File':<30} | {'Chunks':<8} | {'Pages':<6} | {'Dupes':<9} | {'Status':<10}")
+        print("-" * 112)
         for row in rows:
-            title = row[0] or "N/A"
-            source = row[1] or "N/A"
-            chunks = row[2]
-            print(f"{title[:40]:<40} | {source[:30]:<30} | {chunks:<10}")
+            title = row["title"] or "N/A"
+            source = row["source_file"] or "N/A"
+            pages = row["page_count"] if row["page_count"] is not None else "-"
+            dupes = duplicates.get(row["content_hash"])
+            dupes = dupes if dupes else "-"
+            print(f"{title[:40]:<40} | {source[:30]:<30} | {row['chunk_count']:<8} | {pages:<6} | {dupes:<9} | {row['status']:<10}")
+        if duplicates:
+            print(f"Near-duplicate chunks skipped at ingest: {sum(duplicates.values())}")
             
     except Exception as e:
         print(f"Error querying database: {e}")
@@ -3,25 +3,49 @@ FastAPI Backend for ICU SBAR Generator
 Uses Google Vertex AI (Gemini 2.0) and Turso Vector DB
 """
 import os
+import json
+import time
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Union
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse
 from pydantic import BaseModel
 import base64
-from google.cloud import aiplatform
-from google.oauth2 import service_account
-import vertexai
-from vertexai.preview.generative_models import GenerativeModel, Part
 import numpy as np
-import requests
-from libsql_experimental import connect
 from dotenv import load_dotenv
+from knowledge_index import get_knowledge_index, invalidate_knowledge_index
+from book_stats import corpus_version
+from answer_cache import AnswerCache
+from json_stream import IncrementalJSONObject
+from context_packer import ContextPacker, page_label
+from book_catalog import get_book_router, invalidate_book_router
+from embedding_cache import EmbeddingCache
+from embedding_client import EmbeddingClient
+from db_pool import ConnectionPool
+from vector_backend import LibSQLVectorBackend
+from lexical_index import lexical_search
 
 load_dotenv()
 
-app = FastAPI(title="ICU SBAR Generator API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Warm up on startup when STARTUP_MODE=eager; otherwise Gemini, Turso connections
+    and the index are created on first use. Closes the pool on shutdown.
+    """
+    if STARTUP_MODE == "eager":
+        await run_blocking(warm_up)
+    yield
+    blocking_executor.shutdown(wait=False)
+    turso_pool.close()
+
+app = FastAPI(title="ICU SBAR Generator API", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -34,137 +58,330 @@ app.add_middleware(
 
 # Google AI Studio API configuration for embeddings
 GOOGLE_AI_STUDIO_API_KEY = os.getenv("GOOGLE_AI_STUDIO_API_KEY")
-EMBEDDING_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/text-embedding-004:embedContent"
+EMBEDDING_MODEL = "models/text-embedding-004"
+
+# Query embedding cache: LRU in memory, optionally persisted to a local SQLite file
+embedding_cache = EmbeddingCache(
+    EMBEDDING_MODEL,
+    max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "1024")),
+    persist_path=os.getenv("EMBEDDING_CACHE_PATH") or None
+)
+# Few retries on the request path: a user is waiting on the answer
+embedding_client = EmbeddingClient(GOOGLE_AI_STUDIO_API_KEY, model=EMBEDDING_MODEL, max_retries=2, cache=embedding_cache)
 
 if not GOOGLE_AI_STUDIO_API_KEY or GOOGLE_AI_STUDIO_API_KEY == "your-api-key-here":
     print("⚠️  Warning: GOOGLE_AI_STUDIO_API_KEY not set - vector search will be disabled")
 else:
     print("✅ Google AI Studio API configured for embeddings")
 
-# Initialize Vertex AI (with graceful handling for missing credentials)
+# Vertex AI (with graceful handling for missing credentials)
 # Supports both file path (local) and JSON string (Vercel/production)
+# The SDK import, credential parsing and model construction are deferred to the first
+# request that needs Gemini (or warm_up()), so importing this module stays cheap.
 GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "google_credentials.json")
 LOCATION = os.getenv("GOOGLE_CLOUD_LOCATION", "us-central1")
 PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT_ID")
+GEMINI_MODEL_NAME = "gemini-2.0-flash-exp"
+# Startup mode: "lazy" (default, best for serverless cold starts) or "eager" (warm up on startup)
+STARTUP_MODE = os.getenv("STARTUP_MODE", "lazy").lower()
 
-# Initialize Vertex AI only if credentials are available
-model = None
-credentials = None
-creds_data = None
+_model = None
+_model_initialized = False
+_model_lock = threading.Lock()
 
-# Try to load credentials from environment variable (JSON string) - for Vercel
-if GOOGLE_APPLICATION_CREDENTIALS and GOOGLE_APPLICATION_CREDENTIALS != "google_credentials.json":
-    try:
-        import json
-        # Check if it's a JSON string (starts with {)
-        if GOOGLE_APPLICATION_CREDENTIALS.strip().startswith('{'):
-            creds_data = json.loads(GOOGLE_APPLICATION_CREDENTIALS)
-            credentials = service_account.Credentials.from_service_account_info(creds_data)
-            print("✅ Loaded Google credentials from environment variable")
-        # Otherwise, treat it as a file path
-        elif os.path.exists(GOOGLE_APPLICATION_CREDENTIALS):
-            with open(GOOGLE_APPLICATION_CREDENTIALS, 'r') as f:
-                creds_data = json.load(f)
-            credentials = service_account.Credentials.from_service_account_file(GOOGLE_APPLICATION_CREDENTIALS)
-            print("✅ Loaded Google credentials from file")
-    except json.JSONDecodeError:
-        # Not JSON, try as file path
-        if os.path.exists(GOOGLE_APPLICATION_CREDENTIALS):
-            try:
+def load_google_credentials():
+    """Return (credentials, creds_data) from GOOGLE_APPLICATION_CREDENTIALS or google_credentials.json."""
+    from google.oauth2 import service_account
+
+    credentials = None
+    creds_data = None
+
+    # Try to load credentials from environment variable (JSON string) - for Vercel
+    if GOOGLE_APPLICATION_CREDENTIALS and GOOGLE_APPLICATION_CREDENTIALS != "google_credentials.json":
+        try:
+            # Check if it's a JSON string (starts with {)
+            if GOOGLE_APPLICATION_CREDENTIALS.strip().startswith('{'):
+                creds_data = json.loads(GOOGLE_APPLICATION_CREDENTIALS)
+                credentials = service_account.Credentials.from_service_account_info(creds_data)
+                print("✅ Loaded Google credentials from environment variable")
+            # Otherwise, treat it as a file path
+            elif os.path.exists(GOOGLE_APPLICATION_CREDENTIALS):
                 with open(GOOGLE_APPLICATION_CREDENTIALS, 'r') as f:
                     creds_data = json.load(f)
                 credentials = service_account.Credentials.from_service_account_file(GOOGLE_APPLICATION_CREDENTIALS)
                 print("✅ Loaded Google credentials from file")
-            except Exception as e:
-                print(f"⚠️  Could not load credentials from file: {e}")
-        else:
-            print(f"⚠️  Credentials path does not exist: {GOOGLE_APPLICATION_CREDENTIALS}")
-    except Exception as e:
-        print(f"⚠️  Error parsing credentials: {e}")
-
-# Try default file path if credentials not loaded yet
-if credentials is None and os.path.exists("google_credentials.json"):
-    try:
-        import json
-        with open("google_credentials.json", 'r') as f:
-            creds_data = json.load(f)
-        credentials = service_account.Credentials.from_service_account_file("google_credentials.json")
-        print("✅ Loaded Google credentials from default file")
-    except Exception as e:
-        print(f"⚠️  Could not load default credentials file: {e}")
+        except json.JSONDecodeError:
+            # Not JSON, try as file path
+            if os.path.exists(GOOGLE_APPLICATION_CREDENTIALS):
+                try:
+                    with open(GOOGLE_APPLICATION_CREDENTIALS, 'r') as f:
+                        creds_data = json.load(f)
+                    credentials = service_account.Credentials.from_service_account_file(GOOGLE_APPLICATION_CREDENTIALS)
+                    print("✅ Loaded Google credentials from file")
+                except Exception as e:
+                    print(f"⚠️  Could not load credentials from file: {e}")
+            else:
+                print(f"⚠️  Credentials path does not exist: {GOOGLE_APPLICATION_CREDENTIALS}")
+        except Exception as e:
+            print(f"⚠️  Error parsing credentials: {e}")
 
-# Initialize Vertex AI if we have credentials
-if credentials and creds_data:
+    # Try default file path if credentials not loaded yet
+    if credentials is None and os.path.exists("google_credentials.json"):
+        try:
+            with open("google_credentials.json", 'r') as f:
+                creds_data = json.load(f)
+            credentials = service_account.Credentials.from_service_account_file("google_credentials.json")
+            print("✅ Loaded Google credentials from default file")
+        except Exception as e:
+            print(f"⚠️  Could not load default credentials file: {e}")
+
+    return credentials, creds_data
+
+def init_model():
+    """Initialize Vertex AI and build the Gemini model (None if credentials are missing or invalid)."""
+    global PROJECT_ID
+    credentials, creds_data = load_google_credentials()
+    if not (credentials and creds_data):
+        print("⚠️  Warning: Google credentials not found")
+        print("   Set GOOGLE_APPLICATION_CREDENTIALS as JSON string (Vercel) or file path (local)")
+        print("   API endpoints will return errors until credentials are configured")
+        return None
     try:
         PROJECT_ID = PROJECT_ID or creds_data.get('project_id')
         if not PROJECT_ID:
             raise ValueError("project_id not found in credentials and GOOGLE_CLOUD_PROJECT_ID not set")
         
+        import vertexai
+        from vertexai.preview.generative_models import GenerativeModel
         vertexai.init(project=PROJECT_ID, location=LOCATION, credentials=credentials)
-        model = GenerativeModel("gemini-2.0-flash-exp")
+        model = GenerativeModel(GEMINI_MODEL_NAME)
         print(f"✅ Vertex AI initialized (Project: {PROJECT_ID})")
+        return model
     except Exception as e:
         print(f"⚠️  Warning: Could not initialize Vertex AI: {e}")
         print("   API endpoints will return errors until credentials are configured")
-else:
-    print("⚠️  Warning: Google credentials not found")
-    print("   Set GOOGLE_APPLICATION_CREDENTIALS as JSON string (Vercel) or file path (local)")
-    print("   API endpoints will return errors until credentials are configured")
+        return None
+
+def get_model():
+    """Return the Gemini model, initializing Vertex AI on first use (None if not configured)."""
+    global _model, _model_initialized
+    if not _model_initialized:
+        with _model_lock:
+            if not _model_initialized:
+                _model = init_model()
+                _model_initialized = True
+    return _model
+
+async def require_model():
+    """Gemini model for a request; initialization runs off the event loop. Raises 503 if unavailable."""
+    model = get_model() if _model_initialized else await run_blocking(get_model)
+    if model is None:
+        raise HTTPException(status_code=503, detail="Vertex AI not configured. Please set up Google Cloud credentials.")
+    return model
 
 # Turso connection (optional for now)
 TURSO_DATABASE_URL = os.getenv("TURSO_DATABASE_URL")
 TURSO_AUTH_TOKEN = os.getenv("TURSO_AUTH_TOKEN")
 
+# Search mode: "exact" scores every candidate row, "ivf" probes the IVF lists built by build_ann_index.py
+SEARCH_MODE = os.getenv("SEARCH_MODE", "exact").lower()
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+# Embedding storage: "float32" (default) or "int8" (quantized coarse search + float32 rescoring)
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "float32").lower()
+RESCORE_FACTOR = int(os.getenv("RESCORE_FACTOR", "4"))
+# Search backend: "memory" (resident index, default) or "libsql" (F32_BLOB + vector_top_k in the database)
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "memory").lower()
+# Directory of memory-mapped snapshots written by build_snapshot.py (optional)
+KNOWLEDGE_SNAPSHOT_DIR = os.getenv("KNOWLEDGE_SNAPSHOT_DIR") or None
+# Retrieval mode: "vector" (default), "hybrid" (FTS5 BM25 + vector, fused with RRF)
+# or "prefilter" (vector scoring restricted to the top FTS5 candidates)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector").lower()
+LEXICAL_CANDIDATES = int(os.getenv("LEXICAL_CANDIDATES", "50"))
+PREFILTER_CANDIDATES = int(os.getenv("PREFILTER_CANDIDATES", "1000"))
+
+# Prompt context: neighbouring chunks are merged (overlap removed) and packed into a token budget
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "6000"))
+SBAR_SECTION_TOKENS = int(os.getenv("SBAR_SECTION_TOKENS", "6000"))
+context_packer = ContextPacker(token_budget=CHAT_CONTEXT_TOKENS)
+
+# Semantic answer cache for /chat: exact question hits, then near-duplicates above the threshold
+answer_cache = AnswerCache(
+    max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "256")),
+    ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+    similarity_threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+)
+# How often (seconds) retrieval checks the database for newly ingested or re-ingested books
+# (ANSWER_CACHE_CHECK_INTERVAL is the older name of this setting)
+CORPUS_CHECK_INTERVAL = float(os.getenv("CORPUS_CHECK_INTERVAL", os.getenv("ANSWER_CACHE_CHECK_INTERVAL", "60")))
+_corpus_version = None
+_corpus_checked_at = 0.0
+_corpus_lock = threading.Lock()
+
 def get_turso_client():
-    """Get a Turso database client."""
+    """Get a new Turso database client (prefer turso_pool.connection() for request paths)."""
+    from libsql_experimental import connect
     return connect(TURSO_DATABASE_URL, auth_token=TURSO_AUTH_TOKEN)
 
-def cosine_similarity(vec1: np.ndarray, vec2: np.ndarray) -> float:
-    """Calculate cosine similarity between two vectors."""
-    dot_product = np.dot(vec1, vec2)
-    norm1 = np.linalg.norm(vec1)
-    norm2 = np.linalg.norm(vec2)
-    if norm1 == 0 or norm2 == 0:
-        return 0.0
-    return dot_product / (norm1 * norm2)
+# Shared Turso connections: opened at startup, checked out one task at a time
+turso_pool = ConnectionPool(
+    get_turso_client,
+    min_size=int(os.getenv("TURSO_POOL_MIN_SIZE", "1")),
+    max_size=int(os.getenv("TURSO_POOL_MAX_SIZE", "4"))
+)
+vector_backend = LibSQLVectorBackend(turso_pool, overfetch=int(os.getenv("VECTOR_FILTER_OVERFETCH", "8")))
+
+# Bounded executor for blocking SDK, HTTP and libSQL calls so they never stall the event loop
+blocking_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("BLOCKING_IO_WORKERS", "8")),
+    thread_name_prefix="blocking-io"
+)
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the bounded executor and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_executor, functools.partial(func, *args, **kwargs))
+
+def warm_up() -> Dict[str, float]:
+    """
+    Initialize everything a first request would otherwise pay for: the Gemini model,
+    pooled Turso connections and the resident index. Returns seconds spent per step.
+    Called on startup when STARTUP_MODE=eager; long-lived deployments can also call it directly.
+    """
+    timings = {}
+    start = time.perf_counter()
+    get_model()
+    timings["model"] = time.perf_counter() - start
+    if TURSO_DATABASE_URL and TURSO_AUTH_TOKEN:
+        start = time.perf_counter()
+        try:
+            turso_pool.open()
+            print(f"✅ Turso connection pool ready ({turso_pool.stats()['size']} connections)")
+        except Exception as e:
+            print(f"⚠️  Could not pre-open Turso connections: {e}")
+        timings["turso_pool"] = time.perf_counter() - start
+        start = time.perf_counter()
+        book_router()
+        timings["book_catalog"] = time.perf_counter() - start
+        if SEARCH_BACKEND != "libsql":
+            start = time.perf_counter()
+            try:
+                load_index()
+            except Exception as e:
+                print(f"⚠️  Could not preload knowledge index: {e}")
+            timings["knowledge_index"] = time.perf_counter() - start
+    print("🔥 Warm-up done: " + ", ".join(f"{step} {seconds:.2f}s" for step, seconds in timings.items()))
+    return timings
 
 def get_embedding(text: str) -> np.ndarray:
-    """Get embedding using Google AI Studio API (text-embedding-004)."""
+    """Get embedding using Google AI Studio API (text-embedding-004), served from the cache when possible."""
+    if not GOOGLE_AI_STUDIO_API_KEY or GOOGLE_AI_STUDIO_API_KEY == "your-api-key-here":
+        raise ValueError("GOOGLE_AI_STUDIO_API_KEY not configured")
+    return embedding_client.embed(text)
+
+def get_embeddings(texts: List[str]) -> List[np.ndarray]:
+    """
+    Get embeddings for several texts using the batchEmbedContents endpoint.
+    Texts found in the embedding cache are not sent to the API.
+    """
     if not GOOGLE_AI_STUDIO_API_KEY or GOOGLE_AI_STUDIO_API_KEY == "your-api-key-here":
         raise ValueError("GOOGLE_AI_STUDIO_API_KEY not configured")
+    return embedding_client.embed_batch(texts)
+
+def load_index():
+    """Return the resident knowledge index configured by SEARCH_MODE, EMBEDDING_STORAGE and KNOWLEDGE_SNAPSHOT_DIR."""
+    return get_knowledge_index(
+        turso_pool,
+        load_ivf=SEARCH_MODE == "ivf",
+        quantized=EMBEDDING_STORAGE == "int8",
+        rescore_factor=RESCORE_FACTOR,
+        snapshot_dir=KNOWLEDGE_SNAPSHOT_DIR
+    )
+
+def lexical_hits_for(query_texts: List[str], requests: List[tuple], limit: int) -> Optional[List[List[int]]]:
+    """Ranked FTS5 (BM25) chunk ids per query, or None if the lexical index is unavailable."""
+    try:
+        with turso_pool.connection() as client:
+            cursor = client.cursor()
+            return [
+                [chunk_id for chunk_id, _ in lexical_search(cursor, text, limit, book)]
+                for text, (book, _) in zip(query_texts, requests)
+            ]
+    except Exception as e:
+        print(f"⚠️  Lexical search unavailable ({e}) - using vector search only")
+        return None
+
+def score_queries(query_embeddings, requests: List[tuple], query_texts: List[str]) -> List[List[Dict[str, Any]]]:
+    """
+    Rank chunks for each query with the configured backend and retrieval mode.
     
-    headers = {
-        "Content-Type": "application/json",
-    }
+    Args:
+        query_embeddings: One raw embedding per request
+        requests: (book_title_filter, top_k) per query
+        query_texts: Query text per request, used by the lexical (FTS5) side
+    """
+    # Drop the resident index (and cached answers) if books were ingested since the last check
+    refresh_corpus_version()
+    if SEARCH_BACKEND == "libsql":
+        # Top-k comes back from libSQL's vector index; nothing is loaded into memory
+        return vector_backend.search_batch(query_embeddings, requests)
     
-    payload = {
-        "model": "models/text-embedding-004",
-        "content": {
-            "parts": [{"text": text}]
-        }
-    }
+    # Embeddings are loaded from Turso once and kept resident as a normalized matrix,
+    # partitioned by book so a filtered search only scores that book's rows
+    index = load_index()
+    nprobe = IVF_NPROBE if SEARCH_MODE == "ivf" else None
     
-    params = {
-        "key": GOOGLE_AI_STUDIO_API_KEY
-    }
+    if RETRIEVAL_MODE == "hybrid":
+        hits = lexical_hits_for(query_texts, requests, LEXICAL_CANDIDATES)
+        if hits is not None:
+            return index.hybrid_search_batch(
+                query_embeddings, requests, hits, vector_candidates=LEXICAL_CANDIDATES, nprobe=nprobe
+            )
+    elif RETRIEVAL_MODE == "prefilter":
+        hits = lexical_hits_for(query_texts, requests, PREFILTER_CANDIDATES)
+        if hits is not None:
+            # Too few lexical matches to fill top_k: score the full corpus instead
+            candidates = [
+                index.rows_for_ids(ids) if len(ids) >= top_k else None
+                for ids, (_, top_k) in zip(hits, requests)
+            ]
+            return index.search_batch(query_embeddings, requests, nprobe=nprobe, candidate_rows=candidates)
     
-    try:
-        response = requests.post(EMBEDDING_API_URL, json=payload, headers=headers, params=params)
-        response.raise_for_status()
-        
-        result = response.json()
-        embedding_values = result.get("embedding", {}).get("values", [])
-        
-        if not embedding_values:
-            raise ValueError("No embedding values returned from API")
-        
-        return np.array(embedding_values, dtype=np.float32)
-    except requests.exceptions.RequestException as e:
-        raise Exception(f"Error calling Google AI Studio API: {e}")
-    except KeyError as e:
-        raise Exception(f"Unexpected API response format: {e}")
+    return index.search_batch(query_embeddings, requests, nprobe=nprobe)
 
-def search_turso_knowledge(query: str, top_k: int = 5, book_title_filter: Optional[str] = None) -> List[Dict[str, Any]]:
+def refresh_corpus_version():
+    """
+    Compare the corpus version (chunk count, max id and ingest generation from the books
+    table) with the last seen value, at most once per CORPUS_CHECK_INTERVAL. Runs on
+    every retrieval (score_queries) and before answer-cache lookups. When books have been
+    ingested or re-ingested since, the resident index and book catalog are dropped so the
+    next search sees the new chunks, and the answer cache is cleared.
+    """
+    global _corpus_version, _corpus_checked_at
+    if not (TURSO_DATABASE_URL and TURSO_AUTH_TOKEN):
+        return
+    if time.monotonic() - _corpus_checked_at < CORPUS_CHECK_INTERVAL:
+        return
+    with _corpus_lock:
+        now = time.monotonic()
+        if now - _corpus_checked_at < CORPUS_CHECK_INTERVAL:
+            return  # another request checked while we waited
+        _corpus_checked_at = now
+        try:
+            with turso_pool.connection() as client:
+                version = corpus_version(client)
+        except Exception as e:
+            print(f"⚠️  Could not check knowledge base version: {e}")
+            return
+        changed = _corpus_version is not None and version != _corpus_version
+        _corpus_version = version
+    # The answer cache is one consumer of the version; it clears itself when it changes
+    answer_cache.sync_version(version)
+    if changed:
+        invalidate_knowledge_index()
+        invalidate_book_router()
+        print(f"🔄 Knowledge base changed ({version[0]} chunks) - cleared answer cache, index and book catalog")
+
+def search_turso_knowledge(query: str, top_k: int = 5, book_title_filter: Optional[Union[str, List[str]]] = None) -> List[Dict[str, Any]]:
     """
     Search Turso database for relevant knowledge chunks.
     Returns list of chunks with their text and metadata.
@@ -173,15 +390,14 @@ def search_turso_knowledge(query: str, top_k: int = 5, book_title_filter: Option
     Args:
         query: Search query text
         top_k: Number of top results to return
-        book_title_filter: Optional book title to filter results (e.g., "Lehne's Pharmacology for Nursing Care ( PDFDrive.com )")
+        book_title_filter: Optional book title to filter results (e.g., "Lehne's Pharmacology for Nursing Care ( PDFDrive.com )"),
+            or a list of titles to search together in one pass
     """
     if not TURSO_DATABASE_URL or not TURSO_AUTH_TOKEN:
         return []  # Return empty if Turso not configured
     if not GOOGLE_AI_STUDIO_API_KEY or GOOGLE_AI_STUDIO_API_KEY == "your-api-key-here":
         return []  # Return empty if API key not configured
     
-    client = get_turso_client()
-
     # Generate query embedding using Google AI Studio API (matches stored embeddings)
     try:
         query_embedding = get_embedding(query)
@@ -189,35 +405,45 @@ def search_turso_knowledge(query: str, top_k: int = 5, book_title_filter: Option
         print(f"⚠️  Error generating embedding: {e}")
         return []  # Return empty if embedding generation fails
     
-    # Get chunks from database, optionally filtered by book title
-    cursor = client.cursor()
-    if book_title_filter:
-        cursor.execute("SELECT id, chunk_text, embedding, page_number, book_title FROM medical_knowledge WHERE book_title = ?", (book_title_filter,))
-    else:
-        cursor.execute("SELECT id, chunk_text, embedding, page_number, book_title FROM medical_knowledge")
-    rows = cursor.fetchall()
+    return score_queries([query_embedding], [(book_title_filter, top_k)], [query])[0]
+
+def search_many(queries: List[tuple], dedupe: bool = True) -> List[List[Dict[str, Any]]]:
+    """
+    Run several searches in one batch.
+    Identical query texts are embedded once, all embeddings are requested in a single
+    batch call, and queries are scored against the resident index together.
     
-    if not rows:
+    Args:
+        queries: List of (text, book_title_filter, top_k) tuples
+        dedupe: Drop chunks already returned by an earlier query in the list, so each
+            chunk id appears at most once across all results (like a shared seen_ids set)
+    
+    Returns:
+        One result list per query, in the same order as queries
+    """
+    if not queries:
         return []
+    if not TURSO_DATABASE_URL or not TURSO_AUTH_TOKEN:
+        return [[] for _ in queries]
+    if not GOOGLE_AI_STUDIO_API_KEY or GOOGLE_AI_STUDIO_API_KEY == "your-api-key-here":
+        return [[] for _ in queries]
     
-    # Calculate similarities
-    similarities = []
-    for row in rows:
-        chunk_id, chunk_text, embedding_bytes, page_number, book_title = row[:5]  # Handle variable row length
-        stored_embedding = np.frombuffer(embedding_bytes, dtype=np.float32)
-        
-        similarity = cosine_similarity(query_embedding, stored_embedding)
-        similarities.append({
-            'id': chunk_id,
-            'text': chunk_text,
-            'page_number': page_number,
-            'book_title': book_title,
-            'similarity': float(similarity)  # Convert numpy float to Python float for JSON serialization
-        })
+    unique_texts = list(dict.fromkeys(text for text, _, _ in queries))
+    try:
+        embeddings = dict(zip(unique_texts, get_embeddings(unique_texts)))
+    except Exception as e:
+        print(f"⚠️  Error generating embeddings: {e}")
+        return [[] for _ in queries]
+    
+    query_matrix = np.vstack([embeddings[text] for text, _, _ in queries])
+    results = score_queries(query_matrix, [(book, top_k) for _, book, top_k in queries], [text for text, _, _ in queries])
     
-    # Sort by similarity and return top_k
-    similarities.sort(key=lambda x: x['similarity'], reverse=True)
-    return similarities[:top_k]
+    if dedupe:
+        seen_ids = set()
+        for i, chunks in enumerate(results):
+            results[i] = [c for c in chunks if c['id'] not in seen_ids]
+            seen_ids.update(c['id'] for c in results[i])
+    return results
 
 # Request/Response models
 class ChatRequest(BaseModel):
@@ -259,55 +485,80 @@ def serve_script():
 
 @app.get("/health")
 def health():
-    return {"message": "ICU SBAR Generator API", "status": "running"}
+    return {
+        "message": "ICU SBAR Generator API",
+        "status": "running",
+        "embedding_cache": embedding_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "context_packer": context_packer.stats(),
+        "startup_mode": STARTUP_MODE,
+        "model_initialized": _model_initialized,
+        "turso_pool": turso_pool.stats()
+    }
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+def book_router():
+    """Shared catalog-driven book router (built-in catalog if Turso is not configured)."""
+    return get_book_router(turso_pool if TURSO_DATABASE_URL and TURSO_AUTH_TOKEN else None)
+
+def chat_book_filter(question: str) -> Optional[Union[str, List[str]]]:
+    """Books the question names: None (search all books), one title, or a list of titles."""
+    titles = book_router().route(question)
+    if not titles:
+        return None
+    return titles[0] if len(titles) == 1 else titles
+
+async def lookup_cached_answer(question: str, book_filter) -> tuple:
     """
-    Chat endpoint: Answer questions using knowledge from the ICU book.
+    Answer from the cache when the same (or a near-identical) question was asked against
+    the same books. Returns (cached ChatResponse or None, query embedding or None); the
+    embedding is reused by the search through the embedding cache.
     """
-    if model is None:
-        raise HTTPException(status_code=503, detail="Vertex AI not configured. Please set up Google Cloud credentials.")
+    if not (answer_cache.enabled and TURSO_DATABASE_URL and TURSO_AUTH_TOKEN):
+        return None, None
+    await run_blocking(refresh_corpus_version)
+    cached = answer_cache.get_exact(question, book_filter)
+    if cached is not None:
+        return cached, None
     try:
-        # Check for specific book requests in the query
-        book_filter = None
-        query_lower = request.question.lower()
-        
-        if "critical care nursing" in query_lower or "urden" in query_lower or "icu nursing book" in query_lower:
-            book_filter = "Critical Care Nursing, Diagnosis and Management - Urden, Linda D"
-        elif "acls" in query_lower:
-            book_filter = "Advanced Cardiac Life Support Provider Handbook 2015-2020 ( PDFDrive )"
-        elif "lehne" in query_lower or "pharmacology" in query_lower:
-            book_filter = "Lehne’s Pharmacology for Nursing Care ( PDFDrive.com )"
-        elif "tncc" in query_lower or "trauma" in query_lower:
-            book_filter = "TNCC 8th Edition"
-        elif "marino" in query_lower or "icu physician" in query_lower:
-            book_filter = "MarinoICUphysician"
-        elif "canadian" in query_lower or "lab" in query_lower:
-            book_filter = "Canadian Lab Test Manual"
-
-        # Search for relevant knowledge
-        # Increase top_k to 15 to ensure we get a broader context
-        relevant_chunks = search_turso_knowledge(request.question, top_k=15, book_title_filter=book_filter)
-        
-        # Build context from relevant chunks
-        context_parts = []
-        for i, chunk in enumerate(relevant_chunks, 1):
-            page_info = f" (Page {chunk['page_number']})" if chunk['page_number'] else ""
-            book_info = f" [Book: {chunk.get('book_title', 'Unknown')}]"
-            context_parts.append(f"[Source {i}{book_info}{page_info}]\n{chunk['text']}\n")
-        
-        context = "\n---\n".join(context_parts)
-        
-        # Build prompt for Gemini
-        prompt = f"""You are an AI assistant helping ICU nurses with questions about critical care medicine.
-        
+        query_embedding = await run_blocking(get_embedding, question)
+    except Exception as e:
+        print(f"⚠️  Error generating embedding: {e}")
+        return None, None
+    return answer_cache.get_similar(query_embedding, book_filter), query_embedding
+
+def log_packing(label: str, report: Dict[str, int]):
+    """Log how much prompt context packing saved."""
+    if report["chunks"]:
+        print(
+            f"📦 {label}: {report['chunks']} chunks -> {report['packed']} passages, "
+            f"~{report['tokens_out']} tokens ({report['tokens_saved']} saved)"
+        )
+
+def build_chat_prompt(question: str, chunks: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
+    """Gemini prompt answering question from the retrieved chunks, and the packed passages it cites."""
+    # Merge overlapping neighbours and keep the best passages within the token budget
+    passages, report = context_packer.pack(chunks)
+    log_packing("chat", report)
+    
+    # Build context from relevant passages
+    context_parts = []
+    for i, passage in enumerate(passages, 1):
+        pages = page_label(passage)
+        page_info = f" ({pages})" if pages else ""
+        book_info = f" [Book: {passage.get('book_title') or 'Unknown'}]"
+        context_parts.append(f"[Source {i}{book_info}{page_info}]\n{passage['text']}\n")
+    
+    context = "\n---\n".join(context_parts)
+    
+    # Build prompt for Gemini
+    prompt = f"""You are an AI assistant helping ICU nurses with questions about critical care medicine.
+    
 Use the following knowledge from authoritative ICU textbooks to answer the question.
 
 KNOWLEDGE BASE:
 {context}
 
-QUESTION: {request.question}
+QUESTION: {question}
 
 INSTRUCTIONS:
 1. Provide a clear, concise, and clinically accurate answer based on the KNOWLEDGE BASE.
@@ -318,137 +569,185 @@ INSTRUCTIONS:
 
 Cite which source(s) and book(s) you used.
 """
+    return prompt, passages
+
+def chat_sources(passages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Source summaries returned alongside a chat answer, one per packed passage (Source 1, 2, ...)."""
+    return [
+        {
+            "text": passage['text'][:200] + "..." if len(passage['text']) > 200 else passage['text'],
+            "page_number": passage['page_number'],
+            "page_end": passage['page_end'],
+            "book_title": passage.get('book_title', 'Unknown'),
+            "similarity": round(float(passage['similarity']), 3)  # Ensure it's a Python float
+        }
+        for passage in passages
+    ]
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_generation(model, prompt):
+    """
+    Yield text deltas from Gemini's streaming generation. The SDK's response iterator
+    blocks, so every step runs on the blocking executor.
+    """
+    stream = await run_blocking(model.generate_content, prompt, stream=True)
+    iterator = iter(stream)
+    done = object()
+    while True:
+        chunk = await run_blocking(next, iterator, done)
+        if chunk is done:
+            return
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunks without text (e.g. only a finish reason or safety ratings)
+            continue
+        if text:
+            yield text
+
+STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest):
+    """
+    Chat endpoint: Answer questions using knowledge from the ICU book.
+    """
+    model = await require_model()
+    try:
+        book_filter = await run_blocking(chat_book_filter, request.question)
+        cached, query_embedding = await lookup_cached_answer(request.question, book_filter)
+        if cached is not None:
+            return cached
+
+        # Search for relevant knowledge
+        # Increase top_k to 15 to ensure we get a broader context
+        relevant_chunks = await run_blocking(search_turso_knowledge, request.question, top_k=15, book_title_filter=book_filter)
+        prompt, passages = build_chat_prompt(request.question, relevant_chunks)
         
         # Generate response using Gemini 2.0
-        response = model.generate_content(prompt)
-        answer = response.text
+        response = await run_blocking(model.generate_content, prompt)
         
-        # Prepare sources for response
-        sources = [
-            {
-                "text": chunk['text'][:200] + "..." if len(chunk['text']) > 200 else chunk['text'],
-                "page_number": chunk['page_number'],
-                "book_title": chunk.get('book_title', 'Unknown'),
-                "similarity": round(float(chunk['similarity']), 3)  # Ensure it's a Python float
-            }
-            for chunk in relevant_chunks
-        ]
-        
-        return ChatResponse(answer=answer, sources=sources)
+        chat_response = ChatResponse(answer=response.text, sources=chat_sources(passages))
+        # Only cache answers grounded in retrieved chunks
+        if query_embedding is not None and relevant_chunks:
+            answer_cache.put(request.question, query_embedding, book_filter, chat_response)
+        return chat_response
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating chat response: {str(e)}")
 
-@app.post("/generate_sbar", response_model=GenerateSBARResponse)
-async def generate_sbar(request: GenerateSBARRequest):
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
     """
-    Generate SBAR report endpoint: Creates professional SBAR handoff note.
+    Streaming chat endpoint (server-sent events).
+    Events: "sources" once retrieval finishes, "token" per generated text delta,
+    then "done" with the full answer, or "error".
     """
-    if model is None:
-        raise HTTPException(status_code=503, detail="Vertex AI not configured. Please set up Google Cloud credentials.")
-    try:
-        patient_data = request.patientData
-        
-        # Extract key patient information for multiple targeted searches
-        diagnosis = patient_data.get("diagnosis", "").strip()
-        vent_settings = patient_data.get("vent-settings", "")
-        drips = patient_data.get("drips", "")
-        medications = patient_data.get("medications", "")
-        
-        # Book Titles
-        lehne_book = "Lehne’s Pharmacology for Nursing Care ( PDFDrive.com )"
-        canadian_book = "Canadian Lab Test Manual"
-        marino_book = "MarinoICUphysician"
-        urden_book = "Critical Care Nursing, Diagnosis and Management - Urden, Linda D"
-        
-        # Repositories for chunks
-        lab_chunks = []
-        pharm_chunks = []
-        general_chunks = []
-        seen_ids = set()
-        
-        # --- 1. LABS & DIAGNOSTICS SEARCH ---
-        # Primary: Canadian Lab Test Manual
-        lab_query = f"{diagnosis} lab tests monitoring diagnostics" if diagnosis else "ICU lab tests diagnostics monitoring"
-        chunks = search_turso_knowledge(lab_query, top_k=10, book_title_filter=canadian_book)
-        for c in chunks:
-            if c['id'] not in seen_ids:
-                lab_chunks.append(c)
-                seen_ids.add(c['id'])
-                
-        # Secondary: Marino & Urden
-        for book in [marino_book, urden_book]:
-            chunks = search_turso_knowledge(lab_query, top_k=5, book_title_filter=book)
-            for c in chunks:
-                if c['id'] not in seen_ids:
-                    lab_chunks.append(c)
-                    seen_ids.add(c['id'])
-
-        # --- 2. PHARMACOLOGY & DRIPS SEARCH ---
-        # Combine meds/drips text
-        all_meds_text = f"{medications} {drips}".strip()
-        med_query_base = f"{diagnosis} pharmacology medication management" if diagnosis else "ICU pharmacology medication management"
-        
-        # Primary: Lehne's
-        chunks = search_turso_knowledge(med_query_base, top_k=10, book_title_filter=lehne_book)
-        for c in chunks:
-            if c['id'] not in seen_ids:
-                pharm_chunks.append(c)
-                seen_ids.add(c['id'])
-        
-        # Search specifically for mentioned meds in Lehne's
-        if all_meds_text:
-            med_specific_query = f"{all_meds_text} dosing interactions monitoring"
-            chunks = search_turso_knowledge(med_specific_query, top_k=8, book_title_filter=lehne_book)
-            for c in chunks:
-                if c['id'] not in seen_ids:
-                    pharm_chunks.append(c)
-                    seen_ids.add(c['id'])
-                    
-        # Secondary: Marino & Urden (for clinical context of these meds)
-        for book in [marino_book, urden_book]:
-            chunks = search_turso_knowledge(med_query_base, top_k=5, book_title_filter=book)
-            for c in chunks:
-                if c['id'] not in seen_ids:
-                    pharm_chunks.append(c)
-                    seen_ids.add(c['id'])
-
-        # --- 3. GENERAL CLINICAL CONTEXT (Diagnosis/Vents) ---
-        # Search Urden & Marino text for general care
-        clinical_query = f"{diagnosis} nursing care management intervention" if diagnosis else "ICU nursing care management"
-        for book in [urden_book, marino_book]:
-            chunks = search_turso_knowledge(clinical_query, top_k=8, book_title_filter=book)
-            for c in chunks:
-                if c['id'] not in seen_ids:
-                    general_chunks.append(c)
-                    seen_ids.add(c['id'])
-                    
-        # Ventilator search if needed
-        if vent_settings:
-            vent_query = "ventilator management mechanical ventilation"
-            chunks = search_turso_knowledge(vent_query, top_k=5) # Search all books for vent
-            for c in chunks:
-                if c['id'] not in seen_ids:
-                    general_chunks.append(c)
-                    seen_ids.add(c['id'])
-
-        # --- BUILD CONTEXT STRINGS ---
-        def format_chunks(chunk_list, section_name):
-            if not chunk_list:
-                return f"No specific {section_name} information found."
+    model = await require_model()
+
+    async def events():
+        try:
+            book_filter = await run_blocking(chat_book_filter, request.question)
+            cached, query_embedding = await lookup_cached_answer(request.question, book_filter)
+            if cached is not None:
+                yield sse_event("sources", {"sources": cached.sources})
+                yield sse_event("token", {"text": cached.answer})
+                yield sse_event("done", {"answer": cached.answer})
+                return
+
+            relevant_chunks = await run_blocking(search_turso_knowledge, request.question, top_k=15, book_title_filter=book_filter)
+            prompt, passages = build_chat_prompt(request.question, relevant_chunks)
+            sources = chat_sources(passages)
+            yield sse_event("sources", {"sources": sources})
+
             parts = []
-            # Sort by similarity
-            chunk_list.sort(key=lambda x: x['similarity'], reverse=True)
-            for i, c in enumerate(chunk_list[:15], 1): # Top 15 per section
-                parts.append(f"[{section_name} Source {i} - {c.get('book_title', 'Unknown')} (Page {c.get('page_number', '?')})]\n{c['text']}")
-            return "\n\n".join(parts)
-
-        lab_context = format_chunks(lab_chunks, "LABS_DIAGNOSTICS")
-        pharm_context = format_chunks(pharm_chunks, "PHARMACOLOGY")
-        general_context = format_chunks(general_chunks, "CLINICAL_GUIDELINES")
-        
-        # Build comprehensive prompt for Gemini
-        prompt = f"""You are a multi-persona AI assistant for ICU nurses. Generate a professional SBAR output.
+            async for text in stream_generation(model, prompt):
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+            answer = "".join(parts)
+            yield sse_event("done", {"answer": answer})
+
+            if query_embedding is not None and relevant_chunks:
+                answer_cache.put(request.question, query_embedding, book_filter, ChatResponse(answer=answer, sources=sources))
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Error generating chat response: {str(e)}"})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=STREAM_HEADERS)
+
+SBAR_KEYS = ["situation", "background", "assessment", "recommendation", "ai_suggestion"]
+
+async def build_sbar_prompt(patient_data: Dict[str, Any]) -> str:
+    """Run the SBAR knowledge searches and build the Gemini prompt."""
+    # Extract key patient information for multiple targeted searches
+    diagnosis = patient_data.get("diagnosis", "").strip()
+    vent_settings = patient_data.get("vent-settings", "")
+    drips = patient_data.get("drips", "")
+    medications = patient_data.get("medications", "")
+    
+    # Book Titles (from the book catalog)
+    router = await run_blocking(book_router)
+    lehne_book = router.title("lehne")
+    canadian_book = router.title("canadian-labs")
+    marino_book = router.title("marino")
+    urden_book = router.title("urden")
+    
+    # --- RETRIEVAL: every section's searches run as one batch ---
+    # Each entry is (section, query, book_filter, top_k). Order matters: a chunk
+    # is kept only in the first section/search that returns it.
+    searches = []
+    
+    # 1. LABS & DIAGNOSTICS: primary Canadian Lab Test Manual, secondary Marino & Urden
+    lab_query = f"{diagnosis} lab tests monitoring diagnostics" if diagnosis else "ICU lab tests diagnostics monitoring"
+    searches.append(("lab", lab_query, canadian_book, 10))
+    for book in [marino_book, urden_book]:
+        searches.append(("lab", lab_query, book, 5))
+    
+    # 2. PHARMACOLOGY & DRIPS: primary Lehne's, plus the mentioned meds,
+    # secondary Marino & Urden (for clinical context of these meds)
+    all_meds_text = f"{medications} {drips}".strip()
+    med_query_base = f"{diagnosis} pharmacology medication management" if diagnosis else "ICU pharmacology medication management"
+    searches.append(("pharm", med_query_base, lehne_book, 10))
+    if all_meds_text:
+        searches.append(("pharm", f"{all_meds_text} dosing interactions monitoring", lehne_book, 8))
+    for book in [marino_book, urden_book]:
+        searches.append(("pharm", med_query_base, book, 5))
+    
+    # 3. GENERAL CLINICAL CONTEXT (Diagnosis/Vents): Urden & Marino, vent across all books
+    clinical_query = f"{diagnosis} nursing care management intervention" if diagnosis else "ICU nursing care management"
+    for book in [urden_book, marino_book]:
+        searches.append(("general", clinical_query, book, 8))
+    if vent_settings:
+        searches.append(("general", "ventilator management mechanical ventilation", None, 5))
+    
+    section_chunks = {"lab": [], "pharm": [], "general": []}
+    results = await run_blocking(search_many, [(query, book, top_k) for _, query, book, top_k in searches])
+    for (section, _, _, _), chunks in zip(searches, results):
+        section_chunks[section].extend(chunks)
+    lab_chunks = section_chunks["lab"]
+    pharm_chunks = section_chunks["pharm"]
+    general_chunks = section_chunks["general"]
+
+    # --- BUILD CONTEXT STRINGS ---
+    def format_chunks(chunk_list, section_name):
+        if not chunk_list:
+            return f"No specific {section_name} information found."
+        # Merge overlapping neighbours, best passages first, within the section's token budget
+        passages, report = context_packer.pack(chunk_list, SBAR_SECTION_TOKENS)
+        log_packing(section_name, report)
+        parts = []
+        for i, p in enumerate(passages, 1):
+            parts.append(f"[{section_name} Source {i} - {p.get('book_title') or 'Unknown'} ({page_label(p) or 'Page ?'})]\n{p['text']}")
+        return "\n\n".join(parts)
+
+    lab_context = format_chunks(lab_chunks, "LABS_DIAGNOSTICS")
+    pharm_context = format_chunks(pharm_chunks, "PHARMACOLOGY")
+    general_context = format_chunks(general_chunks, "CLINICAL_GUIDELINES")
+    
+    # Build comprehensive prompt for Gemini
+    prompt = f"""You are a multi-persona AI assistant for ICU nurses. Generate a professional SBAR output.
 
 SOURCES TO USE:
 1. LABS & DIAGNOSTICS KNOWLEDGE (Primary: Canadian Lab Manual, Secondary: Marino/Urden):
@@ -480,63 +779,92 @@ Generate a JSON object with keys: "situation", "background", "assessment", "reco
 
 Generate ONLY valid JSON.
 """
-        
-        # Generate response using Gemini 2.0
-        response = model.generate_content(prompt)
-        
-        # Parse JSON response
-        import json
-        try:
-            report_json = json.loads(response.text)
-        except json.JSONDecodeError:
-            # If JSON parsing fails, try to extract JSON from markdown
-            text = response.text.strip()
-            if "```json" in text:
-                text = text.split("```json")[1].split("```")[0].strip()
-            elif "```" in text:
-                text = text.split("```")[1].split("```")[0].strip()
-            report_json = json.loads(text)
-        
-        # Ensure all required keys exist and convert nested structures to strings
-        required_keys = ["situation", "background", "assessment", "recommendation", "ai_suggestion"]
-        
-        def convert_to_string(value):
-            """Convert nested dictionaries/lists to formatted string."""
-            if isinstance(value, str):
-                return value
-            elif isinstance(value, dict):
-                # Format dictionary as a readable string
-                lines = []
-                for k, v in value.items():
-                    if isinstance(v, list):
-                        lines.append(f"{k}:")
-                        for item in v:
-                            lines.append(f"  • {item}")
-                    elif isinstance(v, dict):
-                        lines.append(f"{k}:")
-                        for sub_k, sub_v in v.items():
-                            lines.append(f"  • {sub_k}: {sub_v}")
-                    else:
-                        lines.append(f"{k}: {v}")
-                return "\n".join(lines)
-            elif isinstance(value, list):
-                return "\n".join([f"• {item}" for item in value])
-            else:
-                return str(value)
-        
-        # Convert all values to strings
-        final_report = {}
-        for key in required_keys:
-            if key in report_json:
-                final_report[key] = convert_to_string(report_json[key])
+    return prompt
+
+def parse_sbar_json(text: str) -> Dict[str, Any]:
+    """Parse Gemini's SBAR output, tolerating a markdown code fence around the JSON."""
+    try:
+        report_json = json.loads(text)
+    except json.JSONDecodeError:
+        # If JSON parsing fails, try to extract JSON from markdown
+        text = text.strip()
+        if "```json" in text:
+            text = text.split("```json")[1].split("```")[0].strip()
+        elif "```" in text:
+            text = text.split("```")[1].split("```")[0].strip()
+        report_json = json.loads(text)
+    return report_json
+
+def convert_to_string(value):
+    """Convert nested dictionaries/lists to formatted string."""
+    if isinstance(value, str):
+        return value
+    elif isinstance(value, dict):
+        # Format dictionary as a readable string
+        lines = []
+        for k, v in value.items():
+            if isinstance(v, list):
+                lines.append(f"{k}:")
+                for item in v:
+                    lines.append(f"  • {item}")
+            elif isinstance(v, dict):
+                lines.append(f"{k}:")
+                for sub_k, sub_v in v.items():
+                    lines.append(f"  • {sub_k}: {sub_v}")
             else:
-                final_report[key] = ""
+                lines.append(f"{k}: {v}")
+        return "\n".join(lines)
+    elif isinstance(value, list):
+        return "\n".join([f"• {item}" for item in value])
+    else:
+        return str(value)
+
+def format_sbar_report(report_json: Dict[str, Any]) -> Dict[str, str]:
+    """Ensure all required keys exist and convert nested structures to strings."""
+    return {key: convert_to_string(report_json[key]) if key in report_json else "" for key in SBAR_KEYS}
+
+@app.post("/generate_sbar", response_model=GenerateSBARResponse)
+async def generate_sbar(request: GenerateSBARRequest):
+    """
+    Generate SBAR report endpoint: Creates professional SBAR handoff note.
+    """
+    model = await require_model()
+    try:
+        prompt = await build_sbar_prompt(request.patientData)
         
-        return GenerateSBARResponse(report=final_report)
+        # Generate response using Gemini 2.0
+        response = await run_blocking(model.generate_content, prompt)
+        return GenerateSBARResponse(report=format_sbar_report(parse_sbar_json(response.text)))
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating SBAR report: {str(e)}")
 
+@app.post("/generate_sbar/stream")
+async def generate_sbar_stream(request: GenerateSBARRequest):
+    """
+    Streaming SBAR endpoint (server-sent events).
+    The JSON is parsed as it generates: "section" events carry {"key", "text"} deltas for
+    each top-level string value, so "situation" renders while "recommendation" is still
+    generating. "done" carries the final report (same shape as /generate_sbar), or "error".
+    """
+    model = await require_model()
+
+    async def events():
+        try:
+            prompt = await build_sbar_prompt(request.patientData)
+            parser = IncrementalJSONObject()
+            parts = []
+            async for text in stream_generation(model, prompt):
+                parts.append(text)
+                for key, delta in parser.feed(text):
+                    if key in SBAR_KEYS:
+                        yield sse_event("section", {"key": key, "text": delta})
+            yield sse_event("done", {"report": format_sbar_report(parse_sbar_json("".join(parts)))})
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Error generating SBAR report: {str(e)}"})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=STREAM_HEADERS)
+
 class ProcessReportRequest(BaseModel):
     text: Optional[str] = None
     input_type: str  # "voice", "text", or "image"
@@ -551,8 +879,7 @@ async def process_report(
     Process report from voice transcript, free text, or image.
     Extracts structured patient data using Gemini AI.
     """
-    if model is None:
-        raise HTTPException(status_code=503, detail="Vertex AI not configured. Please set up Google Cloud credentials.")
+    model = await require_model()
     
     try:
         # Form field IDs that need to be extracted
@@ -574,6 +901,7 @@ async def process_report(
             mime_type = image.content_type or "image/jpeg"
             
             # Create image part for Gemini using Part API
+            from vertexai.preview.generative_models import Part
             image_part = Part.from_data(data=image_data, mime_type=mime_type)
             
             prompt_text = f"""You are an expert medical data extraction AI. Analyze this image of a patient report, whiteboard, notes, or medical document.
@@ -592,7 +920,7 @@ For each field:
 Return ONLY a valid JSON object with the extracted data. Do not include any explanatory text."""
             
             # Use Gemini with vision
-            response = model.generate_content([image_part, prompt_text])
+            response = await run_blocking(model.generate_content, [image_part, prompt_text])
             
         elif input_type in ["voice", "text"] and text:
             # Process text (voice transcript or free text)
@@ -614,7 +942,7 @@ Return ONLY the final JSON object, no markdown formatting.
 {text}
 ---"""
             
-            response = model.generate_content(prompt_text)
+            response = await run_blocking(model.generate_content, prompt_text)
         else:
             raise HTTPException(status_code=400, detail="Invalid input: provide text for voice/text input or image for image input")
         
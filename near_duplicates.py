@@ -0,0 +1,254 @@
+"""
+Near-duplicate chunk detection (MinHash + LSH)
+Textbooks repeat boilerplate, tables and reprinted monographs. Every chunk gets a
+MinHash signature of its word 5-gram shingles (stored in medical_knowledge.minhash);
+NearDuplicateIndex buckets signatures by LSH bands and confirms candidates by estimated
+Jaccard similarity. Ingestion skips a chunk whose text nearly matches another chunk of
+the same book and links it to that canonical chunk in chunk_duplicates instead of
+embedding and storing it again. Duplicates are only looked for within a book: searches
+can be restricted to one book, so every book keeps its own copy of shared text.
+"""
+import re
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from bulk_writer import BulkWriter
+
+TABLE_NAME = "medical_knowledge"
+DUPLICATES_TABLE_NAME = "chunk_duplicates"
+
+NUM_PERM = 128            # MinHash permutations (signature length)
+LSH_BANDS = 16            # bands of NUM_PERM // LSH_BANDS rows; candidates from about 0.7 similarity
+SHINGLE_WORDS = 5
+DEFAULT_THRESHOLD = 0.85  # estimated Jaccard similarity from which a chunk is a near-duplicate
+
+_PRIME = np.uint64(4294967291)  # largest prime below 2**32; keeps a * x + b within uint64
+_rng = np.random.default_rng(20240601)  # fixed: stored signatures must stay comparable
+_PERM_A = _rng.integers(1, 2 ** 31, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, 2 ** 32, size=NUM_PERM, dtype=np.uint64)
+_BAND_MULTIPLIERS = _rng.integers(1, 2 ** 63, size=NUM_PERM // LSH_BANDS, dtype=np.uint64) | np.uint64(1)
+_WORD_RE = re.compile(r"\w+")
+
+ChunkKey = Tuple[str, int]  # (content_hash, chunk_index)
+
+def shingle_hashes(text: str) -> np.ndarray:
+    """CRC-32 of each word 5-gram of the lowercased text (one shingle if it is shorter)."""
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        return np.zeros(0, dtype=np.uint64)
+    count = max(1, len(words) - SHINGLE_WORDS + 1)
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(count)}
+    return np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+def minhash_signature(text: str) -> Optional[np.ndarray]:
+    """NUM_PERM uint32 MinHash values of the text's shingles, or None if it has no words."""
+    hashes = shingle_hashes(text)
+    if not hashes.size:
+        return None
+    return ((_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+def signature_bytes(signature: Optional[np.ndarray]) -> Optional[bytes]:
+    """Storage form of a signature (little-endian uint32), None stays None."""
+    return None if signature is None else signature.astype("<u4").tobytes()
+
+def signature_from_bytes(blob) -> Optional[np.ndarray]:
+    """Inverse of signature_bytes(); None for NULL or a blob of the wrong length."""
+    if blob is None or len(blob) != NUM_PERM * 4:
+        return None
+    return np.frombuffer(bytes(blob), dtype="<u4").astype(np.uint32)
+
+def _band_hashes(signatures: np.ndarray) -> np.ndarray:
+    """(n, LSH_BANDS) uint64 hash of each signature band (wraps mod 2**64)."""
+    rows = NUM_PERM // LSH_BANDS
+    bands = signatures.reshape(len(signatures), LSH_BANDS, rows).astype(np.uint64)
+    return (bands * _BAND_MULTIPLIERS).sum(axis=2, dtype=np.uint64)
+
+class NearDuplicateIndex:
+    """
+    Thread-safe LSH index of chunk signatures.
+
+    Chunks loaded from the database live in sorted per-band arrays; chunks added during
+    the run go to a dict of buckets, so the index stays compact for large books.
+
+    Args:
+        threshold: Estimated Jaccard similarity from which a chunk is a near-duplicate
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._keys: List[Optional[ChunkKey]] = []   # position -> key (None once replaced)
+        self._positions: Dict[ChunkKey, int] = {}
+        self._base = np.zeros((0, NUM_PERM), dtype=np.uint32)
+        self._base_hashes = np.zeros((LSH_BANDS, 0), dtype=np.uint64)  # sorted per band
+        self._base_order = np.zeros((LSH_BANDS, 0), dtype=np.int64)    # positions in that order
+        self._added: List[np.ndarray] = []
+        self._buckets: Dict[Tuple[int, int], List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def build(self, keys: Sequence[ChunkKey], signatures: np.ndarray):
+        """Replace the index contents with these chunks (used when loading from the database)."""
+        with self._lock:
+            self._keys = list(keys)
+            self._positions = {key: i for i, key in enumerate(self._keys)}
+            self._base = np.asarray(signatures, dtype=np.uint32).reshape(len(self._keys), NUM_PERM)
+            hashes = _band_hashes(self._base).T
+            self._base_order = np.argsort(hashes, axis=1, kind="stable")
+            self._base_hashes = np.take_along_axis(hashes, self._base_order, axis=1)
+            self._added = []
+            self._buckets = {}
+
+    def find(self, key: ChunkKey, signature: np.ndarray) -> Optional[Tuple[ChunkKey, float]]:
+        """(canonical key, similarity) of the most similar other indexed chunk at or above the threshold, or None."""
+        with self._lock:
+            return self._best_match(key, signature)
+
+    def add(self, key: ChunkKey, signature: np.ndarray):
+        """Index a chunk (replacing any earlier signature under the same key)."""
+        with self._lock:
+            self._add(key, signature)
+
+    def remove(self, key: ChunkKey):
+        """Drop a chunk from the index (no-op if it is not indexed)."""
+        with self._lock:
+            position = self._positions.pop(key, None)
+            if position is not None:
+                self._keys[position] = None
+
+    def _signature(self, position: int) -> np.ndarray:
+        if position < len(self._base):
+            return self._base[position]
+        return self._added[position - len(self._base)]
+
+    def _candidates(self, band_hashes: np.ndarray) -> Iterable[int]:
+        for band, value in enumerate(band_hashes):
+            row = self._base_hashes[band]
+            start, end = np.searchsorted(row, value, side="left"), np.searchsorted(row, value, side="right")
+            yield from self._base_order[band, start:end].tolist()
+            yield from self._buckets.get((band, int(value)), ())
+
+    def _best_match(self, key: ChunkKey, signature: np.ndarray) -> Optional[Tuple[ChunkKey, float]]:
+        positions = {p for p in self._candidates(_band_hashes(signature[None, :])[0])
+                     if self._keys[p] is not None and self._keys[p] != key}
+        if not positions:
+            return None
+        positions = sorted(positions)
+        similarities = (np.stack([self._signature(p) for p in positions]) == signature).mean(axis=1)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None
+        return self._keys[positions[best]], float(similarities[best])
+
+    def _add(self, key: ChunkKey, signature: np.ndarray):
+        old = self._positions.get(key)
+        if old is not None:
+            self._keys[old] = None
+        position = len(self._keys)
+        self._keys.append(key)
+        self._positions[key] = position
+        self._added.append(signature)
+        for band, value in enumerate(_band_hashes(signature[None, :])[0]):
+            self._buckets.setdefault((band, int(value)), []).append(position)
+
+def ensure_near_duplicate_tables(client):
+    """Add medical_knowledge.minhash and the chunk_duplicates table if missing (idempotent)."""
+    cursor = client.cursor()
+    cursor.execute(f"PRAGMA table_info({TABLE_NAME})")
+    if "minhash" not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN minhash BLOB")
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {DUPLICATES_TABLE_NAME} (
+        content_hash TEXT NOT NULL,
+        chunk_index INTEGER NOT NULL,
+        book_title TEXT,
+        page_number INTEGER,
+        page_end INTEGER,
+        canonical_hash TEXT NOT NULL,
+        canonical_index INTEGER NOT NULL,
+        similarity REAL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (content_hash, chunk_index)
+    )
+    """)
+    client.commit()
+
+def load_near_duplicate_index(client, content_hash: str, threshold: float = DEFAULT_THRESHOLD,
+                              batch_size: int = 1000) -> NearDuplicateIndex:
+    """
+    Index the stored chunks of one PDF (an earlier, interrupted run of the same book).
+    Chunks stored before signatures existed get theirs computed from chunk_text and
+    written back (once).
+    """
+    cursor = client.cursor()
+    cursor.execute(f"""
+    SELECT id, content_hash, chunk_index, minhash, CASE WHEN minhash IS NULL THEN chunk_text END
+    FROM {TABLE_NAME} WHERE content_hash = ?
+    """, (content_hash,))
+    keys, signatures, backfill = [], [], []
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for row_id, content_hash, chunk_index, blob, text in rows:
+            signature = signature_from_bytes(blob)
+            if signature is None and text is not None:
+                signature = minhash_signature(text)
+                if signature is not None:
+                    backfill.append((signature_bytes(signature), row_id))
+            if signature is not None:
+                keys.append((content_hash, chunk_index))
+                signatures.append(signature)
+    for start in range(0, len(backfill), batch_size):
+        cursor.executemany(f"UPDATE {TABLE_NAME} SET minhash = ? WHERE id = ?", backfill[start:start + batch_size])
+        client.commit()
+    if backfill:
+        print(f"Computed MinHash signatures for {len(backfill)} existing chunks.")
+    index = NearDuplicateIndex(threshold)
+    index.build(keys, np.stack(signatures) if signatures else np.zeros((0, NUM_PERM), dtype=np.uint32))
+    return index
+
+DUPLICATE_COLUMNS = [
+    "content_hash", "chunk_index", "book_title", "page_number", "page_end", "canonical_hash", "canonical_index", "similarity"
+]
+DUPLICATE_UPSERT = """ON CONFLICT (content_hash, chunk_index) DO UPDATE SET
+    book_title = excluded.book_title, page_number = excluded.page_number, page_end = excluded.page_end,
+    canonical_hash = excluded.canonical_hash, canonical_index = excluded.canonical_index,
+    similarity = excluded.similarity, created_at = CURRENT_TIMESTAMP"""
+
+def record_duplicates(client, rows: Sequence[Sequence]) -> int:
+    """
+    Upsert chunk_duplicates rows (tuples in DUPLICATE_COLUMNS order) and delete stored
+    chunks under the same keys (an earlier run that kept a chunk now found to be a duplicate).
+    """
+    if not rows:
+        return 0
+    written = BulkWriter(client, DUPLICATES_TABLE_NAME, DUPLICATE_COLUMNS, conflict=DUPLICATE_UPSERT).write(rows)
+    cursor = client.cursor()
+    cursor.executemany(f"DELETE FROM {TABLE_NAME} WHERE content_hash = ? AND chunk_index = ?",
+                       [(row[0], row[1]) for row in rows])
+    client.commit()
+    return written
+
+def clear_stale_duplicates(client, content_hash: str, chunk_count: int) -> int:
+    """Delete a PDF's duplicate links past its last chunk or for chunks that are stored after all."""
+    cursor = client.cursor()
+    cursor.execute(f"""
+    DELETE FROM {DUPLICATES_TABLE_NAME} WHERE content_hash = ? AND (
+        chunk_index >= ? OR chunk_index IN (SELECT chunk_index FROM {TABLE_NAME} WHERE content_hash = ?)
+    )
+    """, (content_hash, chunk_count, content_hash))
+    deleted = cursor.rowcount
+    client.commit()
+    return deleted
+
+def duplicate_counts(client) -> Dict[str, int]:
+    """Near-duplicate chunks skipped at ingest, per PDF content hash."""
+    cursor = client.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (DUPLICATES_TABLE_NAME,))
+    if cursor.fetchone() is None:
+        return {}
+    cursor.execute(f"SELECT content_hash, COUNT(*) FROM {DUPLICATES_TABLE_NAME} GROUP BY content_hash")
+    return {row[0]: int(row[1]) for row in cursor.fetchall()}
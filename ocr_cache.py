@@ -0,0 +1,113 @@
+"""
+Local OCR page cache and ingest checkpoints
+Gemini Vision OCR is the slowest and most quota-hungry step of ingestion, so every
+page's text is saved to a local SQLite file as soon as it arrives, keyed by the PDF's
+content hash and page number. A rerun after a crash only OCRs the missing pages.
+The same file keeps a progress checkpoint per book.
+"""
+import sqlite3
+import threading
+from typing import Any, Dict, Optional, Set
+
+PROGRESS_FIELDS = ["source_file", "book_title", "page_count", "pages_done", "chunk_count", "chunks_stored", "stage"]
+
+class OCRCache:
+    """
+    Thread-safe store of OCR'd page text.
+
+    Args:
+        path: SQLite file; None disables the cache (every method becomes a no-op)
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("""
+            CREATE TABLE IF NOT EXISTS ocr_pages (
+                content_hash TEXT NOT NULL,
+                page_number INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (content_hash, page_number)
+            )
+            """)
+            self._db.execute("""
+            CREATE TABLE IF NOT EXISTS ingest_progress (
+                content_hash TEXT PRIMARY KEY,
+                source_file TEXT,
+                book_title TEXT,
+                page_count INTEGER,
+                pages_done INTEGER,
+                chunk_count INTEGER,
+                chunks_stored INTEGER,
+                stage TEXT,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            """)
+            self._db.commit()
+
+    @property
+    def enabled(self) -> bool:
+        return self._db is not None
+
+    def cached_pages(self, content_hash: str) -> Set[int]:
+        """0-based numbers of the PDF's pages that have cached text."""
+        if self._db is None:
+            return set()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT page_number FROM ocr_pages WHERE content_hash = ?", (content_hash,)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def page(self, content_hash: str, page_number: int) -> Optional[str]:
+        """Cached text of one page (0-based), or None."""
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT text FROM ocr_pages WHERE content_hash = ? AND page_number = ?", (content_hash, page_number)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_page(self, content_hash: str, page_number: int, text: str):
+        """Save one page's OCR text (committed immediately, so a crash loses at most the pages in flight)."""
+        if self._db is None:
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO ocr_pages (content_hash, page_number, text) VALUES (?, ?, ?)",
+                (content_hash, page_number, text)
+            )
+            self._db.commit()
+
+    def save_progress(self, content_hash: str, **fields):
+        """Update the book's checkpoint with any of PROGRESS_FIELDS."""
+        if self._db is None:
+            return
+        unknown = set(fields) - set(PROGRESS_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown progress fields: {', '.join(sorted(unknown))}")
+        with self._lock:
+            self._db.execute("INSERT OR IGNORE INTO ingest_progress (content_hash) VALUES (?)", (content_hash,))
+            if fields:
+                assignments = ", ".join(f"{name} = ?" for name in fields)
+                self._db.execute(
+                    f"UPDATE ingest_progress SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE content_hash = ?",
+                    (*fields.values(), content_hash)
+                )
+            self._db.commit()
+
+    def progress(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """The book's last checkpoint, or None if it was never started."""
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(PROGRESS_FIELDS)}, updated_at FROM ingest_progress WHERE content_hash = ?",
+                (content_hash,)
+            ).fetchone()
+        return dict(zip(PROGRESS_FIELDS + ["updated_at"], row)) if row else None
@@ -0,0 +1,126 @@
+"""
+Per-page extraction planning for PDF ingestion
+Many textbooks are digital-native: PyMuPDF reads their embedded text layer locally in
+milliseconds, so Gemini Vision OCR is only needed for scanned pages, pages whose text
+layer is garbage (unmapped glyphs, an earlier OCR pass's invisible font), and the text
+inside figures. classify_page() chooses per page between
+  "text"  use the embedded text layer only
+  "ocr"   OCR the whole page (the text layer is the fallback)
+  "both"  embedded text plus OCR of the page's image regions (figures, tables as images)
+and render_settings() picks the resolution and image format for pages that need OCR.
+"""
+import statistics
+import unicodedata
+from typing import Any, Dict, Optional, Tuple
+import fitz  # PyMuPDF
+
+POINTS_PER_INCH = 72.0
+
+# Classification thresholds
+MIN_TEXT_CHARS = 40           # fewer non-space characters: no usable text layer
+BLANK_IMAGE_RATIO = 0.02      # ...and less image area than this: blank page, nothing to OCR
+MAX_GARBAGE_RATIO = 0.05      # share of replacement / private-use / control characters
+MIN_FONT_COVERAGE = 0.8       # share of characters drawn in a real (not OCR-layer) font
+MIN_TEXT_DENSITY = 10         # characters per square inch over a full-page image (dense prose: ~35)
+FIGURE_IMAGE_RATIO = 0.15     # image area from which figures are OCR'd as well
+FULL_PAGE_IMAGE_RATIO = 0.85  # image area from which an image is a page background or scan
+OCR_LAYER_FONTS = {"glyphlessfont"}  # invisible text layers written by OCR tools
+
+# Rendering
+DEFAULT_FONT_SIZE = 10.0      # points, when a page has no text layer to measure
+TARGET_EM_PIXELS = 24.0       # pixels per font em the OCR model gets
+MIN_ZOOM, MAX_ZOOM = 1.5, 3.0
+MAX_RENDER_PIXELS = 2400      # longest image side
+PHOTO_IMAGE_RATIO = 0.5       # rendered region at least this image-covered: JPEG, else PNG
+JPEG_QUALITY = 85
+
+def _is_garbage(char: str) -> bool:
+    if char == "�":
+        return True
+    category = unicodedata.category(char)
+    return category in ("Co", "Cs") or (category == "Cc" and not char.isspace())
+
+def _rect_area(rect) -> float:
+    return max(0.0, rect.width) * max(0.0, rect.height)
+
+def page_signals(page) -> Dict[str, Any]:
+    """
+    Measure a page's text layer and images. Returns the embedded 'text' plus:
+    chars, text_density (chars per square inch), garbage_ratio, font_coverage,
+    image_area_ratio, image_rect (union of image boxes or None) and median_font_size.
+    """
+    page_rect = page.rect
+    page_area = _rect_area(page_rect) or 1.0
+    text = page.get_text("text")
+    chars = sum(1 for char in text if not char.isspace())
+    garbage = sum(1 for char in text if _is_garbage(char))
+
+    span_chars = real_font_chars = 0
+    sizes = []
+    # flags=0: no images or extra detail in the output, just spans with their fonts
+    for block in page.get_text("dict", flags=0)["blocks"]:
+        for line in block.get("lines", []):
+            for span in line["spans"]:
+                count = sum(1 for char in span["text"] if not char.isspace())
+                if not count:
+                    continue
+                span_chars += count
+                if span["font"] and span["font"].lower() not in OCR_LAYER_FONTS:
+                    real_font_chars += count
+                sizes.append(span["size"])
+
+    image_area = 0.0
+    image_rect = None
+    for info in page.get_image_info():
+        rect = fitz.Rect(info["bbox"]) & page_rect
+        if rect.is_empty:
+            continue
+        image_area += _rect_area(rect)
+        image_rect = rect if image_rect is None else image_rect | rect
+
+    return {
+        "text": text,
+        "chars": chars,
+        "text_density": chars / (page_area / POINTS_PER_INCH ** 2),
+        "garbage_ratio": garbage / chars if chars else 0.0,
+        "font_coverage": real_font_chars / span_chars if span_chars else 0.0,
+        "image_area_ratio": min(1.0, image_area / page_area),
+        "image_rect": image_rect,
+        "median_font_size": statistics.median(sizes) if sizes else None
+    }
+
+def classify_page(signals: Dict[str, Any]) -> str:
+    """'text', 'ocr' or 'both' for a page's signals (see the module docstring)."""
+    images = signals["image_area_ratio"]
+    if signals["chars"] < MIN_TEXT_CHARS:
+        return "ocr" if images >= BLANK_IMAGE_RATIO else "text"
+    if signals["garbage_ratio"] > MAX_GARBAGE_RATIO or signals["font_coverage"] < MIN_FONT_COVERAGE:
+        return "ocr"
+    if images >= FULL_PAGE_IMAGE_RATIO:
+        # Real text over a full-page image is a page background (digital) unless the text is sparse (scan)
+        return "ocr" if signals["text_density"] < MIN_TEXT_DENSITY else "text"
+    if images >= FIGURE_IMAGE_RATIO:
+        return "both"
+    return "text"
+
+def render_settings(signals: Dict[str, Any], region, image_ratio: Optional[float] = None) -> Tuple[float, str]:
+    """
+    (zoom, image format) for rendering `region` (a page rect or a clip) for OCR.
+    Zoom gives the page's median font about TARGET_EM_PIXELS pixels, within
+    MIN_ZOOM..MAX_ZOOM and MAX_RENDER_PIXELS. Mostly-image regions (scans, photos)
+    are sent as JPEG; text and line art as PNG, where JPEG artifacts would hurt OCR.
+    """
+    font_size = signals["median_font_size"] or DEFAULT_FONT_SIZE
+    zoom = min(MAX_ZOOM, max(MIN_ZOOM, TARGET_EM_PIXELS / font_size))
+    longest_side = max(region.width, region.height)
+    if longest_side * zoom > MAX_RENDER_PIXELS:
+        zoom = MAX_RENDER_PIXELS / longest_side
+    ratio = signals["image_area_ratio"] if image_ratio is None else image_ratio
+    return zoom, "jpeg" if ratio >= PHOTO_IMAGE_RATIO else "png"
+
+def render_region(page, zoom: float, image_format: str, clip=None) -> Tuple[bytes, str]:
+    """Render a page (or a clip of it) to (image bytes, mime type)."""
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, alpha=False)
+    if image_format == "jpeg":
+        return pix.tobytes("jpeg", jpg_quality=JPEG_QUALITY), "image/jpeg"
+    return pix.tobytes("png"), "image/png"
@@ -0,0 +1,139 @@
+"""
+Page planning and rasterization in worker processes
+Classifying a page and rendering/encoding the parts that need OCR is CPU-bound
+PyMuPDF work, and PyMuPDF is not thread-safe, so in one process every page of every
+book is planned on one core at a time. PageRenderer runs plan_pdf_page() in a pool of
+processes sized to the machine's cores: each worker opens its own fitz documents
+(kept open across its pages) and returns the page's plan with the encoded image.
+The caller bounds how many pages it has in flight, which is the backpressure that
+keeps rendered images from piling up in memory.
+"""
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+import fitz  # PyMuPDF
+from page_classifier import page_signals, classify_page, render_settings, render_region
+
+MAX_OPEN_DOCUMENTS = 4  # per process; books are read page by page, so only a few are open at once
+
+# PyMuPDF is not thread-safe, even across documents: every fitz call in a process holds this lock
+fitz_lock = threading.Lock()
+_documents: "OrderedDict[tuple, Any]" = OrderedDict()
+
+def plan_page(page, mode: str = "auto") -> Dict[str, Any]:
+    """
+    Decide how to extract a page (`mode` "ocr" or "text" forces it, "auto" uses
+    classify_page) and render what needs OCR. Returns {'method', 'text' (embedded
+    text layer), 'image', 'mime_type'}.
+    """
+    signals = page_signals(page)
+    method = classify_page(signals) if mode == "auto" else mode
+    if method == "both" and signals["image_rect"] is None:
+        method = "text"
+    plan = {"method": method, "text": signals["text"], "image": None, "mime_type": None}
+    if method == "ocr":
+        zoom, image_format = render_settings(signals, page.rect)
+        plan["image"], plan["mime_type"] = render_region(page, zoom, image_format)
+    elif method == "both":
+        # Only the image regions go to Gemini; the text around them comes from the text layer
+        zoom, image_format = render_settings(signals, signals["image_rect"], image_ratio=1.0)
+        plan["image"], plan["mime_type"] = render_region(page, zoom, image_format, clip=signals["image_rect"])
+    return plan
+
+def _document(pdf_path: str, content_hash: str):
+    # Keyed by content hash too, so a PDF replaced on disk is not read from a stale handle
+    key = (pdf_path, content_hash)
+    doc = _documents.pop(key, None)
+    if doc is None:
+        doc = fitz.open(pdf_path)
+        while len(_documents) >= MAX_OPEN_DOCUMENTS:
+            _documents.popitem(last=False)[1].close()
+    _documents[key] = doc
+    return doc
+
+def plan_pdf_page(pdf_path: str, content_hash: str, page_num: int, mode: str = "auto") -> Dict[str, Any]:
+    """plan_page() for a 0-based page of a PDF, reusing this process's open document."""
+    with fitz_lock:
+        return plan_page(_document(pdf_path, content_hash)[page_num], mode)
+
+def close_documents():
+    """Close the documents this process keeps open."""
+    with fitz_lock:
+        while _documents:
+            _documents.popitem()[1].close()
+
+def _noop(*args):
+    return None
+
+def _start_method() -> str:
+    # Forked workers start without re-importing the caller's __main__ (spawn would run
+    # ingest_book's credential and model setup in every worker)
+    return "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+
+class PageRenderer:
+    """
+    Pool that plans and renders PDF pages.
+
+    Args:
+        workers: Worker processes; 0 plans pages in this process (one at a time, under fitz_lock)
+    """
+
+    def __init__(self, workers: int):
+        self.workers = max(0, workers)
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._local: Optional[ThreadPoolExecutor] = None
+
+    def start(self):
+        """
+        Start the worker processes now. Call it before starting other threads: workers
+        are forked, and a fork copies locks that other threads might be holding.
+        """
+        if self.workers:
+            self.submit(None, None, None).result()
+
+    def submit(self, pdf_path: Optional[str], content_hash: Optional[str], page_num: Optional[int],
+               mode: str = "auto") -> Future:
+        """Plan a page; the future's result is plan_pdf_page()'s (None for the no-op that start() sends)."""
+        function = _noop if pdf_path is None else plan_pdf_page
+        with self._lock:
+            if self.workers:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context(_start_method()))
+                try:
+                    return self._pool.submit(function, pdf_path, content_hash, page_num, mode)
+                except BrokenProcessPool as e:
+                    broken = e
+            else:
+                broken = None
+        if broken is not None:
+            self.disable_workers(str(broken) or "a worker process died")
+        with self._lock:
+            if self._local is None:
+                self._local = ThreadPoolExecutor(max_workers=1, thread_name_prefix="render")
+            return self._local.submit(function, pdf_path, content_hash, page_num, mode)
+
+    def disable_workers(self, reason: str):
+        """Plan pages in this process from now on (after a worker process died)."""
+        with self._lock:
+            if not self.workers:
+                return
+            print(f"⚠️  Page render workers stopped ({reason}); rendering in-process from now on")
+            self.workers = 0
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        """Stop the workers and close the documents open in this process."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+            local, self._local = self._local, None
+        for executor in (pool, local):
+            if executor is not None:
+                executor.shutdown()
+        close_documents()
@@ -0,0 +1,62 @@
+"""
+Bounded producer/consumer stages for streaming ingestion
+prefetch() runs a generator in a background thread and hands its items over through a
+bounded queue, so consecutive stages (OCR -> chunking -> embedding -> inserting) overlap
+while a slow stage applies backpressure to the ones before it. Memory stays proportional
+to the queue sizes, not to the size of the book.
+"""
+import queue
+import threading
+from typing import Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+_DONE = object()
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+def prefetch(items: Iterable[T], maxsize: int, name: str = "stage") -> Iterator[T]:
+    """
+    Iterate `items` in a daemon thread, keeping at most `maxsize` items buffered.
+    Exceptions raised by the producer are re-raised in the consumer. If the consumer
+    stops early, the producer is stopped at its next item.
+    """
+    buffer: "queue.Queue" = queue.Queue(maxsize=max(1, maxsize))
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(_Failure(e))
+        finally:
+            close = getattr(items, "close", None)
+            if stop.is_set() and close is not None:
+                close()
+
+    thread = threading.Thread(target=produce, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
@@ -0,0 +1,126 @@
+"""
+Scaled int8 embedding quantization
+Each L2-normalized embedding is stored as int8 codes plus one float32 scale
+(value ≈ code * scale), cutting storage and transfer 4x versus float32. Coarse
+search runs on the codes; the shortlist is rescored with the float32 originals.
+"""
+from typing import List, Tuple
+import numpy as np
+
+TABLE_NAME = "medical_knowledge"
+QUANTIZED_COLUMNS = [("embedding_q8", "BLOB"), ("embedding_scale", "REAL")]
+SCORE_BLOCK_ROWS = 8192  # rows dequantized at once while scoring
+
+def quantize_int8(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Quantize each row of a (normalized) float matrix to int8 with a per-row scale.
+    Returns (codes, scales) with codes in [-127, 127].
+    """
+    matrix = np.atleast_2d(np.asarray(matrix, dtype=np.float32))
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def quantize_vector(vector: np.ndarray) -> Tuple[bytes, float]:
+    """Normalize and quantize one embedding for storage; returns (int8 bytes, scale)."""
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector = vector / norm
+    codes, scales = quantize_int8(vector)
+    return codes[0].tobytes(), float(scales[0])
+
+class QuantizedMatrix:
+    """
+    Read-only int8 stand-in for a normalized float32 embedding matrix.
+    Supports the operations the search path uses: row indexing/slicing and
+    `matrix @ query` (dequantized block by block, so no full float32 copy is made).
+    """
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray):
+        self.codes = codes
+        self.scales = np.asarray(scales, dtype=np.float32)
+
+    @classmethod
+    def from_float(cls, matrix: np.ndarray) -> "QuantizedMatrix":
+        return cls(*quantize_int8(matrix))
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.codes.shape
+
+    @property
+    def ndim(self) -> int:
+        return self.codes.ndim
+
+    @property
+    def size(self) -> int:
+        return self.codes.size
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.scales.nbytes
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, key) -> "QuantizedMatrix":
+        return QuantizedMatrix(self.codes[key], self.scales[key])
+
+    def __matmul__(self, other: np.ndarray) -> np.ndarray:
+        other = np.asarray(other, dtype=np.float32)
+        out = np.empty((len(self),) + other.shape[1:], dtype=np.float32)
+        for start in range(0, len(self), SCORE_BLOCK_ROWS):
+            end = start + SCORE_BLOCK_ROWS
+            block = self.codes[start:end].astype(np.float32) @ other
+            scales = self.scales[start:end]
+            out[start:end] = block * (scales[:, None] if block.ndim == 2 else scales)
+        return out
+
+def ensure_quantized_columns(client):
+    """Add the int8 embedding columns to an existing medical_knowledge table (idempotent)."""
+    cursor = client.cursor()
+    cursor.execute(f"PRAGMA table_info({TABLE_NAME})")
+    existing = {row[1] for row in cursor.fetchall()}
+    for name, column_type in QUANTIZED_COLUMNS:
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN {name} {column_type}")
+    client.commit()
+
+def backfill_quantized(client, batch_size: int = 500) -> int:
+    """
+    Write int8 codes for rows that only have a float32 embedding.
+    Returns the number of rows updated.
+    """
+    ensure_quantized_columns(client)
+    cursor = client.cursor()
+    updated = 0
+    while True:
+        cursor.execute(
+            f"SELECT id, embedding FROM {TABLE_NAME} WHERE embedding_q8 IS NULL LIMIT ?", (batch_size,)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return updated
+        for chunk_id, embedding_bytes in rows:
+            codes, scale = quantize_vector(np.frombuffer(embedding_bytes, dtype=np.float32))
+            cursor.execute(
+                f"UPDATE {TABLE_NAME} SET embedding_q8 = ?, embedding_scale = ? WHERE id = ?",
+                (codes, scale, chunk_id)
+            )
+        client.commit()
+        updated += len(rows)
+        print(f"  ✅ Quantized {updated} rows...")
+
+def fetch_float_embeddings(client, ids: List[int], batch_size: int = 500) -> dict:
+    """Fetch full-precision embeddings for the given chunk ids as {id: vector}."""
+    cursor = client.cursor()
+    vectors = {}
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        placeholders = ", ".join("?" for _ in batch)
+        cursor.execute(f"SELECT id, embedding FROM {TABLE_NAME} WHERE id IN ({placeholders})", tuple(batch))
+        for chunk_id, embedding_bytes in cursor.fetchall():
+            vectors[chunk_id] = np.frombuffer(embedding_bytes, dtype=np.float32)
+    return vectors
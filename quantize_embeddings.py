@@ -0,0 +1,91 @@
+"""
+Migrate medical_knowledge to int8 embedding storage and report recall against exact search
+Adds the embedding_q8/embedding_scale columns if missing, backfills existing rows, then
+compares int8 coarse search (with and without float32 rescoring) to exact float32 search.
+Usage:
+  python quantize_embeddings.py                # Migrate, backfill and report
+  python quantize_embeddings.py --report-only  # Only print the recall report
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from libsql_experimental import connect
+from dotenv import load_dotenv
+from knowledge_index import KnowledgeIndex
+from quantization import QuantizedMatrix, backfill_quantized
+
+load_dotenv()
+
+RESCORE_FACTORS = [1, 2, 4, 8]
+
+def recall_report(index: KnowledgeIndex, top_k: int = 15, n_queries: int = 200, seed: int = 0):
+    """
+    Compare int8 search to exact float32 search over noisy corpus embeddings.
+    Rescoring uses the float32 vectors already in `index`, so the report measures
+    ranking quality only (the server fetches the shortlist from the database).
+    """
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(index), size=min(n_queries, len(index)), replace=False)
+    noise = rng.normal(scale=0.02, size=(len(sample), index.dimension)).astype(np.float32)
+    queries = index.embeddings[sample] + noise
+
+    start = time.perf_counter()
+    exact = [{r['id'] for r in index.search(q, top_k=top_k)} for q in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    float_vectors = {int(chunk_id): index.embeddings[row] for row, chunk_id in enumerate(index.ids)}
+    quantized = KnowledgeIndex(index.ids, QuantizedMatrix.from_float(index.embeddings),
+                               index.book_titles, index.page_numbers, index.texts, index.chunk_indexes,
+                               index.page_ends)
+
+    print(f"\nRecall@{top_k}: int8 vs exact float32 ({len(queries)} queries, {len(index)} chunks)")
+    print(f"Resident embeddings: float32 {index.embeddings.nbytes / 1e6:.1f} MB, int8 {quantized.embeddings.nbytes / 1e6:.1f} MB")
+    print("-" * 52)
+    print(f"{'Mode':<22} | {'Recall':>8} | {'ms/query':>10}")
+    print("-" * 52)
+    print(f"{'float32 exact':<22} | {1.0:>8.3f} | {exact_ms:>10.3f}")
+
+    for factor in [None] + RESCORE_FACTORS:
+        quantized.rescorer = None if factor is None else (lambda ids: {i: float_vectors[i] for i in ids})
+        quantized.rescore_factor = factor or 1
+        start = time.perf_counter()
+        approx = [{r['id'] for r in quantized.search(q, top_k=top_k)} for q in queries]
+        elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        recall = np.mean([len(a & e) / max(len(e), 1) for a, e in zip(approx, exact)])
+        label = "int8 coarse only" if factor is None else f"int8 + rescore x{factor}"
+        print(f"{label:<22} | {recall:>8.3f} | {elapsed_ms:>10.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill int8 embeddings and report recall")
+    parser.add_argument("--top-k", type=int, default=15, help="k used for the recall report")
+    parser.add_argument("--report-only", action="store_true", help="Skip the migration")
+    args = parser.parse_args()
+
+    database_url = os.getenv("TURSO_DATABASE_URL")
+    auth_token = os.getenv("TURSO_AUTH_TOKEN")
+    if not database_url or not auth_token:
+        raise ValueError("Missing required environment variables: TURSO_DATABASE_URL and TURSO_AUTH_TOKEN")
+
+    print("Connecting to Turso database...")
+    client = connect(database_url, auth_token=auth_token)
+
+    if not args.report_only:
+        print("Backfilling int8 embeddings...")
+        updated = backfill_quantized(client)
+        print(f"✅ Quantized {updated} existing rows")
+
+    index = KnowledgeIndex.load(client)
+    if len(index) == 0:
+        print("❌ No chunks found in the database!")
+        sys.exit(1)
+    recall_report(index, top_k=args.top_k)
+    print("\nSet EMBEDDING_STORAGE=int8 (and optionally RESCORE_FACTOR) on the server to use it.")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ Error: {e}", file=sys.stderr)
+        sys.exit(1)
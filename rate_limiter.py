@@ -0,0 +1,110 @@
+"""
+Adaptive token-bucket rate limiter
+Shared by every thread that calls a rate-limited API (Gemini Vision OCR at ingest).
+Tokens refill at a rate in requests/minute; a 429 / "resource exhausted" halves the
+rate and pauses all callers briefly, and the rate climbs back to its ceiling while
+requests keep succeeding.
+"""
+import threading
+import time
+from typing import Any, Dict, Optional
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket with multiplicative decrease on rate limits and gradual recovery.
+
+    Args:
+        requests_per_minute: Ceiling (and starting) rate
+        burst: Tokens that can accumulate while idle (defaults to 1 - evenly spaced requests)
+        min_requests_per_minute: Floor the rate never drops below (defaults to 1/10 of the ceiling)
+        decrease_factor: Rate multiplier applied on each rate-limit error
+        recovery_seconds: Successful seconds without a rate limit before each increase
+        increase_factor: Rate multiplier applied on each recovery step (capped at the ceiling)
+        cooldown: Seconds every caller waits after a rate-limit error
+    """
+
+    def __init__(self, requests_per_minute: float, burst: int = 1, min_requests_per_minute: Optional[float] = None,
+                 decrease_factor: float = 0.5, recovery_seconds: float = 30.0, increase_factor: float = 1.25,
+                 cooldown: float = 10.0):
+        self.max_rate = max(requests_per_minute, 0.1) / 60.0
+        self.min_rate = (min_requests_per_minute / 60.0) if min_requests_per_minute else self.max_rate / 10
+        self.min_rate = min(self.min_rate, self.max_rate)
+        self.rate = self.max_rate  # tokens per second
+        self.burst = max(1, burst)
+        self.decrease_factor = decrease_factor
+        self.recovery_seconds = recovery_seconds
+        self.increase_factor = increase_factor
+        self.cooldown = cooldown
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._last_change = self._updated
+        self._lock = threading.Lock()
+        self._stats = {"acquired": 0, "waited_seconds": 0.0, "rate_limited": 0, "recoveries": 0}
+
+    @property
+    def requests_per_minute(self) -> float:
+        return self.rate * 60.0
+
+    def _refill(self, now: float):
+        if now > self._updated:
+            start = max(self._updated, self._paused_until)
+            if now > start:
+                self._tokens = min(self.burst, self._tokens + (now - start) * self.rate)
+            self._updated = now
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    self._stats["acquired"] += 1
+                    self._stats["waited_seconds"] += waited
+                    return
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def record_success(self):
+        """A request succeeded: step the rate back up once recovery_seconds have passed without a rate limit."""
+        with self._lock:
+            now = time.monotonic()
+            if self.rate < self.max_rate and now - self._last_change >= self.recovery_seconds:
+                self._refill(now)
+                self.rate = min(self.max_rate, self.rate * self.increase_factor)
+                self._last_change = now
+                self._stats["recoveries"] += 1
+
+    def record_rate_limit(self):
+        """A request hit a rate limit: lower the rate and pause every caller for the cooldown."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._stats["rate_limited"] += 1
+            # Concurrent requests often fail together; count one burst of 429s as one decrease
+            if now - self._last_change >= self.cooldown or self.rate == self.max_rate:
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                self._last_change = now
+            self._tokens = 0.0
+            self._paused_until = max(self._paused_until, now + self.cooldown)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters and the current rate for progress reporting."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["waited_seconds"] = round(stats["waited_seconds"], 1)
+            stats["requests_per_minute"] = round(self.rate * 60.0, 1)
+            stats["max_requests_per_minute"] = round(self.max_rate * 60.0, 1)
+            return stats
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Whether an exception from a Google API call is a 429 / quota error."""
+    error_str = str(error).lower()
+    return "429" in error_str or "resource exhausted" in error_str or "resource_exhausted" in error_str or "quota" in error_str
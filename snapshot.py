@@ -0,0 +1,176 @@
+"""
+Memory-mapped knowledge-base snapshots
+A snapshot is a versioned directory holding the normalized, book-grouped embedding
+matrix as .npy plus compact metadata arrays, so servers can open it read-only with
+mmap instead of pulling every embedding from Turso on a cold start. Workers mapping
+the same files share pages through the OS page cache.
+
+Layout of <root>/<version>/:
+    manifest.json      version, corpus_version, dimension, books, book_offsets
+    embeddings.npy     float32 (n, dim), L2-normalized, grouped by book
+    ids.npy            int64 chunk ids
+    book_ids.npy       int32 index into manifest["books"] (-1 for no title)
+    page_numbers.npy   int32 page numbers (-1 for unknown)
+    chunk_indexes.npy  int32 chunk position within its book (-1 for unknown)
+    page_ends.npy      int32 last page each chunk spans (-1 for unknown)
+    text_offsets.npy   int64 (n + 1) byte offsets into texts.bin
+    texts.bin          UTF-8 chunk texts, concatenated
+<root>/CURRENT names the active version.
+"""
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+from knowledge_index import KnowledgeIndex
+from book_stats import corpus_version
+
+SNAPSHOT_FORMAT = 1
+
+class MappedTexts:
+    """Sequence view decoding chunk texts from a mapped byte buffer on access."""
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row: int) -> str:
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return self.data[self.offsets[row]:self.offsets[row + 1]].tobytes().decode("utf-8")
+
+class MappedOptionalInts:
+    """Sequence view over an int array where negative values mean None."""
+
+    def __init__(self, values: np.ndarray):
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, row: int) -> Optional[int]:
+        value = int(self.values[row])
+        return None if value < 0 else value
+
+class MappedBookTitles:
+    """Sequence view mapping per-row book ids to titles."""
+
+    def __init__(self, book_ids: np.ndarray, books: list):
+        self.book_ids = book_ids
+        self.books = books
+
+    def __len__(self):
+        return len(self.book_ids)
+
+    def __getitem__(self, row: int) -> Optional[str]:
+        book_id = int(self.book_ids[row])
+        return None if book_id < 0 else self.books[book_id]
+
+def write_snapshot(index: KnowledgeIndex, root: str, version_key: Tuple[int, int, int]) -> Path:
+    """
+    Write index as a new snapshot version under root and point CURRENT at it.
+
+    Args:
+        index: Float32 KnowledgeIndex (rows grouped by book and normalized)
+        root: Snapshot directory
+        version_key: book_stats.corpus_version() read before the index was loaded
+    """
+    version = f"v{time.strftime('%Y%m%d-%H%M%S')}-{version_key[2]}"
+    root_path = Path(root)
+    path = root_path / version
+    path.mkdir(parents=True, exist_ok=True)
+
+    books = list(index.book_offsets)
+    book_number = {title: i for i, title in enumerate(books)}
+    encoded = [text.encode("utf-8") for text in index.texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(text) for text in encoded])
+
+    np.save(path / "embeddings.npy", np.ascontiguousarray(index.embeddings, dtype=np.float32))
+    np.save(path / "ids.npy", np.asarray(index.ids, dtype=np.int64))
+    np.save(path / "book_ids.npy", np.array([book_number.get(title, -1) for title in index.book_titles], dtype=np.int32))
+    np.save(path / "page_numbers.npy", np.array([-1 if page is None else page for page in index.page_numbers], dtype=np.int32))
+    np.save(path / "chunk_indexes.npy", np.array([-1 if i is None else i for i in index.chunk_indexes], dtype=np.int32))
+    np.save(path / "page_ends.npy", np.array([-1 if page is None else page for page in index.page_ends], dtype=np.int32))
+    np.save(path / "text_offsets.npy", offsets)
+    with open(path / "texts.bin", "wb") as f:
+        for text in encoded:
+            f.write(text)
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "version": version,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "corpus_version": list(version_key),
+        "chunks": len(index),
+        "dimension": index.dimension,
+        "books": books,
+        "book_offsets": {title: list(index.book_offsets[title]) for title in books}
+    }
+    with open(path / "manifest.json", "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    # Swap the CURRENT pointer atomically so readers never see a half-written snapshot
+    pointer_tmp = root_path / "CURRENT.tmp"
+    pointer_tmp.write_text(version)
+    os.replace(pointer_tmp, root_path / "CURRENT")
+    return path
+
+def current_snapshot_path(root: str) -> Optional[Path]:
+    """Directory of the active snapshot version, or None if there is none."""
+    pointer = Path(root) / "CURRENT"
+    if not pointer.exists():
+        return None
+    path = Path(root) / pointer.read_text().strip()
+    return path if (path / "manifest.json").exists() else None
+
+def load_snapshot(root: str) -> Optional[Tuple[KnowledgeIndex, Dict[str, Any]]]:
+    """
+    Memory-map the active snapshot read-only. Returns (index, manifest) or None.
+    Nothing is copied: embeddings and metadata stay backed by the files.
+    """
+    path = current_snapshot_path(root)
+    if path is None:
+        return None
+    with open(path / "manifest.json") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        print(f"⚠️  Snapshot {path} has unsupported format {manifest.get('format')}")
+        return None
+
+    embeddings = np.load(path / "embeddings.npy", mmap_mode="r")
+    ids = np.load(path / "ids.npy", mmap_mode="r")
+    book_ids = np.load(path / "book_ids.npy", mmap_mode="r")
+    page_numbers = np.load(path / "page_numbers.npy", mmap_mode="r")
+    # Snapshots written before chunk indexes or page ends were kept have no file for them
+    chunk_indexes_path = path / "chunk_indexes.npy"
+    chunk_indexes = (MappedOptionalInts(np.load(chunk_indexes_path, mmap_mode="r"))
+                     if chunk_indexes_path.exists() else None)
+    page_ends_path = path / "page_ends.npy"
+    page_ends = MappedOptionalInts(np.load(page_ends_path, mmap_mode="r")) if page_ends_path.exists() else None
+    offsets = np.load(path / "text_offsets.npy", mmap_mode="r")
+    texts = np.memmap(path / "texts.bin", dtype=np.uint8, mode="r") if offsets[-1] else np.zeros(0, dtype=np.uint8)
+
+    index = KnowledgeIndex.from_sorted(
+        ids, embeddings,
+        MappedBookTitles(book_ids, manifest["books"]),
+        MappedOptionalInts(page_numbers),
+        MappedTexts(texts, offsets),
+        {title: tuple(bounds) for title, bounds in manifest["book_offsets"].items()},
+        chunk_indexes,
+        page_ends
+    )
+    return index, manifest
+
+def snapshot_is_current(manifest: Dict[str, Any], client) -> bool:
+    """
+    True if the corpus version (chunk totals and ingest generation, see book_stats) is the
+    one the snapshot was built from. Row counts and max ids alone miss re-ingests that
+    upsert chunks in place; manifests written before the version was recorded count as stale.
+    """
+    recorded = manifest.get("corpus_version")
+    return recorded is not None and tuple(recorded) == corpus_version(client)
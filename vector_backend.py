@@ -0,0 +1,123 @@
+"""
+Native libSQL vector search backend
+Stores embeddings in a typed F32_BLOB column with a DiskANN index and lets the
+database return the top-k through vector_top_k, so the corpus never leaves Turso.
+"""
+from typing import List, Dict, Any, Optional, Sequence, Tuple, Union
+import numpy as np
+
+TABLE_NAME = "medical_knowledge"
+VECTOR_COLUMN = "embedding_vec"
+VECTOR_INDEX = "medical_knowledge_vec_idx"
+BOOK_INDEX = "medical_knowledge_book_idx"  # for the exact scan of book-filtered queries
+
+BookFilter = Optional[Union[str, Sequence[str]]]
+RESULT_COLUMNS = f"""m.id, m.chunk_text, m.page_number, m.book_title, m.chunk_index, m.page_end,
+                   vector_distance_cos(m.{VECTOR_COLUMN}, vector32(?)) AS distance"""
+
+def ensure_vector_column(client, dimension: int):
+    """Add the F32_BLOB column, its DiskANN index and a book_title index to medical_knowledge (idempotent)."""
+    cursor = client.cursor()
+    cursor.execute(f"PRAGMA table_info({TABLE_NAME})")
+    if VECTOR_COLUMN not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN {VECTOR_COLUMN} F32_BLOB({dimension})")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {VECTOR_INDEX} ON {TABLE_NAME} (libsql_vector_idx({VECTOR_COLUMN}))")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {BOOK_INDEX} ON {TABLE_NAME} (book_title)")
+    client.commit()
+
+def backfill_vector_column(client, batch_size: int = 500) -> int:
+    """
+    Copy raw float32 embeddings into the typed vector column for rows that lack it.
+    Returns the number of rows updated.
+    """
+    cursor = client.cursor()
+    updated = 0
+    while True:
+        cursor.execute(f"SELECT id FROM {TABLE_NAME} WHERE {VECTOR_COLUMN} IS NULL LIMIT ?", (batch_size,))
+        ids = [row[0] for row in cursor.fetchall()]
+        if not ids:
+            return updated
+        placeholders = ", ".join("?" for _ in ids)
+        cursor.execute(
+            f"UPDATE {TABLE_NAME} SET {VECTOR_COLUMN} = vector32(embedding) WHERE id IN ({placeholders})",
+            tuple(ids)
+        )
+        client.commit()
+        updated += len(ids)
+        print(f"  ✅ Indexed {updated} rows...")
+
+class LibSQLVectorBackend:
+    """
+    Search backend that runs top-k inside libSQL.
+
+    Book filters are applied by joining the vector_top_k result back to
+    medical_knowledge; filtered queries over-fetch top_k * overfetch neighbours
+    so the filter usually leaves enough rows. When it does not (a small book among
+    large ones), the query falls back to an exact scan of the requested books.
+
+    Args:
+        pool: ConnectionPool for the database holding the vector index
+        overfetch: Neighbour multiplier for book-filtered queries
+    """
+
+    def __init__(self, pool, overfetch: int = 8):
+        self.pool = pool
+        self.overfetch = max(1, overfetch)
+
+    def search(self, query_embedding: np.ndarray, top_k: int = 5, book_title: BookFilter = None) -> List[Dict[str, Any]]:
+        """Return the top_k chunks by cosine similarity, optionally restricted to one or more books."""
+        return self.search_batch([query_embedding], [(book_title, top_k)])[0]
+
+    def search_batch(self, query_embeddings: np.ndarray, requests: Sequence[Tuple[BookFilter, int]]) -> List[List[Dict[str, Any]]]:
+        """Run each (book_title, top_k) request on one pooled connection."""
+        results = []
+        with self.pool.connection() as client:
+            cursor = client.cursor()
+            for query, (book, top_k) in zip(query_embeddings, requests):
+                results.append(self._search(cursor, np.asarray(query, dtype=np.float32), book, top_k))
+        return results
+
+    def _search(self, cursor, query: np.ndarray, book: BookFilter, top_k: int) -> List[Dict[str, Any]]:
+        if top_k <= 0:
+            return []
+        query_bytes = query.tobytes()
+        sql = f"""
+            SELECT {RESULT_COLUMNS}
+            FROM vector_top_k('{VECTOR_INDEX}', vector32(?), ?) AS v
+            JOIN {TABLE_NAME} AS m ON m.rowid = v.id
+        """
+        params: list = [query_bytes, query_bytes]
+        titles = None
+        if book:
+            titles = [book] if isinstance(book, str) else list(book)
+            sql += f" WHERE m.book_title IN ({', '.join('?' for _ in titles)})"
+            params += [top_k * self.overfetch] + titles
+        else:
+            params.append(top_k)
+        sql += " ORDER BY distance LIMIT ?"
+        params.append(top_k)
+
+        cursor.execute(sql, tuple(params))
+        rows = cursor.fetchall()
+        if titles and len(rows) < top_k:
+            # The approximate neighbours were mostly from other books; score the requested
+            # books' chunks directly (the book_title index keeps this to their rows)
+            cursor.execute(f"""
+                SELECT {RESULT_COLUMNS}
+                FROM {TABLE_NAME} AS m
+                WHERE m.book_title IN ({', '.join('?' for _ in titles)}) AND m.{VECTOR_COLUMN} IS NOT NULL
+                ORDER BY distance LIMIT ?
+            """, (query_bytes, *titles, top_k))
+            rows = cursor.fetchall()
+        return [
+            {
+                'id': chunk_id,
+                'text': chunk_text,
+                'page_number': page_number,
+                'book_title': book_title,
+                'chunk_index': chunk_index,
+                'page_end': page_end,
+                'similarity': float(1.0 - distance)
+            }
+            for chunk_id, chunk_text, page_number, book_title, chunk_index, page_end, distance in rows
+        ]
@@ -1,7 +1,10 @@
 import os
+import re
 import sys
 from libsql_experimental import connect
 from dotenv import load_dotenv
+from lexical_index import fts_index_exists, FTS_TABLE_NAME
+from book_stats import books_table_exists, book_titles
 
 load_dotenv()
 
@@ -19,13 +22,11 @@ def verify_content():
     
     # 1. List all books to get exact title
     print("\n📚 Books in database:")
-    cursor.execute("SELECT DISTINCT book_title FROM medical_knowledge")
-    books = cursor.fetchall()
     target_book = None
-    for book in books:
-        print(f" - {book[0]}")
-        if "Canadian Lab Test Manual" in book[0]:
-            target_book = book[0]
+    for title in book_titles(client):
+        print(f" - {title}")
+        if "Canadian Lab Test Manual" in title:
+            target_book = title
             
     if not target_book:
         print("\n❌ 'Canadian Lab Test Manual' book not found in database!")
@@ -33,15 +34,27 @@ def verify_content():
 
     print(f"\n🔍 Searching in book: '{target_book}'")
     
-    # 2. Search for keywords via SQL LIKE
+    # 2. Search for keywords via the FTS5 index (SQL LIKE scan if it hasn't been built)
     keywords = ["Potassium", "Sodium", "Calcium", "Normal range"]
+    use_fts = fts_index_exists(client)
+    if not use_fts:
+        print("\n⚠️  Full-text index not found (run python build_fts_index.py); falling back to LIKE scans")
     
     for keyword in keywords:
         print(f"\nChecking for '{keyword}'...")
-        cursor.execute(
-            "SELECT COUNT(*), chunk_text FROM medical_knowledge WHERE book_title = ? AND chunk_text LIKE ? LIMIT 3", 
-            (target_book, f"%{keyword}%")
-        )
+        if use_fts:
+            # Phrase match, so multi-word keywords behave like the LIKE fallback
+            phrase = '"' + " ".join(re.findall(r"\w+", keyword)) + '"'
+            cursor.execute(
+                f"SELECT COUNT(*), m.chunk_text FROM {FTS_TABLE_NAME} JOIN medical_knowledge AS m ON m.id = {FTS_TABLE_NAME}.rowid "
+                f"WHERE {FTS_TABLE_NAME} MATCH ? AND m.book_title = ?",
+                (phrase, target_book)
+            )
+        else:
+            cursor.execute(
+                "SELECT COUNT(*), chunk_text FROM medical_knowledge WHERE book_title = ? AND chunk_text LIKE ? LIMIT 3", 
+                (target_book, f"%{keyword}%")
+            )
         result = cursor.fetchone()
         count = result[0] if result else 0
         print(f"   Found {count} chunks containing '{keyword}'")
@@ -50,7 +63,10 @@ def verify_content():
             print(f"   Sample chunk: {result[1][:200]}...")
 
     # 3. Check total chunks for this book
-    cursor.execute("SELECT COUNT(*) FROM medical_knowledge WHERE book_title = ?", (target_book,))
+    if books_table_exists(client):
+        cursor.execute("SELECT COALESCE(SUM(chunk_count), 0) FROM books WHERE title = ?", (target_book,))
+    else:
+        cursor.execute("SELECT COUNT(*) FROM medical_knowledge WHERE book_title = ?", (target_book,))
     total_chunks = cursor.fetchone()[0]
     print(f"\nTotal chunks for '{target_book}': {total_chunks}")
 